@@ -0,0 +1,61 @@
+"""
+Сравнение двух результатов нагрузочного прогона.
+
+Пример:
+    python -m benchmarks.compare results/before.json results/after.json --fail-above 10
+
+Для каждого типа запроса печатает изменение req/s и перцентилей задержки.
+С --fail-above завершается с кодом 1, если p95 или p99 какого-либо типа
+выросли больше чем на указанный процент.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def delta_percent(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def compare(before: dict, after: dict) -> list[tuple[str, str, float, float, float]]:
+    rows = []
+    for name in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old = before["endpoints"].get(name, {})
+        new = after["endpoints"].get(name, {})
+        for metric in METRICS:
+            old_value = old.get(metric, 0.0)
+            new_value = new.get(metric, 0.0)
+            rows.append((name, metric, old_value, new_value, delta_percent(old_value, new_value)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение результатов нагрузочных прогонов")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--fail-above", type=float, help="Допустимый рост p95/p99, проценты")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+
+    regressions = []
+    print(f"{'endpoint':<10} {'metric':<8} {'before':>10} {'after':>10} {'delta':>8}")
+    for name, metric, old_value, new_value, delta in compare(before, after):
+        print(f"{name:<10} {metric:<8} {old_value:>10.2f} {new_value:>10.2f} {delta:>+7.1f}%")
+        if args.fail_above is not None and metric in ("p95_ms", "p99_ms") and delta > args.fail_above:
+            regressions.append(f"{name} {metric} {delta:+.1f}%")
+
+    if regressions:
+        print("Регрессии: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
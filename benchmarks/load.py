@@ -0,0 +1,282 @@
+"""
+Нагрузочный прогон горячих путей: редиректы, создание ссылок, статистика, логин.
+
+Пример:
+    python -m benchmarks.load --duration 30 --concurrency 64 --mix redirect=80,create=5,stats=10,login=5 \
+        -o results/before.json
+
+По умолчанию сервис поднимается в отдельном процессе на локальном SQLite
+с кэшем в памяти. Для прогона на локальном PostgreSQL/Redis передайте
+--database-url и --redis-url, для уже запущенного сервиса - --target.
+Популярность коротких кодов распределена по Ципфу (--zipf-s).
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Optional
+
+import httpx
+
+ENDPOINTS = ("redirect", "create", "stats", "login")
+DEFAULT_MIX = "redirect=80,create=5,stats=10,login=5"
+BENCH_USER = {"username": "bench", "email": "bench@example.com", "password": "bench-password"}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise ValueError(f"Неизвестный тип запроса: {name}")
+        weights[name] = float(weight)
+    return weights
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    position = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[position]
+
+
+class ZipfCodes:
+    """Выбор кода с вероятностью 1 / rank^s: немногие коды получают основную часть трафика."""
+
+    def __init__(self, codes: list[str], s: float, rng: random.Random):
+        self.codes = codes
+        self.rng = rng
+        self.cumulative = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(codes) + 1)))
+
+    def choice(self) -> str:
+        point = self.rng.random() * self.cumulative[-1]
+        return self.codes[bisect.bisect(self.cumulative, point)]
+
+
+def access_token(response: httpx.Response) -> str:
+    # Куку разбираем вручную: сервис отдает Max-Age в формате timedelta
+    for header in response.headers.get_list("set-cookie"):
+        name, _, rest = header.partition("=")
+        if name.strip() == "access_token":
+            return rest.split(";", 1)[0]
+    raise RuntimeError(f"Сервис не выдал access_token: {response.status_code} {response.text}")
+
+
+class LoadRunner:
+    def __init__(self, client: httpx.AsyncClient, mix: dict[str, float], zipf_s: float, seed: int):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.names = list(mix)
+        self.cumulative = list(itertools.accumulate(mix.values()))
+        self.zipf_s = zipf_s
+        self.token: Optional[str] = None
+        self.codes: Optional[ZipfCodes] = None
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+
+    async def seed(self, links: int, concurrency: int):
+        await self.client.post("/auth/register", params=BENCH_USER)
+        response = await self.client.post("/auth/login", data={
+            "username": BENCH_USER["username"], "password": BENCH_USER["password"]
+        })
+        self.token = access_token(response)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create(number: int) -> Optional[str]:
+            async with semaphore:
+                response = await self.client.post(
+                    "/links/shorten",
+                    json={"original_url": f"https://example.com/page/{number % 1000}"},
+                    cookies={"access_token": self.token},
+                )
+            return response.json().get("short_code") if response.status_code == 200 else None
+
+        codes = [code for code in await asyncio.gather(*(create(n) for n in range(links))) if code]
+        if not codes:
+            raise RuntimeError("Не удалось создать ни одной ссылки для прогона")
+        self.rng.shuffle(codes)
+        self.codes = ZipfCodes(codes, self.zipf_s, self.rng)
+
+    def _request(self, name: str):
+        cookies = {"access_token": self.token}
+        if name == "redirect":
+            return self.client.get(f"/links/{self.codes.choice()}", follow_redirects=False), (307,)
+        if name == "stats":
+            return self.client.get(f"/links/stats/{self.codes.choice()}"), (200,)
+        if name == "create":
+            url = f"https://example.com/new/{self.rng.randrange(10 ** 9)}"
+            return self.client.post("/links/shorten", json={"original_url": url}, cookies=cookies), (200,)
+        return self.client.post("/auth/login", data={
+            "username": BENCH_USER["username"], "password": BENCH_USER["password"]
+        }), (200,)
+
+    async def worker(self, deadline: float):
+        while time.monotonic() < deadline:
+            point = self.rng.random() * self.cumulative[-1]
+            name = self.names[bisect.bisect(self.cumulative, point)]
+            request, expected = self._request(name)
+            started = time.perf_counter()
+            try:
+                response = await request
+                ok = response.status_code in expected
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - started
+            if ok:
+                self.latencies[name].append(elapsed)
+            else:
+                self.errors[name] += 1
+
+    async def run(self, duration: float, concurrency: int) -> dict:
+        started = time.monotonic()
+        deadline = started + duration
+        await asyncio.gather(*(self.worker(deadline) for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+        results = {}
+        for name in ENDPOINTS:
+            values = sorted(self.latencies[name])
+            if not values and not self.errors[name]:
+                continue
+            results[name] = {
+                "count": len(values),
+                "errors": self.errors[name],
+                "rps": len(values) / elapsed,
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "total_rps": sum(result["rps"] for result in results.values()),
+            "endpoints": results,
+        }
+
+
+async def prepare_database(database_url: str):
+    """Создает схему: startup-обработчик приложения не вызывается при заданном lifespan."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from src.models.models import Base
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+def start_server(port: int, database_url: str, redis_url: Optional[str],
+                 rate_limit: bool = False, admission: bool = False) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark-secret")
+    env["DATABASE_URL"] = database_url
+    # Ограничители по умолчанию выключены: иначе прогон измеряет в основном ответы 429 и 503
+    env["RATE_LIMIT_ENABLED"] = "1" if rate_limit else "0"
+    env["ADMISSION_ENABLED"] = "1" if admission else "0"
+    # Как и --log-level warning для uvicorn: журнал доступа не пишется в stdout вперемешку с результатом
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if redis_url:
+        env["REDIS_URL"] = redis_url
+        env["CACHE_BACKEND"] = "redis"
+    else:
+        env["CACHE_BACKEND"] = "memory"
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Сервис не поднялся")
+
+
+async def run_benchmark(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=30) as client:
+        await wait_ready(client)
+        runner = LoadRunner(client, parse_mix(args.mix), args.zipf_s, args.seed)
+        await runner.seed(args.links, args.concurrency)
+        if args.warmup:
+            await runner.run(args.warmup, args.concurrency)
+            runner.latencies = {name: [] for name in ENDPOINTS}
+            runner.errors = {name: 0 for name in ENDPOINTS}
+        result = await runner.run(args.duration, args.concurrency)
+
+    result["config"] = {
+        "mix": args.mix,
+        "duration_s": args.duration,
+        "concurrency": args.concurrency,
+        "links": args.links,
+        "zipf_s": args.zipf_s,
+        "seed": args.seed,
+        "target": args.target,
+        "database": args.database_url or "sqlite",
+        "cache": "redis" if args.redis_url else "memory",
+        "rate_limit": args.rate_limit,
+        "admission": args.admission,
+        "python": platform.python_version(),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон сервиса")
+    parser.add_argument("--target", help="Адрес уже запущенного сервиса")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", help="База для поднимаемого сервиса (по умолчанию SQLite)")
+    parser.add_argument("--redis-url", help="Redis для поднимаемого сервиса (по умолчанию кэш в памяти)")
+    parser.add_argument("--rate-limit", action="store_true", help="Включить ограничение частоты в поднимаемом сервисе")
+    parser.add_argument("--admission", action="store_true", help="Включить контроль допуска в поднимаемом сервисе")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--links", type=int, default=1000, help="Сколько ссылок создать перед прогоном")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="Файл для результатов JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    server = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if not args.target:
+            args.target = f"http://127.0.0.1:{args.port}"
+            database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+            asyncio.run(prepare_database(database_url))
+            server = start_server(args.port, database_url, args.redis_url, args.rate_limit, args.admission)
+        try:
+            result = asyncio.run(run_benchmark(args))
+        finally:
+            if server:
+                server.terminate()
+                server.wait(timeout=10)
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Микробенчмарки функций сервисного слоя с проверкой по сохраненным базовым значениям.
+
+Пример:
+    python -m benchmarks.micro                      # сравнить с benchmarks/baseline.json
+    python -m benchmarks.micro --update-baseline    # перезаписать базовые значения
+    python -m benchmarks.micro --only token --tolerance 0.5
+
+Каждый бенчмарк прогоняется ROUNDS раз, берется лучшее время на одну
+операцию. Чтобы базовые значения можно было сравнивать на разных машинах,
+сравнивается не абсолютное время, а отношение ко времени эталонной нагрузки
+на чистом Python, измеренной вплотную к каждому повтору. Если функция медленнее
+базового значения больше чем на --tolerance, скрипт завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from datetime import datetime, timedelta
+from typing import Callable
+
+# Модули src читают конфигурацию при импорте
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+from src.auth.services import create_access_token, decode_access_token  # noqa: E402
+from src.links.services import add_half_year, serialize_link  # noqa: E402
+from src.models.models import Base, Link, Url  # noqa: E402
+from src.utils import generate_short_code, url_hash  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+SEED_LINKS = 1_000
+SERIALIZED_LINKS = 100
+ROUNDS = 7
+
+
+def calibrate() -> float:
+    """Эталонная нагрузка на чистом Python, наносекунды."""
+    started = time.perf_counter()
+    total = 0
+    for number in range(300_000):
+        total += number % 7
+    return (time.perf_counter() - started) * 1e9
+
+
+def measure(operation: Callable[[], None], number: int) -> float:
+    """Среднее время одной операции из number вызовов, наносекунды."""
+    started = time.perf_counter()
+    for _ in range(number):
+        operation()
+    return (time.perf_counter() - started) / number * 1e9
+
+
+def measure_async(loop: asyncio.AbstractEventLoop, operation, number: int) -> float:
+    async def batch():
+        for _ in range(number):
+            await operation()
+
+    started = time.perf_counter()
+    loop.run_until_complete(batch())
+    return (time.perf_counter() - started) / number * 1e9
+
+
+async def seed_database(session_maker) -> tuple[list[str], list[Link]]:
+    async with session_maker() as session:
+        await session.execute(insert(Url), [
+            {"id": number + 1, "url": f"https://example.com/{number}", "url_hash": url_hash(f"https://example.com/{number}")}
+            for number in range(SEED_LINKS)
+        ])
+        codes = [f"code{number:06d}" for number in range(SEED_LINKS)]
+        await session.execute(insert(Link), [
+            {"url_id": number + 1, "short_code": code, "created_at": datetime(2025, 1, 1),
+             "expires_at": datetime(2026, 1, 1), "clicks": number, "last_used_at": datetime(2025, 6, 1)}
+            for number, code in enumerate(codes)
+        ])
+        await session.commit()
+        result = await session.execute(select(Link).limit(SERIALIZED_LINKS))
+        return codes, result.scalars().all()
+
+
+def run_benchmarks(only: str = None, names: set[str] = None) -> dict[str, dict]:
+    loop = asyncio.new_event_loop()
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def create_schema():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    loop.run_until_complete(create_schema())
+    codes, links = loop.run_until_complete(seed_database(session_maker))
+    token = create_access_token({"sub": "bench"}, timedelta(minutes=30))
+    lookup_code = codes[len(codes) // 2]
+
+    async def orm_lookup():
+        async with session_maker() as session:
+            result = await session.execute(select(Link).filter_by(short_code=lookup_code))
+            result.scalars().first().original_url
+
+    core_query = (
+        select(Link.id, Link.clicks, Url.url)
+        .join(Url, Link.url_id == Url.id)
+        .where(Link.short_code == lookup_code)
+    )
+
+    async def core_lookup():
+        async with engine.connect() as conn:
+            (await conn.execute(core_query)).first()
+
+    cases = {
+        "generate_short_code": lambda: measure(generate_short_code, 20_000),
+        "create_access_token": lambda: measure(
+            lambda: create_access_token({"sub": "bench"}, timedelta(minutes=30)), 2_000),
+        "decode_access_token": lambda: measure(lambda: decode_access_token(token), 2_000),
+        "add_half_year": lambda: measure(add_half_year, 20_000),
+        "serialize_links": lambda: measure(lambda: [serialize_link(link) for link in links], 200),
+        "select_link_orm": lambda: measure_async(loop, orm_lookup, 300),
+        "select_link_core": lambda: measure_async(loop, core_lookup, 300),
+    }
+
+    results = {}
+    try:
+        for name, case in cases.items():
+            if (only and only not in name) or (names is not None and name not in names):
+                continue
+            # Калибровка перед каждым повтором сглаживает колебания частоты и соседнюю нагрузку
+            rounds = [(case(), calibrate()) for _ in range(ROUNDS)]
+            results[name] = {
+                "ns": min(elapsed for elapsed, _ in rounds),
+                "relative": min(elapsed / calibration for elapsed, calibration in rounds),
+            }
+    finally:
+        loop.run_until_complete(engine.dispose())
+        loop.close()
+    return results
+
+
+def check(results: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    regressions = []
+    print(f"{'benchmark':<22} {'baseline':>12} {'current':>12} {'delta':>8}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<22} {'-':>12} {current['ns']:>10.0f}ns {'new':>8}")
+            continue
+        delta = (current["relative"] - base["relative"]) / base["relative"] * 100
+        print(f"{name:<22} {base['ns']:>10.0f}ns {current['ns']:>10.0f}ns {delta:>+7.1f}%")
+        if current["relative"] > base["relative"] * (1 + tolerance):
+            regressions.append(f"{name} {delta:+.1f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки сервисного слоя")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Сохранить текущие результаты как базовые")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Допустимое замедление относительно базового значения (0.25 - 25%%)")
+    parser.add_argument("--retries", type=int, default=2, help="Сколько раз перемерять подозрительные результаты")
+    parser.add_argument("--only", help="Запустить только бенчмарки, в имени которых есть подстрока")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+        for name, result in results.items():
+            print(f"{name:<22} {result['ns']:>10.0f}ns")
+        print(f"Базовые значения сохранены в {args.baseline}")
+        return
+
+    for _ in range(args.retries):
+        suspects = {
+            name for name, result in results.items()
+            if name in baseline and result["relative"] > baseline[name]["relative"] * (1 + args.tolerance)
+        }
+        if not suspects:
+            break
+        # Единичный выброс от соседней нагрузки не считаем регрессией: перемеряем и берем лучшее
+        for name, result in run_benchmarks(names=suspects).items():
+            if result["relative"] < results[name]["relative"]:
+                results[name] = result
+
+    regressions = check(results, baseline, args.tolerance)
+    if regressions:
+        print("Регрессии: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Воспроизведение записанного трафика (см. src/recording) на локальном сервисе.
+
+Пример:
+    python -m benchmarks.replay traffic.jsonl --target http://localhost:8000 --speed 4 \
+        --username bench --password bench-password -o results/build-a.json
+    python -m benchmarks.compare results/build-a.json results/build-b.json
+
+Запросы отправляются с исходными интервалами между ними, сжатыми в --speed раз,
+не дожидаясь ответов на предыдущие, поэтому всплески трафика сохраняются.
+Авторизованные запросы отправляются с токеном пользователя --username,
+логины - с его учетными данными; остальные запросы к /auth/ пропускаются.
+Короткие коды берутся из записи как есть, поэтому база должна содержать те же
+ссылки (например, восстановленная через экспорт/импорт).
+Результат в формате benchmarks.load: req/s и перцентили по шаблонам маршрутов,
+а также перцентили исходных задержек из записи для сравнения с продакшеном.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from collections import Counter
+from typing import Optional
+
+import httpx
+
+from benchmarks.load import access_token, percentile
+from src.recording.services import read_records
+
+
+class Replayer:
+    def __init__(self, client: httpx.AsyncClient, speed: float, username: Optional[str], password: Optional[str]):
+        self.client = client
+        self.speed = speed
+        self.username = username
+        self.password = password
+        self.token: Optional[str] = None
+        self.latencies: dict[str, list[float]] = {}
+        self.recorded: dict[str, list[float]] = {}
+        self.errors = Counter()
+        self.mismatches = Counter()
+        self.skipped = 0
+
+    async def login(self):
+        if not self.username:
+            return
+        response = await self.client.post("/auth/login", data={"username": self.username, "password": self.password})
+        self.token = access_token(response)
+
+    def _build(self, record: dict) -> Optional[httpx.Request]:
+        path = record["p"]
+        if path.startswith("/auth/"):
+            if path != "/auth/login" or not self.username:
+                return None
+            return self.client.build_request(
+                "POST", path, data={"username": self.username, "password": self.password}
+            )
+        url = f"{path}?{record['q']}" if record.get("q") else path
+        headers = {"content-type": record["ct"]} if record.get("ct") else {}
+        cookies = {"access_token": self.token} if record.get("a") and self.token else None
+        return self.client.build_request(
+            record["m"], url, content=record.get("b"), headers=headers, cookies=cookies
+        )
+
+    async def send(self, route: str, request: httpx.Request, recorded_status: int):
+        started = time.perf_counter()
+        try:
+            response = await self.client.send(request, follow_redirects=False)
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            self.errors[route] += 1
+            return
+        if response.status_code != recorded_status:
+            self.mismatches[route] += 1
+        self.latencies.setdefault(route, []).append(elapsed)
+
+    async def replay(self, records: list[dict]) -> float:
+        tasks = []
+        first = records[0]["t"]
+        started = time.monotonic()
+        for record in records:
+            request = self._build(record)
+            if request is None:
+                self.skipped += 1
+                continue
+            route = record.get("r", record["p"])
+            self.recorded.setdefault(route, []).append(record["d"] / 1000)
+            delay = (record["t"] - first) / self.speed - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.send(route, request, record["s"])))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - started
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for route in sorted(self.recorded):
+            values = sorted(self.latencies.get(route, []))
+            recorded = sorted(self.recorded[route])
+            endpoints[route] = {
+                "count": len(values),
+                "errors": self.errors[route],
+                "status_mismatches": self.mismatches[route],
+                "rps": len(values) / elapsed,
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "recorded_p50_ms": percentile(recorded, 0.50) * 1000,
+                "recorded_p95_ms": percentile(recorded, 0.95) * 1000,
+                "recorded_p99_ms": percentile(recorded, 0.99) * 1000,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "total_rps": sum(endpoint["rps"] for endpoint in endpoints.values()),
+            "skipped": self.skipped,
+            "endpoints": endpoints,
+        }
+
+
+async def run_replay(args, records: list[dict]) -> dict:
+    limits = httpx.Limits(max_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=30) as client:
+        replayer = Replayer(client, args.speed, args.username, args.password)
+        await replayer.login()
+        elapsed = await replayer.replay(records)
+    result = replayer.report(elapsed)
+    result["config"] = {"files": args.files, "target": args.target, "speed": args.speed, "records": len(records)}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного трафика")
+    parser.add_argument("files", nargs="+", help="Файлы записи (например, от нескольких воркеров)")
+    parser.add_argument("--target", default="http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="Во сколько раз ускорить воспроизведение")
+    parser.add_argument("--limit", type=int, help="Воспроизвести только первые N записей")
+    parser.add_argument("--username", help="Пользователь для авторизованных запросов")
+    parser.add_argument("--password")
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("-o", "--output", help="Файл для результатов JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    records = sorted(read_records(args.files), key=lambda record: record["t"])[:args.limit]
+    if not records:
+        parser.error("В записи нет запросов")
+    result = asyncio.run(run_replay(args, records))
+
+    output = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
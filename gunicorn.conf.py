@@ -0,0 +1,56 @@
+"""
+Production-запуск: gunicorn -c gunicorn.conf.py main:app
+
+Приложение импортируется один раз в мастере (preload_app), и данные только
+для чтения (снапшот редиректов) загружаются до fork, поэтому воркеры делят
+их страницы памяти. Пулы соединений с базой и Redis создаются в каждом
+воркере заново. При остановке воркер дожидается текущих запросов
+(graceful_timeout), выгружает накопленные переходы и закрывает пулы.
+"""
+import multiprocessing
+import os
+import shutil
+
+# Метрики воркеров агрегируются через файлы; каталог задается до импорта
+# prometheus_client приложением и очищается от файлов прошлого запуска
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+try:
+    import uvicorn_worker  # noqa: F401
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Воркеры асинхронные, поэтому по одному на ядро
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+
+def when_ready(server):
+    from prometheus_client import multiprocess
+
+    from main import warm_up
+
+    warm_up()
+    # Мастер запросов не обслуживает: его значения live-метрик, созданные при
+    # импорте приложения, в выдачу /metrics не попадают
+    multiprocess.mark_process_dead(os.getpid())
+    server.log.info("Общее состояние загружено, запускается воркеров: %s", server.cfg.workers)
+
+
+def post_fork(server, worker):
+    from src.sharding.router import shard_router
+
+    shard_router.reset_after_fork()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,39 +1,119 @@
-import uvicorn
-import logging
+import time
+
+# Отсчет времени импорта приложения - до импорта остальных модулей
+IMPORT_STARTED = time.perf_counter()
 
-from redis import asyncio as aioredis
+import asyncio
+import logging
 
 from contextlib import asynccontextmanager
 from collections.abc import AsyncIterator
 
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.backends.inmemory import InMemoryBackend
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.cache import FallbackCacheBackend, close_redis, get_redis
+from src.clicks.services import ClickFlusher, get_click_buffer
+from src.config import ACCESS_LOG_REDIRECT_SAMPLE_RATE, ACCESS_LOG_SAMPLE_RATE, ADMISSION_ENABLED, ADMISSION_GLOBAL_LIMIT, ADMISSION_LIMITS, CACHE_BACKEND, CLICK_FLUSH_INTERVAL, \
+    DEBUG, EDGE_MODE, LOOP_BLOCK_THRESHOLD_MS, LOOP_LAG_INTERVAL, RATE_LIMIT_ENABLED, SCHEMA_CREATE, SNAPSHOT_PATH, \
+    TRAFFIC_RECORD_PATH, TRAFFIC_SAMPLE_RATE
 from src.database import engine
-from src.models.models import Base
+from src.models.models import Base, SHARD_TABLES
+from src.sharding.router import shard_router
+from src.admission.middleware import AdmissionMiddleware
+from src.admission.services import AdmissionController, parse_limits
+from src.logs.middleware import AccessLogMiddleware
+from src.logs.services import setup_logging
+from src.metrics.loop import LoopLagMonitor
+from src.metrics.metrics import APP_STARTUP_SECONDS, WORKER_STARTED
+from src.metrics.middleware import MetricsMiddleware
+from src.ratelimit.middleware import RateLimitMiddleware
+from src.recording.middleware import RecordingMiddleware
+from src.recording.services import close_recorder
+from src.snapshot.services import get_snapshot
 
 from src.auth.routes import router as auth_router
 from src.links.routes import router as links_router
+from src.export.routes import router as export_router
+from src.metrics.routes import router as metrics_router
+from src.profiling.routes import router as profiling_router
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+setup_logging()
+logger = logging.getLogger(__name__)
+
+
+schema_created = False
+
+
+async def create_schema():
+    """
+    Создает недостающие таблицы на всех шардах. Только для локального запуска:
+    в production схему ведут миграции alembic, и запрос к каталогу базы при
+    старте каждого воркера не нужен.
+    """
+    global schema_created
+    if schema_created:
+        return
+    for shard, shard_engine in enumerate(shard_router.engines):
+        tables = None if shard == 0 else SHARD_TABLES
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=tables)
+    schema_created = True
+
+
+async def _create_schema_before_fork():
+    await create_schema()
+    # Соединения привязаны к временному event loop мастера
+    for shard_engine in shard_router.engines:
+        await shard_engine.dispose()
+
+
+def warm_up():
+    """
+    Загружает состояние только для чтения, общее для всех воркеров. При запуске
+    через gunicorn (gunicorn.conf.py) вызывается в мастере до fork, и воркеры
+    делят эти страницы памяти. Схема (SCHEMA_CREATE) создается здесь же один
+    раз, а не наперегонки в каждом воркере.
+    """
+    if EDGE_MODE:
+        get_snapshot(SNAPSHOT_PATH)
+    if SCHEMA_CREATE:
+        asyncio.run(_create_schema_before_fork())
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
-    redis = aioredis.from_url("redis://redis:6379", decode_responses=True)
-    # redis = aioredis.from_url("redis://localhost", decode_responses=True)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    startup_started = time.perf_counter()
+    if SCHEMA_CREATE:
+        await create_schema()
+    if CACHE_BACKEND == "memory":
+        FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache")
+    else:
+        FastAPICache.init(FallbackCacheBackend(get_redis()), prefix="fastapi-cache")
+    loop_monitor = LoopLagMonitor(
+        interval=LOOP_LAG_INTERVAL,
+        block_threshold=LOOP_BLOCK_THRESHOLD_MS / 1000,
+        capture_stacks=DEBUG,
+    )
+    loop_monitor.start()
+    click_flusher = ClickFlusher(get_click_buffer(), CLICK_FLUSH_INTERVAL)
+    if CACHE_BACKEND == "memory":
+        # Без Redis нет и celery beat: переходы из памяти воркера выгружает он сам
+        click_flusher.start()
+    WORKER_STARTED.set_to_current_time()
+    startup_seconds = time.perf_counter() - startup_started
+    APP_STARTUP_SECONDS.labels("startup").set(startup_seconds)
+    logger.info("Приложение готово: импорт %.0f мс, запуск %.0f мс", IMPORT_SECONDS * 1000, startup_seconds * 1000)
     yield
+    await click_flusher.stop()
+    await loop_monitor.stop()
+    close_recorder()
+    await close_redis()
+    await shard_router.dispose()
+    await engine.dispose()
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
 app = FastAPI(
     title="Link Shortener API",
     lifespan=lifespan
@@ -46,22 +126,42 @@ app.add_middleware(
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
 )
+if ADMISSION_ENABLED:
+    # Внутри MetricsMiddleware, чтобы отклоненные запросы попадали в метрики
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=AdmissionController(ADMISSION_GLOBAL_LIMIT, limits=parse_limits(ADMISSION_LIMITS)),
+    )
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+# Внутри MetricsMiddleware: берет из ее RequestStats время в базе и результат кэша
+app.add_middleware(
+    AccessLogMiddleware,
+    sample_rate=ACCESS_LOG_SAMPLE_RATE,
+    redirect_sample_rate=ACCESS_LOG_REDIRECT_SAMPLE_RATE,
+)
+app.add_middleware(MetricsMiddleware)
+if TRAFFIC_RECORD_PATH:
+    app.add_middleware(RecordingMiddleware, path=TRAFFIC_RECORD_PATH, sample_rate=TRAFFIC_SAMPLE_RATE)
 
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(links_router, prefix="/links", tags=["Links"])
+app.include_router(export_router, prefix="/export", tags=["Export"])
+app.include_router(metrics_router)
+app.include_router(profiling_router, prefix="/admin", tags=["Admin"])
 
 
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+APP_STARTUP_SECONDS.labels("import").set(IMPORT_SECONDS)
+
 
 @app.get("/")
 async def read_root():
     return {"message": "API is running!"}
 
 
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    import uvicorn
+
+    # Один процесс для разработки; в production - gunicorn -c gunicorn.conf.py main:app
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=DEBUG, access_log=False)
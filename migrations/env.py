@@ -1,8 +1,9 @@
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config
+from sqlalchemy import create_engine, engine_from_config
 from sqlalchemy import pool
-from src.config import DB_USER, DB_NAME, DB_PASS, DB_PORT, DB_HOST
+from sqlalchemy.engine import make_url
+from src.config import DB_USER, DB_NAME, DB_PASS, DB_PORT, DB_HOST, SHARD_DATABASE_URLS
 from src.models import models
 
 from alembic import context
@@ -29,6 +30,18 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = [models.Base.metadata]
 
+# Таблицы, которые миграции ведут в шардах 1 и дальше
+SHARD_TABLE_NAMES = {table.name for table in models.SHARD_TABLES}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """В шардах autogenerate сравнивает только таблицы ссылок: user есть лишь в основной базе."""
+    if config.attributes.get("shard", 0) == 0:
+        return True
+    table = object if type_ == "table" else getattr(object, "table", None)
+    return table is None or table.name in SHARD_TABLE_NAMES
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -65,20 +78,31 @@ def run_migrations_online() -> None:
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
+    Миграции применяются к основной базе (шард 0) и затем к каждой базе из
+    SHARD_DATABASE_URLS; у каждой своя таблица alembic_version. В шардах
+    создаются только таблицы SHARD_TABLES.
     """
-    connectable = engine_from_config(
+    connectables = [engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
-    )
-
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+    )]
+    for url in SHARD_DATABASE_URLS:
+        # Приложение подключается к шардам асинхронным драйвером, alembic - синхронным
+        sync_url = make_url(url)
+        connectables.append(create_engine(
+            sync_url.set(drivername=sync_url.get_backend_name()), poolclass=pool.NullPool
+        ))
+
+    for shard, connectable in enumerate(connectables):
+        config.attributes["shard"] = shard
+        with connectable.connect() as connection:
+            context.configure(
+                connection=connection, target_metadata=target_metadata, include_object=include_object
+            )
+
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,81 @@
+"""initial schema
+
+Revision ID: 3f1c0a2b9e7d
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c0a2b9e7d'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Базы, созданные через Base.metadata.create_all, уже содержат эти таблицы:
+    # для них ревизия только проставляет отметку версии.
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    # Пользователи хранятся только в основной базе (env.py, шард 0)
+    primary = op.get_context().config.attributes.get('shard', 0) == 0
+
+    if primary and 'user' not in existing:
+        op.create_table(
+            'user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(), nullable=False),
+            sa.Column('email', sa.String(), nullable=False),
+            sa.Column('hashed_password', sa.String(), nullable=False),
+            sa.Column('registered_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+            sa.Column('role', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username'),
+            sa.UniqueConstraint('email'),
+        )
+        op.create_index('ix_user_id', 'user', ['id'])
+
+    if 'link' not in existing:
+        op.create_table(
+            'link',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('original_url', sa.String(), nullable=False),
+            sa.Column('short_code', sa.String(), nullable=False),
+            sa.Column('custom_alias', sa.String(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=True),
+            sa.Column('clicks', sa.Integer(), nullable=False),
+            sa.Column('last_used_at', sa.DateTime(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            *([sa.ForeignKeyConstraint(['user_id'], ['user.id'])] if primary else []),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_link_id', 'link', ['id'])
+        op.create_index('ix_link_short_code', 'link', ['short_code'], unique=True)
+        op.create_index('ix_link_custom_alias', 'link', ['custom_alias'], unique=True)
+
+    if 'link_archive' not in existing:
+        op.create_table(
+            'link_archive',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('short_code', sa.String(length=50), nullable=True),
+            sa.Column('original_url', sa.Text(), nullable=True),
+            sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+            sa.Column('reason', sa.String(length=50), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_link_archive_id', 'link_archive', ['id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('link_archive')
+    op.drop_table('link')
+    if op.get_context().config.attributes.get('shard', 0) == 0:
+        op.drop_table('user')
@@ -0,0 +1,124 @@
+"""normalize link urls
+
+Revision ID: 8b42d6e1c5a0
+Revises: 3f1c0a2b9e7d
+Create Date: 2026-10-19 09:30:00.000000
+
+Расширяющая часть переноса original_url в таблицу url (каждый URL хранится
+один раз): добавляет url и link.url_id, не трогая старых колонок, поэтому
+предыдущий релиз продолжает работать.
+
+Пока живы обе версии приложения, триггер link_sync_url заполняет url_id для
+строк, которые пишет старый код, и original_url - для строк нового кода.
+Данные переносятся пачками по диапазонам id в режиме autocommit, чтобы
+каждая пачка фиксировалась сразу и не держала долгих блокировок на link.
+Внешний ключ добавляется NOT VALID и проверяется отдельно, индекс строится
+CONCURRENTLY.
+
+NOT NULL для url_id и удаление original_url и custom_alias - в сужающей
+ревизии f1c7a2e5b830, которую применяют после выката нового релиза на все
+экземпляры.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b42d6e1c5a0'
+down_revision: Union[str, None] = '3f1c0a2b9e7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 50_000
+
+# sha256() в PostgreSQL совпадает с src.utils.url_hash
+FILL_URLS = sa.text("""
+    INSERT INTO url (url, url_hash)
+    SELECT DISTINCT original_url, sha256(convert_to(original_url, 'UTF8'))
+    FROM link
+    WHERE id > :low AND id <= :high AND url_id IS NULL
+    ON CONFLICT (url_hash) DO NOTHING
+""")
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION link_sync_url() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.url_id IS DISTINCT FROM OLD.url_id THEN
+        NEW.original_url := (SELECT url FROM url WHERE id = NEW.url_id);
+    ELSIF NEW.url_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.original_url IS DISTINCT FROM OLD.original_url) THEN
+        INSERT INTO url (url, url_hash)
+        VALUES (NEW.original_url, sha256(convert_to(NEW.original_url, 'UTF8')))
+        ON CONFLICT (url_hash) DO NOTHING;
+        NEW.url_id := (SELECT id FROM url WHERE url_hash = sha256(convert_to(NEW.original_url, 'UTF8')));
+    ELSIF NEW.original_url IS NULL THEN
+        NEW.original_url := (SELECT url FROM url WHERE id = NEW.url_id);
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+SYNC_TRIGGER = """
+CREATE TRIGGER link_sync_url BEFORE INSERT OR UPDATE ON link
+FOR EACH ROW EXECUTE FUNCTION link_sync_url()
+"""
+FILL_LINKS = sa.text("""
+    UPDATE link SET url_id = url.id
+    FROM url
+    WHERE link.id > :low AND link.id <= :high AND link.url_id IS NULL
+      AND url.url_hash = sha256(convert_to(link.original_url, 'UTF8'))
+""")
+
+
+def _backfill(bind) -> None:
+    max_id = bind.execute(sa.text("SELECT coalesce(max(id), 0) FROM link")).scalar()
+    for low in range(0, max_id, BATCH_SIZE):
+        with op.get_context().autocommit_block():
+            params = {"low": low, "high": low + BATCH_SIZE}
+            bind.execute(FILL_URLS, params)
+            bind.execute(FILL_LINKS, params)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if 'url' in sa.inspect(bind).get_table_names():
+        # Схема уже создана в новом виде через Base.metadata.create_all
+        return
+
+    op.create_table(
+        'url',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('url', sa.Text(), nullable=False),
+        sa.Column('url_hash', sa.LargeBinary(length=32), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('url_hash'),
+    )
+    op.add_column('link', sa.Column('url_id', sa.Integer(), nullable=True))
+    # Старый релиз пишет только original_url: с этого момента url_id заполняет триггер
+    op.execute(SYNC_FUNCTION)
+    op.execute(SYNC_TRIGGER)
+
+    _backfill(bind)
+    # Добираем строки, созданные до появления триггера
+    bind.execute(FILL_URLS, {"low": 0, "high": 2 ** 31 - 1})
+    bind.execute(FILL_LINKS, {"low": 0, "high": 2 ** 31 - 1})
+
+    op.execute(
+        "ALTER TABLE link ADD CONSTRAINT link_url_id_fkey "
+        "FOREIGN KEY (url_id) REFERENCES url (id) NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        # Проверка существующих строк не блокирует запись в link
+        op.execute("ALTER TABLE link VALIDATE CONSTRAINT link_url_id_fkey")
+        op.create_index('ix_link_url_id', 'link', ['url_id'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS link_sync_url ON link")
+    op.execute("DROP FUNCTION IF EXISTS link_sync_url()")
+    op.drop_index('ix_link_url_id', table_name='link')
+    op.drop_constraint('link_url_id_fkey', 'link', type_='foreignkey')
+    op.drop_column('link', 'url_id')
+    op.drop_table('url')
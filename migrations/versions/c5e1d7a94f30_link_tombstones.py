@@ -0,0 +1,59 @@
+"""link tombstones
+
+Revision ID: c5e1d7a94f30
+Revises: 8b42d6e1c5a0
+Create Date: 2026-10-19 12:00:00.000000
+
+Удаление ссылки теперь только ставит отметку deleted_at, а в link_archive
+строки пачками переносит фоновая задача. Частичный индекс по deleted_at
+содержит только удаленные строки и создается CONCURRENTLY, без блокировки
+записи в link. Таблица link_redirect хранит старые коды переименованных ссылок.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1d7a94f30'
+down_revision: Union[str, None] = '8b42d6e1c5a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # Базы, созданные через Base.metadata.create_all, уже содержат эти изменения
+    if 'deleted_at' not in {column['name'] for column in inspector.get_columns('link')}:
+        # Колонки без значения по умолчанию добавляются без перезаписи таблицы
+        op.add_column('link', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.add_column('link', sa.Column('deleted_reason', sa.String(length=50), nullable=True))
+        with op.get_context().autocommit_block():
+            op.create_index(
+                'ix_link_deleted_at', 'link', ['deleted_at'],
+                postgresql_where=sa.text('deleted_at IS NOT NULL'),
+                postgresql_concurrently=True,
+            )
+
+    if 'link_redirect' not in inspector.get_table_names():
+        op.create_table(
+            'link_redirect',
+            sa.Column('old_code', sa.String(), nullable=False),
+            sa.Column('new_code', sa.String(), nullable=False),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('old_code'),
+        )
+        op.create_index('ix_link_redirect_expires_at', 'link_redirect', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_link_redirect_expires_at', table_name='link_redirect')
+    op.drop_table('link_redirect')
+    # Помеченные ссылки при откате считаются удаленными окончательно
+    op.execute("DELETE FROM link WHERE deleted_at IS NOT NULL")
+    op.drop_index('ix_link_deleted_at', table_name='link')
+    op.drop_column('link', 'deleted_reason')
+    op.drop_column('link', 'deleted_at')
@@ -0,0 +1,37 @@
+"""drop link user fk
+
+Revision ID: d2a8f4c61b97
+Revises: c5e1d7a94f30
+Create Date: 2026-10-19 15:00:00.000000
+
+Ссылки распределены по шардам, а пользователи хранятся только в основной
+базе, поэтому внешний ключ link.user_id -> user.id в шарде 1 и дальше
+ссылался бы на пустую таблицу user. Ключ удаляется во всех базах; миграции
+применяются к основной базе и к каждой базе из SHARD_DATABASE_URLS (env.py).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a8f4c61b97'
+down_revision: Union[str, None] = 'c5e1d7a94f30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    for foreign_key in inspector.get_foreign_keys('link'):
+        if foreign_key['referred_table'] == 'user' and foreign_key['name']:
+            op.drop_constraint(foreign_key['name'], 'link', type_='foreignkey')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Ключ восстанавливается только в основной базе: в шардах таблица user пуста
+    if op.get_context().config.attributes.get('shard', 0) == 0:
+        op.create_foreign_key('link_user_id_fkey', 'link', 'user', ['user_id'], ['id'])
@@ -0,0 +1,40 @@
+"""link updated_at
+
+Revision ID: e4b9c3d07a15
+Revises: d2a8f4c61b97
+Create Date: 2026-10-19 16:00:00.000000
+
+Отметка updated_at меняется при создании ссылки, ее удалении и смене URL
+или срока; инкрементальное обновление снапшота редиректов читает строки,
+измененные после своей отметки. Значение по умолчанию now() вычисляется
+один раз, поэтому колонка добавляется без перезаписи таблицы; индекс
+строится CONCURRENTLY.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9c3d07a15'
+down_revision: Union[str, None] = 'd2a8f4c61b97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    # Базы, созданные через Base.metadata.create_all, уже содержат колонку
+    if 'updated_at' in {column['name'] for column in inspector.get_columns('link')}:
+        return
+    op.add_column('link', sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_link_updated_at', 'link', ['updated_at'], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_link_updated_at', table_name='link')
+    op.drop_column('link', 'updated_at')
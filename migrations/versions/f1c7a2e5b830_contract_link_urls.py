@@ -0,0 +1,86 @@
+"""contract link urls
+
+Revision ID: f1c7a2e5b830
+Revises: e4b9c3d07a15
+Create Date: 2026-10-19 18:00:00.000000
+
+Сужающая часть переноса original_url в таблицу url (расширяющая -
+8b42d6e1c5a0). Применяется, когда все экземпляры приложения уже работают
+на релизе, который читает URL через url_id:
+    alembic upgrade e4b9c3d07a15   # вместе с выкатом релиза
+    alembic upgrade head           # после выката на все экземпляры
+
+NOT NULL вводится через CHECK ... NOT VALID и отдельный VALIDATE, который не
+блокирует запись; SET NOT NULL после этого не сканирует таблицу (PostgreSQL 12+).
+Затем удаляются триггер синхронизации и колонки original_url и custom_alias.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7a2e5b830'
+down_revision: Union[str, None] = 'e4b9c3d07a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION link_sync_url() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.url_id IS DISTINCT FROM OLD.url_id THEN
+        NEW.original_url := (SELECT url FROM url WHERE id = NEW.url_id);
+    ELSIF NEW.url_id IS NULL OR (TG_OP = 'UPDATE' AND NEW.original_url IS DISTINCT FROM OLD.original_url) THEN
+        INSERT INTO url (url, url_hash)
+        VALUES (NEW.original_url, sha256(convert_to(NEW.original_url, 'UTF8')))
+        ON CONFLICT (url_hash) DO NOTHING;
+        NEW.url_id := (SELECT id FROM url WHERE url_hash = sha256(convert_to(NEW.original_url, 'UTF8')));
+    ELSIF NEW.original_url IS NULL THEN
+        NEW.original_url := (SELECT url FROM url WHERE id = NEW.url_id);
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('link')}
+    if 'original_url' not in columns:
+        # Схема создана через Base.metadata.create_all или уже сужена
+        return
+
+    op.execute(
+        "ALTER TABLE link ADD CONSTRAINT link_url_id_not_null CHECK (url_id IS NOT NULL) NOT VALID"
+    )
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE link VALIDATE CONSTRAINT link_url_id_not_null")
+    op.alter_column('link', 'url_id', nullable=False)
+    op.drop_constraint('link_url_id_not_null', 'link', type_='check')
+
+    op.execute("DROP TRIGGER IF EXISTS link_sync_url ON link")
+    op.execute("DROP FUNCTION IF EXISTS link_sync_url()")
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_link_custom_alias', table_name='link', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('link', 'custom_alias')
+    op.drop_column('link', 'original_url')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('link', sa.Column('original_url', sa.String(), nullable=True))
+    op.add_column('link', sa.Column('custom_alias', sa.String(), nullable=True))
+    op.execute("""
+        UPDATE link SET original_url = url.url, custom_alias = link.short_code
+        FROM url WHERE url.id = link.url_id
+    """)
+    op.execute(SYNC_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER link_sync_url BEFORE INSERT OR UPDATE ON link "
+        "FOR EACH ROW EXECUTE FUNCTION link_sync_url()"
+    )
+    op.alter_column('link', 'original_url', nullable=False)
+    op.create_index('ix_link_custom_alias', 'link', ['custom_alias'], unique=True)
+    op.alter_column('link', 'url_id', nullable=True)
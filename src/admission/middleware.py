@@ -0,0 +1,48 @@
+import json
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from src.admission.services import AdmissionController, AdmissionRejected, classify
+
+
+class AdmissionMiddleware:
+    """
+    ASGI-middleware контроля нагрузки: запрос занимает слот своего класса
+    маршрутов на все время обработки, включая отправку ответа. Если слот не
+    удалось получить, сразу отвечает 503 с Retry-After.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        name = classify(scope.get("method", ""), scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            route_class = await self.controller.acquire(name)
+        except AdmissionRejected as rejected:
+            await self.reject(send, self.controller.retry_after(rejected.route_class))
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class)
+
+    @staticmethod
+    async def reject(send: Send, retry_after: int):
+        body = json.dumps({"detail": "Сервис перегружен, повторите запрос позже"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,175 @@
+import asyncio
+import re
+import time
+
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Optional
+
+from src.metrics.metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_QUEUE_WAIT, ADMISSION_SHED
+
+
+@dataclass
+class RouteClass:
+    """
+    Класс маршрутов с собственным лимитом одновременных запросов.
+    :param priority: Чем меньше, тем раньше освободившийся слот достается классу
+    :param limit: Сколько запросов класса выполняется одновременно
+    :param queue_size: Сколько запросов может ждать слота, остальные получают 503
+    :param timeout: Сколько секунд запрос ждет слота, прежде чем получить 503
+    """
+    name: str
+    priority: int
+    limit: int
+    queue_size: int
+    timeout: float
+    in_flight: int = 0
+    waiters: deque = field(default_factory=deque)
+
+
+# Редиректы - основной трафик и самые дешевые запросы, поэтому получают
+# слоты первыми. Логины упираются в bcrypt, история и поиск читают много строк.
+ROUTE_CLASSES = (
+    RouteClass("redirect", priority=0, limit=32, queue_size=256, timeout=0.5),
+    RouteClass("default", priority=1, limit=16, queue_size=64, timeout=1.0),
+    RouteClass("write", priority=2, limit=8, queue_size=32, timeout=2.0),
+    RouteClass("auth", priority=3, limit=4, queue_size=16, timeout=2.0),
+    RouteClass("heavy", priority=4, limit=2, queue_size=8, timeout=2.0),
+    RouteClass("export", priority=5, limit=2, queue_size=0, timeout=0.0),
+)
+
+EXEMPT_PATHS = {"/", "/metrics", "/health", "/docs", "/redoc", "/openapi.json"}
+EXEMPT_PREFIXES = ("/admin/",)
+REDIRECT_PATH = re.compile(r"^/links/[^/]+$")
+HEAVY_PREFIXES = ("/links/history", "/links/search/")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """
+    Класс маршрута по методу и пути. Вызывается до роутинга, поэтому
+    шаблон маршрута еще неизвестен.
+    :return: Имя класса или None для маршрутов без ограничений
+    """
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/export/"):
+        return "export"
+    if path.startswith(HEAVY_PREFIXES):
+        return "heavy"
+    if path.startswith("/links/"):
+        if method == "GET":
+            return "redirect" if REDIRECT_PATH.match(path) else "default"
+        return "write"
+    return "default"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, route_class: RouteClass, reason: str):
+        super().__init__(f"{route_class.name}: {reason}")
+        self.route_class = route_class
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Ограничивает одновременные запросы воркера общим лимитом и лимитами классов.
+
+    Запрос, не получивший слот сразу, ждет в очереди своего класса не дольше
+    timeout. Освободившийся слот отдается ожидающим в порядке приоритета классов,
+    внутри класса - в порядке поступления. Если очередь класса заполнена или
+    срок ожидания истек, запрос отклоняется без обращения к базе.
+    """
+
+    def __init__(self, global_limit: int, route_classes: tuple[RouteClass, ...] = ROUTE_CLASSES,
+                 limits: Optional[dict[str, int]] = None):
+        limits = limits or {}
+        self.global_limit = global_limit
+        self.in_flight = 0
+        self.classes = {
+            route_class.name: replace(
+                route_class, limit=limits.get(route_class.name, route_class.limit), waiters=deque()
+            )
+            for route_class in route_classes
+        }
+        self._by_priority = sorted(self.classes.values(), key=lambda route_class: route_class.priority)
+
+    def _has_capacity(self, route_class: RouteClass) -> bool:
+        return self.in_flight < self.global_limit and route_class.in_flight < route_class.limit
+
+    def _admit(self, route_class: RouteClass):
+        self.in_flight += 1
+        route_class.in_flight += 1
+        ADMISSION_IN_FLIGHT.labels(route_class.name).inc()
+
+    async def acquire(self, name: str) -> RouteClass:
+        route_class = self.classes[name]
+        # Очередь класса непуста - значит слот уже ждут, обгонять их нельзя
+        if not route_class.waiters and self._has_capacity(route_class):
+            self._admit(route_class)
+            return route_class
+
+        if len(route_class.waiters) >= route_class.queue_size:
+            ADMISSION_SHED.labels(name, "queue_full").inc()
+            raise AdmissionRejected(route_class, "queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        route_class.waiters.append(waiter)
+        ADMISSION_QUEUE_DEPTH.labels(name).inc()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), route_class.timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Слот выдан в тот же момент, когда истек срок: принимаем его
+                return route_class
+            self._abandon(route_class, waiter)
+            ADMISSION_SHED.labels(name, "timeout").inc()
+            raise AdmissionRejected(route_class, "timeout")
+        except asyncio.CancelledError:
+            # Клиент отключился; если слот уже был выдан, возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release(route_class)
+            else:
+                self._abandon(route_class, waiter)
+            raise
+        finally:
+            ADMISSION_QUEUE_DEPTH.labels(name).dec()
+            ADMISSION_QUEUE_WAIT.labels(name).observe(time.perf_counter() - started)
+        return route_class
+
+    @staticmethod
+    def _abandon(route_class: RouteClass, waiter: asyncio.Future):
+        waiter.cancel()
+        route_class.waiters.remove(waiter)
+
+    def release(self, route_class: RouteClass):
+        self.in_flight -= 1
+        route_class.in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(route_class.name).dec()
+        self._wake()
+
+    def _wake(self):
+        for route_class in self._by_priority:
+            if self.in_flight >= self.global_limit:
+                return
+            while route_class.waiters and self._has_capacity(route_class):
+                waiter = route_class.waiters.popleft()
+                self._admit(route_class)
+                waiter.set_result(None)
+
+    def retry_after(self, route_class: RouteClass) -> int:
+        """Подсказка клиенту, через сколько секунд повторить запрос."""
+        return max(1, round(route_class.timeout))
+
+
+def parse_limits(value: str) -> dict[str, int]:
+    """Разбирает переопределение лимитов вида "redirect=64,auth=8"."""
+    limits = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, limit = part.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
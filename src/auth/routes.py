@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -10,12 +9,14 @@ from datetime import timedelta
 
 from src.models.models import User
 from src.auth import services
+from src.config import RATE_LIMIT_ENABLED
 from src.database import get_db
+from src.logs.services import audit
+from src.ratelimit.services import get_rate_limiter
 
 router = APIRouter()
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 3600
-templates = Jinja2Templates(directory='src/templates/')
 
 
 @router.post("/register")
@@ -43,7 +44,7 @@ async def register(username: str, email: str, password: str,
     await services.create_user(db, username, email, password)
 
     access_token = services.create_access_token(
-        data={"sub": username},
+        data={"sub": username, "role": "user"},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -68,15 +69,27 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(),
         :param form_data: Данные формы авторизации
         :return: Токен доступа
     """
+    # Подбор пароля к одной учетной записи с разных IP ограничиваем по имени пользователя
+    if RATE_LIMIT_ENABLED:
+        decision = await get_rate_limiter().hit("login_user", f"username:{form_data.username.lower()}")
+        if decision and not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много попыток входа",
+                headers=decision.headers(),
+            )
+
     user = await services.authenticate_user(db, form_data.username, form_data.password)
     if not user:
+        audit("login_failed", user=form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный логин или пароль"
         )
+    audit("login", user=user.username)
 
     access_token = services.create_access_token(
-        data={"sub": user.username},
+        data={"sub": user.username, "role": user.role},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -109,15 +109,20 @@ def create_access_token(data: dict, expires_delta: timedelta) -> str:
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def decode_access_token(token: str) -> Union[str, None]:
-    """Декодирует JWT-токен."""
+def decode_access_claims(token: str) -> Union[dict, None]:
+    """Декодирует JWT-токен и возвращает все его поля (sub, role, exp)."""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
 
 
+def decode_access_token(token: str) -> Union[str, None]:
+    """Декодирует JWT-токен."""
+    claims = decode_access_claims(token)
+    return claims.get("sub") if claims else None
+
+
 async def get_current_user(session: AsyncSession, token: str = Depends(oauth2_scheme)) -> User:
     """
     Получает текущего пользователя по токену
@@ -148,3 +153,22 @@ async def get_current_user(session: AsyncSession, token: str = Depends(oauth2_sc
         )
 
     return user
+
+
+async def get_current_admin(session: AsyncSession, token: str) -> User:
+    """
+    Получает текущего пользователя и проверяет, что у него роль admin
+
+    Args:
+        session (Session): Сессия базы данных
+        token (str): JWT-токен
+    Returns:
+        User: Текущий пользователь-администратор.
+    """
+    user = await get_current_user(session, token)
+    if user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Недостаточно прав",
+        )
+    return user
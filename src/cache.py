@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from fastapi_cache.backends import Backend
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.config import (
+    LOCAL_CACHE_SIZE,
+    REDIS_BREAKER_COOLDOWN,
+    REDIS_BREAKER_FAILURES,
+    REDIS_TIMEOUT,
+    REDIS_URL,
+)
+from src.metrics.context import request_stats
+from src.metrics.metrics import CACHE_REQUESTS, REDIS_BREAKER_STATE, REDIS_BREAKER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class RedisUnavailable(RedisError):
+    """Redis не ответил или предохранитель разомкнут. Наследует RedisError,
+    поэтому обработчики ошибок Redis срабатывают и на него."""
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для обращений к Redis.
+
+    После failure_threshold ошибок или таймаутов подряд размыкается, и
+    следующие cooldown секунд обращения сразу завершаются RedisUnavailable
+    без ожидания сокета. Затем пропускается один пробный запрос: при успехе
+    предохранитель замыкается и вызывает обработчики восстановления
+    (досылка накопленных локально данных), при ошибке снова размыкается.
+    """
+
+    def __init__(self, failure_threshold: int = REDIS_BREAKER_FAILURES,
+                 cooldown: float = REDIS_BREAKER_COOLDOWN, timeout: float = REDIS_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.timeout = timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._recover_callbacks: list[Callable[[], Awaitable[None]]] = []
+        REDIS_BREAKER_STATE.set(STATE_VALUES[CLOSED])
+
+    @property
+    def available(self) -> bool:
+        """Можно ли сейчас обращаться к Redis (без учета пробного запроса)."""
+        return self.state == CLOSED or time.monotonic() - self.opened_at >= self.cooldown
+
+    def on_recover(self, callback: Callable[[], Awaitable[None]]):
+        self._recover_callbacks.append(callback)
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning("Предохранитель Redis: %s -> %s", self.state, state)
+            self.state = state
+            REDIS_BREAKER_STATE.set(STATE_VALUES[state])
+            REDIS_BREAKER_TRANSITIONS.labels(state).inc()
+
+    async def call(self, awaitable: Awaitable[T]) -> T:
+        if self.state != CLOSED:
+            if self._probing or time.monotonic() - self.opened_at < self.cooldown:
+                # Корутина так и не будет выполнена - закрываем, чтобы не было предупреждений
+                getattr(awaitable, "close", lambda: None)()
+                raise RedisUnavailable("Redis недоступен (предохранитель разомкнут)")
+            self._probing = True
+            self._set_state(HALF_OPEN)
+
+        try:
+            result = await asyncio.wait_for(awaitable, self.timeout)
+        except (RedisError, OSError, asyncio.TimeoutError) as error:
+            self._failure()
+            raise RedisUnavailable(str(error) or type(error).__name__) from error
+        except BaseException:
+            self._probing = False
+            raise
+        await self._success()
+        return result
+
+    def _failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def _success(self):
+        self.failures = 0
+        if self.state == CLOSED:
+            return
+        self._probing = False
+        self._set_state(CLOSED)
+        for callback in self._recover_callbacks:
+            try:
+                await callback()
+            except RedisError:
+                logger.warning("Не удалось досинхронизировать данные после восстановления Redis")
+
+
+_redis: Optional[aioredis.Redis] = None
+redis_breaker = CircuitBreaker()
+
+
+def get_redis() -> aioredis.Redis:
+    """
+    Общий клиент Redis процесса (кэш, ограничение частоты запросов, счетчики).
+    Создается лениво, поэтому у каждого воркера после fork свой пул соединений.
+    Обращения к нему выполняются через redis_breaker.call.
+    """
+    global _redis
+    if _redis is None:
+        _redis = aioredis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT,
+        )
+    return _redis
+
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
+
+
+class LocalCache:
+    """Ограниченный LRU-кэш с TTL в памяти процесса."""
+
+    def __init__(self, max_size: int = LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._items: OrderedDict[str, tuple[Optional[float], str]] = OrderedDict()
+
+    def get_with_ttl(self, key: str) -> tuple[int, Optional[str]]:
+        item = self._items.get(key)
+        if item is None:
+            return 0, None
+        expires_at, value = item
+        now = time.monotonic()
+        if expires_at is not None and expires_at <= now:
+            del self._items[key]
+            return 0, None
+        self._items.move_to_end(key)
+        return (int(expires_at - now) if expires_at is not None else -1), value
+
+    def set(self, key: str, value: str, expire: Optional[int] = None):
+        self._items[key] = (time.monotonic() + expire if expire else None, value)
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def delete(self, key: str):
+        self._items.pop(key, None)
+
+    def clear(self):
+        self._items.clear()
+
+
+class FallbackCacheBackend(Backend):
+    """
+    Бэкенд fastapi-cache: Redis через предохранитель, а пока Redis недоступен -
+    локальный кэш процесса. После восстановления локальный кэш сбрасывается,
+    чтобы не отдавать данные, устаревшие относительно Redis.
+    """
+
+    def __init__(self, redis: aioredis.Redis, breaker: CircuitBreaker = redis_breaker,
+                 local: Optional[LocalCache] = None):
+        self.redis = redis
+        self.breaker = breaker
+        self.local = local or LocalCache()
+        breaker.on_recover(self._reset_local)
+
+    async def _reset_local(self):
+        self.local.clear()
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[str]]:
+        try:
+            pipeline = self.redis.pipeline()
+            pipeline.ttl(key)
+            pipeline.get(key)
+            ttl, value = await self.breaker.call(pipeline.execute())
+            cache = "fastapi-cache"
+        except RedisUnavailable:
+            ttl, value = self.local.get_with_ttl(key)
+            cache = "local"
+        result = "hit" if value is not None else "miss"
+        CACHE_REQUESTS.labels(cache, result).inc()
+        stats = request_stats.get()
+        if stats is not None:
+            stats.cache = result if cache == "fastapi-cache" else f"local_{result}"
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[str]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None):
+        try:
+            await self.breaker.call(self.redis.set(key, value, ex=expire))
+        except RedisUnavailable:
+            self.local.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if key:
+            self.local.delete(key)
+            return await self.breaker.call(self.redis.delete(key))
+        self.local.clear()
+        deleted = 0
+        async for name in self.redis.scan_iter(match=f"{namespace}:*"):
+            deleted += await self.breaker.call(self.redis.delete(name))
+        return deleted
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from src.cache import CircuitBreaker, RedisUnavailable, get_redis, redis_breaker
+from src.config import CACHE_BACKEND
+from src.links.services import add_clicks_in_db
+from src.sharding.router import ShardRouter, shard_router
+
+logger = logging.getLogger(__name__)
+
+CLICKS_KEY = "clicks:count"
+LAST_USED_KEY = "clicks:last_used"
+
+# Прибавляет переходы (тройки код, число, время) и сохраняет самое позднее
+# время перехода: досылка старых локальных данных не затирает более новое
+ADD_SCRIPT = """
+for i = 1, #ARGV, 3 do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    local last_used = tonumber(redis.call('HGET', KEYS[2], ARGV[i]) or '0')
+    if tonumber(ARGV[i + 2]) > last_used then
+        redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 2])
+    end
+end
+"""
+
+# Забирает накопленные счетчики и удаляет их одной атомарной операцией,
+# поэтому несколько воркеров могут выгружать клики одновременно
+DRAIN_SCRIPT = """
+local counts = redis.call('HGETALL', KEYS[1])
+local last_used = redis.call('HGETALL', KEYS[2])
+redis.call('DEL', KEYS[1], KEYS[2])
+return {counts, last_used}
+"""
+
+Clicks = dict[str, tuple[int, float]]
+
+
+class ClickBuffer:
+    """
+    Счетчики переходов по ссылкам, которые периодически записываются в базу
+    вместо UPDATE на каждый редирект.
+
+    Переходы копятся в хешах Redis (HINCRBY), общих для всех воркеров. Пока
+    Redis недоступен, они копятся в памяти процесса и после восстановления
+    досылаются в Redis.
+    """
+
+    def __init__(self, redis: Optional[aioredis.Redis], breaker: CircuitBreaker = redis_breaker):
+        self.redis = redis
+        self.breaker = breaker
+        self.counts: Counter = Counter()
+        self.last_used: dict[str, float] = {}
+        self._add = self._drain = None
+        if redis is not None:
+            self._add = redis.register_script(ADD_SCRIPT)
+            self._drain = redis.register_script(DRAIN_SCRIPT)
+            breaker.on_recover(self.reconcile)
+
+    def _add_local(self, clicks: Clicks):
+        for short_code, (count, last_used) in clicks.items():
+            self.counts[short_code] += count
+            self.last_used[short_code] = max(last_used, self.last_used.get(short_code, 0))
+
+    def _take_local(self) -> Clicks:
+        clicks = {code: (count, self.last_used[code]) for code, count in self.counts.items()}
+        self.counts = Counter()
+        self.last_used = {}
+        return clicks
+
+    async def _add_remote(self, clicks: Clicks):
+        args = []
+        for short_code, (count, last_used) in clicks.items():
+            args += [short_code, count, last_used]
+        await self.breaker.call(self._add(keys=[CLICKS_KEY, LAST_USED_KEY], args=args))
+
+    async def record(self, short_code: str, used_at: datetime):
+        clicks = {short_code: (1, used_at.timestamp())}
+        if self._add is not None:
+            try:
+                await self._add_remote(clicks)
+                return
+            except RedisUnavailable:
+                pass
+        self._add_local(clicks)
+
+    async def reconcile(self):
+        """Досылает в Redis переходы, накопленные локально, пока он был недоступен."""
+        clicks = self._take_local()
+        if not clicks:
+            return
+        try:
+            await self._add_remote(clicks)
+            logger.info("Досланы в Redis переходы по %s ссылкам", len(clicks))
+        except RedisUnavailable:
+            self._add_local(clicks)
+
+    async def drain(self) -> Clicks:
+        """Забирает все накопленные переходы: из Redis и из памяти процесса."""
+        clicks = self._take_local()
+        if self._drain is None or not self.breaker.available:
+            return clicks
+        try:
+            counts, last_used = await self.breaker.call(self._drain(keys=[CLICKS_KEY, LAST_USED_KEY]))
+        except RedisUnavailable:
+            return clicks
+        last_used = dict(zip(last_used[::2], last_used[1::2]))
+        remote = {
+            short_code: (int(count), float(last_used.get(short_code, 0)))
+            for short_code, count in zip(counts[::2], counts[1::2])
+        }
+        for short_code, (count, used_at) in clicks.items():
+            remote_count, remote_used_at = remote.get(short_code, (0, 0))
+            remote[short_code] = (remote_count + count, max(used_at, remote_used_at))
+        return remote
+
+    async def pending(self, short_code: str) -> tuple[int, Optional[float]]:
+        """
+        Переходы по коду, еще не записанные в базу: из Redis и из памяти процесса.
+        :return: Число переходов и время последнего из них (timestamp) или None
+        """
+        count = self.counts.get(short_code, 0)
+        last_used = self.last_used.get(short_code)
+        if self.redis is None or not self.breaker.available:
+            return count, last_used
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hget(CLICKS_KEY, short_code)
+        pipeline.hget(LAST_USED_KEY, short_code)
+        try:
+            remote_count, remote_used = await self.breaker.call(pipeline.execute())
+        except RedisUnavailable:
+            return count, last_used
+        if remote_count:
+            count += int(remote_count)
+            last_used = max(float(remote_used or 0), last_used or 0)
+        return count, last_used
+
+    def restore(self, clicks: Clicks):
+        """Возвращает переходы, которые не удалось записать в базу, до следующей выгрузки."""
+        self._add_local(clicks)
+
+
+async def flush_clicks(buffer: ClickBuffer, router: ShardRouter = shard_router) -> int:
+    """
+    Записывает накопленные переходы в таблицу link соответствующих шардов.
+    :return: Сколько ссылок обновлено
+    """
+    clicks = await buffer.drain()
+    by_shard: dict[int, Clicks] = {}
+    for short_code, click in clicks.items():
+        by_shard.setdefault(router.shard_for(short_code), {})[short_code] = click
+
+    flushed = 0
+    for shard, shard_clicks in by_shard.items():
+        try:
+            async with router.sessionmakers[shard]() as session:
+                await add_clicks_in_db(session, {
+                    short_code: (count, datetime.fromtimestamp(last_used))
+                    for short_code, (count, last_used) in shard_clicks.items()
+                })
+            flushed += len(shard_clicks)
+        except Exception:
+            logger.exception("Не удалось записать переходы в шард %s", shard)
+            buffer.restore(shard_clicks)
+    return flushed
+
+
+class ClickFlusher:
+    """
+    Фоновая задача воркера приложения, выгружающая переходы в базу. С Redis
+    периодическую выгрузку делает celery beat (flush_link_clicks), а воркер
+    только дописывает оставшееся в памяти при остановке.
+    """
+
+    def __init__(self, buffer: ClickBuffer, interval: float):
+        self.buffer = buffer
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await flush_clicks(self.buffer)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Переходы из памяти процесса пишем напрямую, чтобы не потерять при остановке
+        await flush_clicks(self.buffer)
+
+
+_buffer: Optional[ClickBuffer] = None
+
+
+def get_click_buffer() -> ClickBuffer:
+    global _buffer
+    if _buffer is None:
+        _buffer = ClickBuffer(None if CACHE_BACKEND == "memory" else get_redis())
+    return _buffer
@@ -9,4 +9,89 @@ DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 DB_NAME = os.getenv('DB_NAME')
 
+# Полный URL основной базы (например, sqlite+aiosqlite:///shard0.db для локального запуска).
+# Если не задан, собирается из DB_* выше.
+DATABASE_URL = os.getenv('DATABASE_URL')
+# Дополнительные шарды таблицы link через запятую; основная база - шард 0.
+# Новые шарды добавляются только в конец списка.
+SHARD_DATABASE_URLS = [url.strip() for url in os.getenv('SHARD_DATABASE_URLS', '').split(',') if url.strip()]
+
 SECRET_KEY = os.getenv('SECRET_KEY')
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
+# memory - кэш в памяти процесса вместо Redis (локальные прогоны и бенчмарки)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'redis')
+
+DEBUG = os.getenv('DEBUG', '0') == '1'
+# Создавать недостающие таблицы при старте (create_all). По умолчанию только в
+# DEBUG: в production схему ведут миграции alembic
+SCHEMA_CREATE = os.getenv('SCHEMA_CREATE', '1' if DEBUG else '0') == '1'
+
+# Профилирование SQL: порог медленного запроса, бюджет запросов на HTTP-запрос
+# и число повторов одного запроса, после которого он считается N+1
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', '10'))
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', '5'))
+
+# Мониторинг event loop: период замера и порог блокировки, после которого
+# в DEBUG-режиме в лог пишется стек блокирующего кода
+LOOP_LAG_INTERVAL = float(os.getenv('LOOP_LAG_INTERVAL', '0.25'))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv('LOOP_BLOCK_THRESHOLD_MS', '100'))
+
+# Снапшот редиректов для edge-режима (см. src/snapshot)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH')
+EDGE_MODE = os.getenv('EDGE_MODE', '0') == '1'
+
+# Запись трафика для воспроизведения (см. src/recording): файл JSON Lines
+# и доля записываемых запросов
+TRAFFIC_RECORD_PATH = os.getenv('TRAFFIC_RECORD_PATH')
+TRAFFIC_SAMPLE_RATE = float(os.getenv('TRAFFIC_SAMPLE_RATE', '0.01'))
+
+# Контроль нагрузки (см. src/admission): общий лимит одновременных запросов
+# на воркер и переопределение лимитов классов маршрутов, например "redirect=64,auth=8"
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', '1') == '1'
+ADMISSION_GLOBAL_LIMIT = int(os.getenv('ADMISSION_GLOBAL_LIMIT', '32'))
+ADMISSION_LIMITS = os.getenv('ADMISSION_LIMITS', '')
+
+# Ограничение частоты запросов (см. src/ratelimit): переопределение лимитов
+# вида "shorten:user=120/60,login:anonymous=20/60" (запросов за секунд)
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMITS = os.getenv('RATE_LIMITS', '')
+
+# Сколько секунд хранится ответ на запрос с Idempotency-Key
+IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+
+# Защита от зависания Redis: таймаут операций, число ошибок подряд до
+# размыкания предохранителя и пауза перед пробным запросом, секунды
+REDIS_TIMEOUT = float(os.getenv('REDIS_TIMEOUT', '0.1'))
+REDIS_BREAKER_FAILURES = int(os.getenv('REDIS_BREAKER_FAILURES', '5'))
+REDIS_BREAKER_COOLDOWN = float(os.getenv('REDIS_BREAKER_COOLDOWN', '5'))
+# Размер локального кэша на время недоступности Redis
+LOCAL_CACHE_SIZE = int(os.getenv('LOCAL_CACHE_SIZE', '10000'))
+# Как часто накопленные переходы по ссылкам записываются в базу, секунды
+CLICK_FLUSH_INTERVAL = float(os.getenv('CLICK_FLUSH_INTERVAL', '5'))
+
+# Celery: брокер и хранилище результатов задач
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
+# Обслуживание по расписанию (celery beat): через сколько дней без переходов
+# ссылка уходит в архив, как часто архивируются истекшие ссылки (секунды)
+# и сколько ссылок переносится в архив одной транзакцией
+UNUSED_LINK_DAYS = int(os.getenv('UNUSED_LINK_DAYS', '90'))
+EXPIRED_LINKS_INTERVAL = float(os.getenv('EXPIRED_LINKS_INTERVAL', '600'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+# Удаленные ссылки помечаются отметкой и переносятся в архив пачками по
+# PURGE_BATCH_SIZE раз в PURGE_INTERVAL секунд; старый код переименованной
+# ссылки ведет на новый еще RENAME_REDIRECT_TTL секунд
+PURGE_INTERVAL = float(os.getenv('PURGE_INTERVAL', '300'))
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', '5000'))
+RENAME_REDIRECT_TTL = int(os.getenv('RENAME_REDIRECT_TTL', '86400'))
+
+# Логирование (см. src/logs): уровень, формат (json или text), размер очереди
+# записей до фонового потока вывода и доля запросов в журнале доступа -
+# отдельно для редиректов, которых большинство
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '1.0'))
+ACCESS_LOG_REDIRECT_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_REDIRECT_SAMPLE_RATE', '0.01'))
@@ -2,11 +2,12 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from src.metrics.db import engine_options, instrument_engine
+from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, DATABASE_URL as DATABASE_URL_OVERRIDE
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+DATABASE_URL = DATABASE_URL_OVERRIDE or f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = instrument_engine(create_async_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL)))
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db():
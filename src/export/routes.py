@@ -0,0 +1,68 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import get_db
+from src.sharding.router import shard_router
+from src.auth.services import get_current_admin
+from src.export.services import EXPORT_FORMATS, EXPORT_TABLES, export_chunks
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+@router.get("/{table_name}")
+async def export_table(
+        table_name: str,
+        format: str = "ndjson",
+        compress: bool = False,
+        after_id: int = 0,
+        shard: int = 0,
+        request: Request = Request,
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    Потоковая выгрузка таблицы link или link_archive (только для администратора).
+    :param table_name: link или link_archive
+    :param format: csv или ndjson
+    :param compress: Сжать поток gzip на лету
+    :param after_id: Продолжить выгрузку с записи, следующей за указанным id
+    :param shard: Номер шарда (id уникальны только в пределах шарда)
+    :return: Поток CSV/NDJSON, упорядоченный по id
+    """
+    token = request.cookies.get("access_token")
+    if not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Пользователь не авторизован"
+        )
+    # Выгрузка содержит ссылки всех пользователей
+    await get_current_admin(db, token)
+
+    if table_name not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Таблица не найдена")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Неизвестный формат выгрузки")
+    if not 0 <= shard < len(shard_router):
+        raise HTTPException(status_code=404, detail="Шард не найден")
+
+    async def body():
+        # Сессия зависимости закрывается до отправки ответа,
+        # поэтому для потока открываем собственную.
+        async with shard_router.sessionmakers[shard]() as session:
+            async for chunk, _ in export_chunks(
+                    session, table_name, format, compress=compress, after_id=after_id
+            ):
+                yield chunk
+
+    filename = f"{table_name}.{shard}.{format}" + (".gz" if compress else "")
+    return StreamingResponse(
+        body(),
+        media_type="application/gzip" if compress else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import zlib
+
+from typing import AsyncIterator, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.models import Link, LinkArchive, Url
+
+# Для link подставляем сам URL из таблицы url, чтобы формат выгрузки
+# не зависел от нормализованного хранения.
+EXPORT_TABLES = {
+    "link": select(
+        Link.id, Url.url.label("original_url"), Link.short_code, Link.created_at,
+        Link.expires_at, Link.clicks, Link.last_used_at, Link.user_id
+    ).join(Url, Link.url_id == Url.id).where(Link.deleted_at.is_(None)).subquery("link"),
+    "link_archive": LinkArchive.__table__,
+}
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_BATCH_SIZE = 10_000
+
+
+def get_export_table(name: str):
+    """
+    Возвращает таблицу для выгрузки по имени.
+    :param name: Имя таблицы (link или link_archive)
+    :return: Таблица или подзапрос SQLAlchemy с колонкой id
+    """
+    if name not in EXPORT_TABLES:
+        raise ValueError(f"Неизвестная таблица для выгрузки: {name}")
+    return EXPORT_TABLES[name]
+
+
+async def stream_batches(
+        session: AsyncSession,
+        table,
+        after_id: int = 0,
+        batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[list[dict]]:
+    """
+    Потоково читает строки таблицы пачками через серверный курсор.
+
+    Строки упорядочены по id, поэтому id последней строки пачки служит
+    контрольной точкой для продолжения выгрузки.
+    :param session: Сессия базы данных
+    :param table: Таблица или подзапрос для выгрузки
+    :param after_id: Выгружать строки с id больше указанного
+    :param batch_size: Размер пачки
+    """
+    query = (
+        select(table)
+        .where(table.c.id > after_id)
+        .order_by(table.c.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await session.stream(query)
+    async for partition in result.mappings().partitions(batch_size):
+        yield [dict(row) for row in partition]
+
+
+def _serialize_value(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def format_batch(rows: Iterable[dict], columns: list[str], export_format: str,
+                 with_header: bool = False) -> str:
+    """
+    Сериализует пачку строк в CSV или NDJSON.
+    :param rows: Строки для сериализации
+    :param columns: Порядок колонок
+    :param export_format: csv или ndjson
+    :param with_header: Добавить заголовок (только для CSV)
+    :return: Текст пачки
+    """
+    buffer = io.StringIO()
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        if with_header:
+            writer.writerow(columns)
+        for row in rows:
+            writer.writerow(["" if row[c] is None else _serialize_value(row[c]) for c in columns])
+    else:
+        for row in rows:
+            buffer.write(json.dumps({c: _serialize_value(row[c]) for c in columns}, ensure_ascii=False))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+
+class GzipStream:
+    """Инкрементальное gzip-сжатие потока без буферизации всего вывода."""
+
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+
+async def export_chunks(
+        session: AsyncSession,
+        table_name: str,
+        export_format: str = "ndjson",
+        compress: bool = False,
+        after_id: int = 0,
+        batch_size: int = EXPORT_BATCH_SIZE,
+        with_header: Optional[bool] = None
+) -> AsyncIterator[tuple[bytes, int]]:
+    """
+    Выгружает таблицу в виде потока байтов.
+
+    Отдает пары (кусок данных, id последней выгруженной строки), так что
+    вызывающий код может сохранять контрольную точку после каждой пачки.
+    :param session: Сессия базы данных
+    :param table_name: link или link_archive
+    :param export_format: csv или ndjson
+    :param compress: Сжимать ли поток gzip
+    :param after_id: Продолжить выгрузку после указанного id
+    :param batch_size: Размер пачки
+    :param with_header: Писать заголовок CSV (по умолчанию только с начала выгрузки)
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {export_format}")
+
+    table = get_export_table(table_name)
+    columns = [column.name for column in table.columns]
+    gzip_stream = GzipStream() if compress else None
+    header = with_header if with_header is not None else after_id == 0
+    last_id = after_id
+
+    async for rows in stream_batches(session, table, after_id, batch_size):
+        last_id = rows[-1]["id"]
+        data = format_batch(rows, columns, export_format, with_header=header).encode()
+        header = False
+        if gzip_stream:
+            data = gzip_stream.compress(data)
+        if data:
+            yield data, last_id
+
+    if gzip_stream:
+        yield gzip_stream.flush(), last_id
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.auth.services import decode_access_claims
+from src.cache import get_redis, redis_breaker
+from src.config import CACHE_BACKEND, IDEMPOTENCY_TTL
+from src.metrics.metrics import IDEMPOTENCY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "idempotency"
+MAX_KEY_LENGTH = 255
+# Сколько держится отметка "запрос выполняется", если воркер упал, не дописав ответ
+PENDING_TTL = 30
+WAIT_TIMEOUT = 10.0
+POLL_INTERVAL = 0.05
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+StoredResponse = tuple[int, str]
+
+
+def request_fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def replay_response(stored: StoredResponse) -> Response:
+    status_code, body = stored
+    return Response(
+        content=body, status_code=status_code, media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+class LocalRecords:
+    """Записи в памяти процесса для запуска без Redis (CACHE_BACKEND=memory)."""
+
+    def __init__(self):
+        self._records: dict[str, tuple[float, dict]] = {}
+
+    def _purge(self, now: float):
+        for key in [key for key, (expires, _) in self._records.items() if expires <= now]:
+            del self._records[key]
+
+    async def get(self, key: str) -> Optional[dict]:
+        record = self._records.get(key)
+        if record is None or record[0] <= time.monotonic():
+            return None
+        return record[1]
+
+    async def set(self, key: str, value: dict, ttl: int, only_new: bool = False) -> bool:
+        now = time.monotonic()
+        self._purge(now)
+        if only_new and key in self._records:
+            return False
+        self._records[key] = (now + ttl, value)
+        return True
+
+    async def delete(self, key: str):
+        self._records.pop(key, None)
+
+
+class RedisRecords:
+    """Записи в Redis; обращения идут через предохранитель redis_breaker."""
+
+    def __init__(self, redis: aioredis.Redis):
+        self.redis = redis
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await redis_breaker.call(self.redis.get(key))
+        return json.loads(value) if value else None
+
+    async def set(self, key: str, value: dict, ttl: int, only_new: bool = False) -> bool:
+        return bool(await redis_breaker.call(self.redis.set(key, json.dumps(value), ex=ttl, nx=only_new)))
+
+    async def delete(self, key: str):
+        await redis_breaker.call(self.redis.delete(key))
+
+
+class IdempotencyStore:
+    """
+    Выполняет обработчик не больше одного раза на Idempotency-Key.
+
+    Первый запрос ставит в Redis отметку pending (SET NX) и после успешного
+    ответа сохраняет его на IDEMPOTENCY_TTL. Повтор получает сохраненный ответ
+    без обращения к базе. Дубликаты, пришедшие в тот же воркер во время
+    выполнения, ждут общий future; пришедшие в другие воркеры опрашивают Redis.
+    Ключ с другим телом запроса отклоняется с 422. Ответы с ошибкой не
+    сохраняются, и повтор выполняется заново.
+    """
+
+    def __init__(self, records, ttl: int = IDEMPOTENCY_TTL):
+        self.records = records
+        self.ttl = ttl
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, fingerprint: str,
+                  handler: Callable[[], Awaitable[Response]]) -> Response:
+        """
+        :param key: Ключ с учетом маршрута и владельца запроса
+        :param fingerprint: Хеш тела запроса
+        :param handler: Корутина, выполняющая запрос
+        """
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            IDEMPOTENCY_REQUESTS.labels("joined").inc()
+            stored_fingerprint, stored = await asyncio.shield(in_flight)
+            self._check_fingerprint(stored_fingerprint, fingerprint)
+            return replay_response(stored)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            response = await self._run(key, fingerprint, handler)
+        except asyncio.CancelledError:
+            # Клиент первого запроса отключился: дубликатам предлагаем повторить
+            future.set_exception(self._conflict())
+            future.exception()
+            raise
+        except Exception as error:
+            # Дубликаты получают ту же ошибку; без них не оставляем ее необработанной
+            future.set_exception(error)
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        future.set_result((fingerprint, (response.status_code, response.body.decode())))
+        return response
+
+    async def _run(self, key: str, fingerprint: str, handler: Callable[[], Awaitable[Response]]) -> Response:
+        try:
+            acquired = await self.records.set(
+                key, {"state": "pending", "fingerprint": fingerprint}, PENDING_TTL, only_new=True
+            )
+        except RedisError:
+            logger.warning("Redis недоступен, запрос с Idempotency-Key выполняется без защиты от повторов")
+            return await handler()
+
+        if not acquired:
+            record = await self._wait(key)
+            self._check_fingerprint(record["fingerprint"], fingerprint)
+            IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+            return replay_response((record["status"], record["body"]))
+
+        IDEMPOTENCY_REQUESTS.labels("new").inc()
+        try:
+            response = await handler()
+        except BaseException:
+            await self._forget(key)
+            raise
+
+        if 200 <= response.status_code < 300:
+            try:
+                await self.records.set(key, {
+                    "state": "done",
+                    "fingerprint": fingerprint,
+                    "status": response.status_code,
+                    "body": response.body.decode(),
+                }, self.ttl)
+            except RedisError:
+                logger.warning("Не удалось сохранить ответ для Idempotency-Key")
+        else:
+            await self._forget(key)
+        return response
+
+    async def _forget(self, key: str):
+        try:
+            await self.records.delete(key)
+        except RedisError:
+            pass
+
+    async def _wait(self, key: str) -> dict:
+        """Ждет, пока другой воркер допишет ответ."""
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while True:
+            record = await self.records.get(key)
+            if record and record["state"] == "done":
+                return record
+            if record is None or time.monotonic() >= deadline:
+                # Первый запрос завершился ошибкой или выполняется слишком долго
+                raise self._conflict()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    @staticmethod
+    def _conflict() -> HTTPException:
+        IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Запрос с этим Idempotency-Key еще выполняется, повторите позже",
+        )
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str):
+        if stored != fingerprint:
+            IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key уже использован с другим телом запроса",
+            )
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        records = LocalRecords() if CACHE_BACKEND == "memory" else RedisRecords(get_redis())
+        _store = IdempotencyStore(records)
+    return _store
+
+
+def idempotency_key(request: Request, route: str, key: str) -> str:
+    """
+    Ключ в хранилище с учетом владельца запроса (пользователь из токена или IP),
+    чтобы одинаковые Idempotency-Key разных клиентов не пересекались.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Слишком длинный Idempotency-Key")
+    claims = decode_access_claims(request.cookies.get("access_token", ""))
+    if claims and claims.get("sub"):
+        owner = f"user:{claims['sub']}"
+    else:
+        owner = f"ip:{request.client.host if request.client else 'unknown'}"
+    return f"{KEY_PREFIX}:{route}:{owner}:{key}"
@@ -0,0 +1,248 @@
+"""
+Массовый импорт ссылок из CSV/NDJSON через COPY.
+
+Пример:
+    python -m src.importer.cli legacy_links.ndjson --format ndjson --workers 8
+
+Строки валидируются в отдельных процессах и загружаются в базу пачками через
+asyncpg copy_records_to_table во временную таблицу, откуда новые URL переносятся
+в url, а ссылки - в link одним INSERT ... ON CONFLICT. После каждой пачки в файл контрольной точки
+записывается число обработанных строк, поэтому прерванный импорт продолжается
+повторным запуском той же команды.
+
+Каждая запись загружается в шард, которому принадлежит ее short_code.
+user_id, которых нет среди пользователей основной базы, заменяются на NULL.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import asyncpg
+
+from src.importer.services import IMPORT_COLUMNS, IMPORT_FORMATS, read_raw_rows, validate_chunk
+from src.sharding.router import shard_router
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 50_000
+STAGING_TABLE = "link_import"
+
+CREATE_STAGING = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    original_url TEXT NOT NULL,
+    url_hash BYTEA NOT NULL,
+    short_code VARCHAR NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    expires_at TIMESTAMP WITHOUT TIME ZONE,
+    clicks INTEGER NOT NULL,
+    last_used_at TIMESTAMP WITHOUT TIME ZONE,
+    user_id INTEGER
+) ON COMMIT DELETE ROWS
+"""
+
+MERGE_URLS = f"""
+INSERT INTO url (url, url_hash)
+SELECT DISTINCT ON (url_hash) original_url, url_hash
+FROM {STAGING_TABLE}
+ON CONFLICT (url_hash) DO NOTHING
+"""
+
+# DISTINCT ON убирает дубликаты кодов внутри одной пачки,
+# иначе ON CONFLICT DO UPDATE не сможет обновить строку дважды.
+MERGE_LINKS = f"""
+INSERT INTO link (url_id, short_code, created_at, expires_at, clicks, last_used_at, user_id)
+SELECT DISTINCT ON (s.short_code)
+       u.id, s.short_code, s.created_at, s.expires_at, s.clicks, s.last_used_at, s.user_id
+FROM {STAGING_TABLE} s
+JOIN url u ON u.url_hash = s.url_hash
+ORDER BY s.short_code
+ON CONFLICT {{conflict}}
+"""
+
+# Перезапись помеченной удаленной ссылки снимает отметку: импортированная
+# ссылка должна обслуживаться, а не уйти в архив при purge_deleted_links
+ON_CONFLICT = {
+    "skip": "DO NOTHING",
+    "overwrite": """(short_code) DO UPDATE SET
+        url_id = EXCLUDED.url_id,
+        expires_at = EXCLUDED.expires_at,
+        clicks = EXCLUDED.clicks,
+        last_used_at = EXCLUDED.last_used_at,
+        deleted_at = NULL,
+        deleted_reason = NULL,
+        updated_at = CURRENT_TIMESTAMP""",
+}
+
+
+def load_checkpoint(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        return json.load(file)["rows_done"]
+
+
+def save_checkpoint(path: str, rows_done: int):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({"rows_done": rows_done}, file)
+    os.replace(tmp_path, path)
+
+
+def shard_dsns() -> list[str]:
+    """DSN шардов для прямого подключения asyncpg."""
+    return [
+        shard_engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        for shard_engine in shard_router.engines
+    ]
+
+
+def split_by_shard(records: list[tuple]) -> dict[int, list[tuple]]:
+    code_position = IMPORT_COLUMNS.index("short_code")
+    by_shard = {}
+    for record in records:
+        by_shard.setdefault(shard_router.shard_for(record[code_position]), []).append(record)
+    return by_shard
+
+
+def chunked(rows, size: int):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+async def clear_unknown_users(connection: asyncpg.Connection, records: list[tuple]) -> tuple[list[tuple], int]:
+    """
+    Заменяет на NULL user_id, которых нет в таблице user. Пользователи
+    хранятся только в основной базе, поэтому проверка идет по ней, а не
+    внешним ключом в шарде.
+    :param connection: Соединение с основной базой (шард 0)
+    :return: Записи и число замененных user_id
+    """
+    position = IMPORT_COLUMNS.index("user_id")
+    user_ids = {record[position] for record in records if record[position] is not None}
+    if not user_ids:
+        return records, 0
+    rows = await connection.fetch('SELECT id FROM "user" WHERE id = ANY($1::int[])', list(user_ids))
+    known = {row["id"] for row in rows}
+    if len(known) == len(user_ids):
+        return records, 0
+
+    cleared = 0
+    checked = []
+    for record in records:
+        if record[position] is not None and record[position] not in known:
+            record = record[:position] + (None,) + record[position + 1:]
+            cleared += 1
+        checked.append(record)
+    return checked, cleared
+
+
+async def load_batch(connection: asyncpg.Connection, records: list[tuple], on_conflict: str) -> int:
+    """
+    Загружает пачку записей в link в одной транзакции.
+    :return: Количество вставленных или обновленных строк
+    """
+    async with connection.transaction():
+        await connection.copy_records_to_table(STAGING_TABLE, records=records, columns=IMPORT_COLUMNS)
+        await connection.execute(MERGE_URLS)
+        status = await connection.execute(MERGE_LINKS.format(conflict=ON_CONFLICT[on_conflict]))
+    return int(status.split()[-1])
+
+
+async def run_import(path: str, import_format: str, checkpoint: str, batch_size: int,
+                     workers: int, on_conflict: str, rebuild_indexes: bool):
+    rows_done = load_checkpoint(checkpoint)
+    if rows_done:
+        logger.info("Продолжаем импорт со строки %s", rows_done)
+
+    loop = asyncio.get_running_loop()
+    connections = [await asyncpg.connect(dsn) for dsn in shard_dsns()]
+    stats = {"read": 0, "loaded": 0, "invalid": 0, "unknown_users": 0}
+    started = time.monotonic()
+
+    try:
+        for connection in connections:
+            await connection.execute(CREATE_STAGING)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = chunked(read_raw_rows(path, import_format, skip=rows_done), batch_size)
+            pending = deque()
+
+            # Держим в работе ограниченное число пачек: валидация следующих
+            # идет параллельно с загрузкой текущей, а файл не читается целиком.
+            for chunk in itertools.islice(chunks, workers * 2):
+                pending.append((len(chunk), loop.run_in_executor(executor, validate_chunk, chunk)))
+
+            while pending:
+                size, future = pending.popleft()
+                records, errors = await future
+                next_chunk = next(chunks, None)
+                if next_chunk:
+                    pending.append((len(next_chunk), loop.run_in_executor(executor, validate_chunk, next_chunk)))
+
+                for error in errors[:10]:
+                    logger.warning("Пропущена строка: %s", error)
+
+                records, unknown_users = await clear_unknown_users(connections[0], records)
+                for shard, shard_records in split_by_shard(records).items():
+                    stats["loaded"] += await load_batch(connections[shard], shard_records, on_conflict)
+                stats["read"] += size
+                stats["invalid"] += len(errors)
+                stats["unknown_users"] += unknown_users
+                rows_done += size
+                save_checkpoint(checkpoint, rows_done)
+
+                elapsed = time.monotonic() - started
+                logger.info(
+                    "Обработано %s строк (загружено %s, ошибок %s, неизвестных пользователей %s), %.0f строк/с",
+                    stats["read"], stats["loaded"], stats["invalid"], stats["unknown_users"],
+                    stats["read"] / max(elapsed, 1e-9)
+                )
+
+        logger.info("Обновляем статистику планировщика для url и link")
+        for connection in connections:
+            if rebuild_indexes:
+                await connection.execute("REINDEX TABLE url")
+                await connection.execute("REINDEX TABLE link")
+            await connection.execute("ANALYZE url")
+            await connection.execute("ANALYZE link")
+    finally:
+        for connection in connections:
+            await connection.close()
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Импорт завершен за %.1f с: %s строк, %.0f строк/с; user_id без пользователя заменено на NULL: %s",
+        elapsed, stats["read"], stats["read"] / max(elapsed, 1e-9), stats["unknown_users"]
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовый импорт ссылок через COPY")
+    parser.add_argument("path", help="Файл CSV или NDJSON")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default="ndjson")
+    parser.add_argument("--checkpoint", help="Файл контрольной точки (по умолчанию <path>.checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--on-conflict", choices=sorted(ON_CONFLICT), default="skip",
+                        help="Что делать с уже существующими кодами")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="Перестроить индексы link после загрузки")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_import(
+        args.path, args.format, args.checkpoint or args.path + ".checkpoint",
+        args.batch_size, args.workers, args.on_conflict, args.rebuild_indexes
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import csv
+import json
+import re
+
+from datetime import datetime
+from typing import Iterator, Optional
+
+from src.utils import url_hash
+
+IMPORT_COLUMNS = (
+    "original_url",
+    "url_hash",
+    "short_code",
+    "created_at",
+    "expires_at",
+    "clicks",
+    "last_used_at",
+    "user_id",
+)
+IMPORT_FORMATS = ("csv", "ndjson")
+SHORT_CODE_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def read_raw_rows(path: str, import_format: str, skip: int = 0) -> Iterator[object]:
+    """
+    Построчно читает файл импорта, не загружая его целиком в память.
+
+    Для CSV возвращает словари (разбор кавычек выполняется здесь, чтобы
+    корректно обрабатывать многострочные поля), для NDJSON - сырые строки,
+    которые разбираются уже в процессах-валидаторах.
+    :param path: Путь к файлу
+    :param import_format: csv или ndjson
+    :param skip: Сколько строк данных пропустить (продолжение импорта)
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if import_format == "csv":
+            rows = csv.DictReader(file)
+        else:
+            rows = (line for line in file if line.strip())
+        for number, row in enumerate(rows):
+            if number >= skip:
+                yield row
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if value in (None, "", "None"):
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    return datetime.fromisoformat(value)
+
+
+def validate_row(raw) -> tuple:
+    """
+    Проверяет одну строку импорта и приводит ее к записи для COPY.
+    :param raw: Словарь (CSV) или строка JSON (NDJSON)
+    :return: Кортеж значений в порядке IMPORT_COLUMNS
+    """
+    row = json.loads(raw) if isinstance(raw, str) else raw
+
+    original_url = (row.get("original_url") or "").strip()
+    if not original_url:
+        raise ValueError("пустой original_url")
+
+    short_code = (row.get("short_code") or "").strip()
+    if not SHORT_CODE_RE.match(short_code):
+        raise ValueError(f"некорректный short_code: {short_code!r}")
+
+    created_at = _parse_datetime(row.get("created_at")) or datetime.now()
+    clicks = int(row.get("clicks") or 0)
+    if clicks < 0:
+        raise ValueError("отрицательное число кликов")
+    user_id = row.get("user_id")
+
+    return (
+        original_url,
+        url_hash(original_url),
+        short_code,
+        created_at,
+        _parse_datetime(row.get("expires_at")),
+        clicks,
+        _parse_datetime(row.get("last_used_at")),
+        int(user_id) if user_id not in (None, "") else None,
+    )
+
+
+def validate_chunk(rows: list) -> tuple[list[tuple], list[str]]:
+    """
+    Валидирует пачку строк. Выполняется в процессах пула.
+    :param rows: Сырые строки
+    :return: Корректные записи и описания ошибок
+    """
+    records = []
+    errors = []
+    for raw in rows:
+        try:
+            records.append(validate_row(raw))
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            errors.append(f"{e}: {str(raw)[:200]}")
+    return records, errors
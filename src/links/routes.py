@@ -1,9 +1,10 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi_cache.decorator import cache
 
-from celery.result import AsyncResult
-
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy import select
@@ -11,15 +12,28 @@ from sqlalchemy import select
 from datetime import datetime
 
 from src.links.models import LinkCreate
-from src.models.models import Link, LinkArchive
+from src.idempotency.services import get_idempotency_store, idempotency_key, request_fingerprint
+from src.models.models import Link, LinkArchive, Url
 from src.database import get_db
-from src.utils import generate_short_code
+from src.sharding.router import get_shard_db, shard_router
+from src.config import EDGE_MODE, SNAPSHOT_PATH
+from src.snapshot.services import get_snapshot
+from src.utils import generate_short_code, url_hash
 from src.auth.services import get_current_user
-from src.tasks.tasks import delete_unused_links
-from src.links.services import create_link_in_db, add_half_year, update_link_stat_in_db, \
-    update_link_in_db
+from src.cache import redis_breaker
+from src.clicks.services import get_click_buffer
+from src.logs.services import audit
+from src.links.services import create_link_in_db, add_half_year, get_rename_target, mark_link_deleted, \
+    rename_link_in_db, serialize_link, with_scheme
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def internal_error() -> HTTPException:
+    """Ответ 500 без текста исключения: в нем может оказаться SQL. Само исключение пишется в лог."""
+    logger.exception("Ошибка обработки запроса")
+    return HTTPException(status_code=500, detail="Произошла ошибка")
 
 
 @router.post("/shorten")
@@ -28,6 +42,22 @@ async def create_link(
         request: Request,
         db: AsyncSession = Depends(get_db),
 ):
+    """
+        Создание коротких ссылок.
+        Повтор запроса с тем же заголовком Idempotency-Key возвращает
+        сохраненный ответ первого запроса и не создает новую ссылку.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if not key:
+        return await shorten_link(link_data, request, db)
+    return await get_idempotency_store().run(
+        idempotency_key(request, "shorten", key),
+        request_fingerprint(await request.body()),
+        lambda: shorten_link(link_data, request, db),
+    )
+
+
+async def shorten_link(link_data: LinkCreate, request: Request, db: AsyncSession) -> JSONResponse:
     """
         Создание коротких ссылок.
         Принимает JSON с полями:
@@ -46,65 +76,84 @@ async def create_link(
             :param original_url: Оригинальный URL
 """
     try:
-        if link_data.custom_alias:
-            result = await db.execute(select(Link).filter_by(custom_alias=link_data.custom_alias))
-            existing_link = result.scalars().first()
-            if existing_link:
-                raise HTTPException(status_code=400, detail="Такой алиас уже занят")
-
         short_code = link_data.custom_alias or generate_short_code()
-        token = request.cookies.get("access_token")
-        current_user = await get_current_user(db, token)
-        expires_at = link_data.expires_at or add_half_year()
-        if current_user:
-            user_id = current_user.id
-
-        new_link = await create_link_in_db(
-            session=db,
-            original_url=link_data.original_url,
-            short_code=short_code,
-            custom_alias=short_code,
-            created_at=datetime.now(),
-            expires_at=expires_at,
-            user_id=user_id
-        )
+
+        async with shard_router.session_for(short_code, db) as link_db:
+            if link_data.custom_alias:
+                # Код удаленной ссылки свободен: create_link_in_db сразу переносит ее в архив
+                result = await link_db.execute(
+                    select(Link).filter_by(custom_alias=link_data.custom_alias, deleted_at=None)
+                )
+                existing_link = result.scalars().first()
+                if existing_link:
+                    raise HTTPException(status_code=400, detail="Такой алиас уже занят")
+
+            token = request.cookies.get("access_token")
+            current_user = await get_current_user(db, token)
+            expires_at = link_data.expires_at or add_half_year()
+            if current_user:
+                user_id = current_user.id
+
+            new_link = await create_link_in_db(
+                session=link_db,
+                original_url=link_data.original_url,
+                short_code=short_code,
+                created_at=datetime.now(),
+                expires_at=expires_at,
+                user_id=user_id
+            )
         content = {
             "short_code": new_link.short_code,
             "original_url": link_data.original_url
         }
         return JSONResponse(content=content)
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.get("/{short_code}")
-async def redirect_to_original_url(short_code: str, db: AsyncSession = Depends(get_db)):
+async def redirect_to_original_url(short_code: str, request: Request, db: AsyncSession = Depends(get_shard_db)):
     """
         Переход по сокращенной ссылке на оригинальный URL.
         :param short_code:
         :return: Редирект на оригинальный URL
     """
+    if EDGE_MODE:
+        # Снапшот отвечает без обращения к базе, переходы при этом не считаются.
+        # Удаления и переименования он видит только после обновления (src.snapshot.cli),
+        # поэтому вне edge-режима редирект всегда идет через базу
+        snapshot = get_snapshot(SNAPSHOT_PATH)
+        original_url = snapshot.resolve(short_code) if snapshot else None
+        if not original_url:
+            raise HTTPException(status_code=404, detail="Ссылка не найдена")
+        return RedirectResponse(url=with_scheme(original_url))
+
     try:
-        result = await db.execute(select(Link).filter_by(short_code=short_code))
+        result = await db.execute(select(Link).filter_by(short_code=short_code, deleted_at=None))
         current_link = result.scalars().first()
 
         if not current_link:
+            new_code = await get_rename_target(db, short_code)
+            if new_code:
+                return RedirectResponse(url=str(request.url_for("redirect_to_original_url", short_code=new_code)))
             raise HTTPException(status_code=404, detail="Ссылка не найдена")
 
-        await update_link_stat_in_db(db, short_code, datetime.now(), current_link.clicks + 1)
+        # Переход учитывается в буфере и попадает в базу при следующей выгрузке
+        await get_click_buffer().record(short_code, datetime.now())
 
-        original_url = current_link.original_url
-        if not original_url.startswith("http://") and not original_url.startswith("https://"):
-            original_url = "https://" + original_url
-
-        return RedirectResponse(url=original_url)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return RedirectResponse(url=with_scheme(current_link.original_url))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.delete("/{short_code}")
-async def delete_link(short_code: str, db: Session = Depends(get_db), request: Request = Request):
+async def delete_link(short_code: str, db: Session = Depends(get_db), request: Request = Request,
+                      link_db: AsyncSession = Depends(get_shard_db)):
     """
         Удаляет связь сокращенной ссылки с БД.
         :param short_code: Короткий код ссылки
@@ -123,17 +172,16 @@ async def delete_link(short_code: str, db: Session = Depends(get_db), request: R
                 status_code=401,
                 detail="Пользователь не авторизован"
             )
-        result = await db.execute(select(Link).filter_by(short_code=short_code))
-        current_link = result.scalars().first()
-
-        if not current_link:
+        # Строка только помечается удаленной; в архив ее переносит purge_deleted_links
+        if not await mark_link_deleted(link_db, short_code):
             raise HTTPException(status_code=404, detail="Ссылка не найдена")
+        audit("link_deleted", short_code=short_code, user=current_user.username)
 
-        await db.delete(current_link)
-        await db.commit()
         return JSONResponse(status_code=204, content={})
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.put("/{short_code}")
@@ -142,6 +190,7 @@ async def update_link(
         new_code: str = None,
         request: Request = Request,
         db: AsyncSession = Depends(get_db),
+        link_db: AsyncSession = Depends(get_shard_db),
 ):
     """
     Обновляет связь сокращенной ссылки с БД.
@@ -167,47 +216,50 @@ async def update_link(
                 detail="Пользователь не авторизован"
             )
 
-        result = await db.execute(select(Link).filter_by(short_code=short_code))
+        result = await link_db.execute(select(Link).filter_by(short_code=short_code, deleted_at=None))
         current_link = result.scalars().first()
 
         if not current_link:
             raise HTTPException(status_code=404, detail="Ссылка не найдена")
 
-        await update_link_in_db(db, current_link, new_code)
+        if shard_router.shard_for(new_code) == shard_router.shard_for(short_code):
+            await rename_link_in_db(link_db, link_db, current_link, new_code)
+        else:
+            # Новый код принадлежит другому шарду - создаем ссылку там
+            async with shard_router.session_for(new_code, db) as target_db:
+                await rename_link_in_db(link_db, target_db, current_link, new_code)
+        audit("link_renamed", short_code=short_code, new_code=new_code, user=current_user.username)
 
         return JSONResponse(status_code=200, content={"message": "Ссылка обновлена"})
 
-    except HTTPException as http_error:
-        raise http_error
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.get("/stats/{short_code}")
-async def get_link_stats(short_code: str, db: AsyncSession = Depends(get_db)):
+async def get_link_stats(short_code: str, db: AsyncSession = Depends(get_shard_db)):
     """
     Получение статистики для сокращенной ссылки.
     :param short_code: Короткий код ссылки
     :return: Информация о ссылке
     """
     try:
-        result = await db.execute(select(Link).filter_by(short_code=short_code))
+        result = await db.execute(select(Link).filter_by(short_code=short_code, deleted_at=None))
         links = result.scalars().all()
 
         if not links:
             raise HTTPException(status_code=404, detail="Ссылка не найдена")
 
-        response = [{
-            "original_url": link.original_url,
-            "created_at": str(link.created_at),
-            "clicks": link.clicks,
-            "last_used_at": str(link.last_used_at)
-        } for link in links]
-
-        return response
+        # Переходы копятся в буфере до выгрузки в базу - добавляем еще не записанные
+        pending = await get_click_buffer().pending(short_code)
+        return [serialize_link(link, pending) for link in links]
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.get("/search/{original_url}")
@@ -219,25 +271,25 @@ async def search_link(original_url: str, db: AsyncSession = Depends(get_db)):
     :return: JSON-ответ с информацией о найденных ссылках.
     """
     try:
-        result = await db.execute(select(Link).filter_by(original_url=original_url))
-        links = result.scalars().all()
+        query = select(Link).join(Link.url).where(Url.url_hash == url_hash(original_url), Link.deleted_at.is_(None))
+
+        async def search_shard(session: AsyncSession) -> list[Link]:
+            result = await session.execute(query)
+            return result.scalars().all()
+
+        links = [link for shard_links in await shard_router.fan_out(db, search_shard) for link in shard_links]
 
         if not links:
             raise HTTPException(status_code=404, detail="Ссылки не найдена")
 
         return JSONResponse(status_code=200, content=[
-            {
-                "short_code": link.short_code,
-                "original_url": link.original_url,
-                "created_at": str(link.created_at),
-                "clicks": link.clicks,
-                "last_used_at": str(link.last_used_at)
-            }
-            for link in links
+            {"short_code": link.short_code, **serialize_link(link)} for link in links
         ])
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.get("/history/")
@@ -260,10 +312,12 @@ async def get_current_user_info(db: AsyncSession = Depends(get_db), request: Req
     #     )
     try:
         query = select(LinkArchive)
-        result = await db.execute(query)
 
-        links = result.scalars().all()
-        print('links', links)
+        async def archive_shard(session: AsyncSession) -> list[LinkArchive]:
+            result = await session.execute(query)
+            return result.scalars().all()
+
+        links = [link for shard_links in await shard_router.fan_out(db, archive_shard) for link in shard_links]
         if not links:
             raise HTTPException(status_code=404, detail="Ссылки не найдены")
 
@@ -276,8 +330,10 @@ async def get_current_user_info(db: AsyncSession = Depends(get_db), request: Req
             }
             for link in links
         ]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.post("/delete-unused-links")
@@ -287,8 +343,16 @@ async def delete_unused_links_handler(days: int, db: AsyncSession = Depends(get_
     :param days: Количество дней, после которых ссылки считаются неиспользуемыми
     :return: Статус задачи
     """
+    if not redis_breaker.available:
+        # Брокер Celery - тот же Redis: не ждем таймаутов подключения
+        raise HTTPException(status_code=503, detail="Очередь задач временно недоступна")
+    # Celery и настройки брокера загружаются при первом обращении, а не при старте приложения
+    from src.tasks.tasks import delete_unused_links
+
     try:
-        task = delete_unused_links.delay(days)
+        # Публикация в брокер - блокирующий сетевой вызов, выполняем его вне event loop
+        task = await run_in_threadpool(delete_unused_links.delay, days)
+        audit("unused_links_archival_requested", days=days, task_id=task.id)
         return JSONResponse(
             status_code=200,
             content={
@@ -296,8 +360,10 @@ async def delete_unused_links_handler(days: int, db: AsyncSession = Depends(get_
                 "status": "task started"
             }
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        raise internal_error()
 
 
 @router.get("/task-status/{task_id}")
@@ -307,5 +373,8 @@ async def get_task_status(task_id: str):
     :param task_id: ID задачи, полученный при отправке задачи
     :return: Статус задачи
     """
-    task_result = AsyncResult(task_id)
-    return JSONResponse(status_code=200, content={"status": task_result.status})
+    from celery.result import AsyncResult
+    from src.tasks.tasks import celery
+
+    task_status = await run_in_threadpool(lambda: AsyncResult(task_id, app=celery).status)
+    return JSONResponse(status_code=200, content={"status": task_status})
@@ -1,18 +1,51 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import bindparam, func, select, insert, update, delete
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
 
 from fastapi import HTTPException, status
 
-from src.models.models import Link
+from src.config import RENAME_REDIRECT_TTL
+from src.models.models import Link, LinkArchive, LinkRedirect, Url
+from src.utils import url_hash
+
+# Причины удаления, с которыми ссылка попадает в архив
+DELETED_BY_USER = "Удалена пользователем"
+RENAMED = "Переименована"
+
+
+async def get_or_create_url_id(session: AsyncSession, original_url: str) -> int:
+    """
+    Возвращает id URL в таблице url, добавляя его при необходимости.
+    Одинаковые URL хранятся один раз, ссылки ссылаются на них по id.
+    :param session: Сессия базы данных
+    :param original_url: Оригинальный URL
+    :return: id записи в таблице url
+    """
+    digest = url_hash(original_url)
+    query = select(Url.id).where(Url.url_hash == digest)
+    url_id = (await session.execute(query)).scalar()
+    if url_id is not None:
+        return url_id
+
+    try:
+        # Параллельный запрос мог уже добавить этот URL, поэтому вставка
+        # идет в точке сохранения и при конфликте просто перечитываем id.
+        async with session.begin_nested():
+            result = await session.execute(
+                insert(Url).values(url=original_url, url_hash=digest).returning(Url.id)
+            )
+            return result.scalar_one()
+    except IntegrityError:
+        return (await session.execute(query)).scalar_one()
 
 
 async def create_link_in_db(
         session: AsyncSession,
         original_url: str,
         short_code: str,
-        custom_alias: str,
         created_at: datetime,
         expires_at: datetime,
         user_id: int = None
@@ -24,16 +57,16 @@ async def create_link_in_db(
     - session: Сессия для работы с базой данных
     - username: Имя пользователя
     - original_url: Оригинальный URL
-    - short_code: Короткий код
-    - custom_alias: Кастомный alias
+    - short_code: Короткий код (он же кастомный alias)
     - expires_at: Дата и время истечения срока действия ссылки
     """
 
     # Формируем данные для создания новой ссылки
+    await release_deleted_code(session, short_code)
+    url_id = await get_or_create_url_id(session, original_url)
     link_data = {
-        "original_url": original_url,
+        "url_id": url_id,
         "short_code": short_code,
-        "custom_alias": custom_alias,
         "created_at": created_at,
         "last_used_at": None,
         "clicks": 0,  # Начальное значение количества переходов
@@ -45,30 +78,61 @@ async def create_link_in_db(
     await session.execute(statement)
     await session.commit()
 
-    return Link(**link_data)
+    return Link(url=Url(id=url_id, url=original_url), **link_data)
 
 
-async def update_link_stat_in_db(
-        session: AsyncSession,
-        short_code: str,
-        last_used_at: datetime,
-        clicks: int):
+async def add_clicks_in_db(session: AsyncSession, clicks: dict[str, tuple[int, datetime]]):
     """
-    Обновление записи с сокращенной ссылкой.
+    Прибавляет накопленные переходы к счетчикам ссылок одним executemany.
     :param session: сессия базы данных
-    :param short_code: короткая ссылка для поиска
-    :param last_used_at: новое время последнего использования
-    :param clicks: новое количество кликов
+    :param clicks: короткий код -> (число новых переходов, время последнего перехода)
     """
-    new_link = update(Link).where(Link.short_code == short_code).values(
-        clicks=clicks,
-        last_used_at=last_used_at
+    if not clicks:
+        return
+    table = Link.__table__
+    statement = update(table).where(table.c.short_code == bindparam("code")).values(
+        clicks=table.c.clicks + bindparam("delta"),
+        last_used_at=bindparam("used_at"),
     )
 
-    await session.execute(new_link)
+    await session.execute(statement, [
+        {"code": short_code, "delta": count, "used_at": used_at}
+        for short_code, (count, used_at) in clicks.items()
+    ])
     await session.commit()
 
 
+def serialize_link(link: Link, pending: tuple[int, Optional[float]] = (0, None)) -> dict:
+    """
+    Статистика ссылки для ответов API.
+    :param link: Ссылка
+    :param pending: Переходы, еще не записанные в базу, и время последнего из них
+    :return: Словарь с оригинальным URL, датами и количеством переходов
+    """
+    pending_clicks, pending_used_at = pending
+    last_used_at = link.last_used_at
+    if pending_used_at is not None:
+        pending_used_at = datetime.fromtimestamp(pending_used_at)
+        last_used_at = max(last_used_at, pending_used_at) if last_used_at else pending_used_at
+    return {
+        "original_url": link.original_url,
+        "created_at": str(link.created_at),
+        "clicks": link.clicks + pending_clicks,
+        "last_used_at": str(last_used_at)
+    }
+
+
+def with_scheme(original_url: str) -> str:
+    """
+    Добавляет https:// к URL без схемы для корректного редиректа.
+    :param original_url: Оригинальный URL
+    :return: URL со схемой
+    """
+    if not original_url.startswith("http://") and not original_url.startswith("https://"):
+        return "https://" + original_url
+    return original_url
+
+
 def add_half_year() -> datetime:
     """
     Функция для добавления полугода к дате
@@ -89,21 +153,117 @@ def add_half_year() -> datetime:
     return current_datetime.replace(year=new_year, month=new_month)
 
 
-async def update_link_in_db(session: AsyncSession, current_link: Link, new_code: str):
+async def copy_link_in_db(session: AsyncSession, link: Link, short_code: str = None):
     """
-    Обновление short_code в базе данных.
-    :param db: Сессия базы данных
-    :param current_link: Существующая ссылка, которую нужно обновить
+    Добавляет копию ссылки (со статистикой) в сессию другого шарда без commit.
+    :param session: Сессия целевого шарда
+    :param link: Исходная ссылка
+    :param short_code: Новый короткий код (по умолчанию прежний)
+    """
+    short_code = short_code or link.short_code
+    await release_deleted_code(session, short_code)
+    url_id = await get_or_create_url_id(session, link.original_url)
+    await session.execute(insert(Link).values(
+        url_id=url_id,
+        short_code=short_code,
+        created_at=link.created_at,
+        expires_at=link.expires_at,
+        clicks=link.clicks,
+        last_used_at=link.last_used_at,
+        user_id=link.user_id,
+        deleted_at=link.deleted_at,
+        deleted_reason=link.deleted_reason
+    ))
+
+
+async def release_deleted_code(session: AsyncSession, short_code: str):
+    """
+    Освобождает код ссылки, помеченной удаленной, для повторного использования:
+    строка сразу переносится в архив в текущей транзакции, не дожидаясь
+    purge_deleted_links, а переадресация со старого кода удаляется. Без commit.
+    :param session: Сессия шарда кода
+    :param short_code: Короткий код
+    """
+    condition = (Link.short_code == short_code) & Link.deleted_at.isnot(None)
+    # Обычно помеченной строки нет: проверяем чтением, чтобы не открывать
+    # пишущую транзакцию раньше времени
+    if (await session.execute(select(Link.id).where(condition))).first() is None:
+        return
+    row = (await session.execute(
+        delete(Link).where(condition).returning(Link.url_id, Link.deleted_at, Link.deleted_reason)
+    )).first()
+    if row is None:
+        return
+    original_url = (await session.execute(select(Url.url).where(Url.id == row.url_id))).scalar_one()
+    await session.execute(insert(LinkArchive).values(
+        short_code=short_code,
+        original_url=original_url,
+        deleted_at=row.deleted_at,
+        reason=row.deleted_reason,
+    ))
+    await session.execute(delete(LinkRedirect).where(LinkRedirect.old_code == short_code))
+
+
+async def mark_link_deleted(session: AsyncSession, short_code: str, reason: str = DELETED_BY_USER) -> bool:
+    """
+    Помечает ссылку удаленной одним UPDATE, без загрузки строки. Редирект и
+    статистика сразу перестают ее видеть, а в архив ее переносит purge_deleted_links.
+    :param session: Сессия шарда ссылки
+    :param short_code: Короткий код
+    :param reason: Причина для архива
+    :return: Была ли найдена неудаленная ссылка
+    """
+    result = await session.execute(
+        update(Link)
+        .where(Link.short_code == short_code, Link.deleted_at.is_(None))
+        .values(deleted_at=datetime.now(), deleted_reason=reason, updated_at=func.now())
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+async def rename_link_in_db(source: AsyncSession, target: AsyncSession, current_link: Link, new_code: str):
+    """
+    Переименование ссылки без изменения уникального short_code на месте: под
+    новым кодом создается копия ссылки (в шарде нового кода), старая строка
+    помечается удаленной, а старый код еще RENAME_REDIRECT_TTL секунд ведет на новый.
+    :param source: Сессия шарда, где сейчас лежит ссылка
+    :param target: Сессия шарда для нового кода (может совпадать с source)
+    :param current_link: Существующая ссылка
     :param new_code: Новый код
     """
+    old_code = current_link.short_code
     try:
-        new_link = (
-            update(Link)
-            .where(Link.id == current_link.id)
-            .values(short_code=new_code, custom_alias=new_code)
-        )
-        await session.execute(new_link)
-        await session.commit()
-    except Exception as e:
-        await session.rollback()
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
\ No newline at end of file
+        await copy_link_in_db(target, current_link, new_code)
+        if target is not source:
+            await target.commit()
+    except IntegrityError:
+        await target.rollback()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Такой код уже занят")
+
+    now = datetime.now()
+    await source.execute(
+        update(Link).where(Link.id == current_link.id)
+        .values(deleted_at=now, deleted_reason=RENAMED, updated_at=func.now())
+    )
+    await source.execute(delete(LinkRedirect).where(LinkRedirect.old_code == old_code))
+    await source.execute(insert(LinkRedirect).values(
+        old_code=old_code,
+        new_code=new_code,
+        expires_at=now + timedelta(seconds=RENAME_REDIRECT_TTL)
+    ))
+    await source.commit()
+
+
+async def get_rename_target(session: AsyncSession, short_code: str) -> Optional[str]:
+    """
+    Новый код для недавно переименованной ссылки.
+    :param session: Сессия шарда старого кода
+    :param short_code: Старый короткий код
+    :return: Новый код или None, если переименования не было или оно устарело
+    """
+    result = await session.execute(
+        select(LinkRedirect.new_code)
+        .where(LinkRedirect.old_code == short_code, LinkRedirect.expires_at > datetime.now())
+    )
+    return result.scalar()
@@ -0,0 +1,73 @@
+import logging
+import random
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.logs.services import ACCESS_LOGGER
+from src.metrics.context import request_stats, route_template
+
+REDIRECT_ROUTE = "/links/{short_code}"
+SKIPPED_PATHS = ("/metrics", "/health")
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+
+class AccessLogMiddleware:
+    """
+    ASGI-middleware журнала доступа: метод, путь, статус, длительность, время
+    в базе и результат обращения к кэшу. Редиректы пишутся с долей
+    redirect_sample_rate, остальные запросы - с долей sample_rate, ответы 5xx -
+    всегда. Запись только кладется в очередь логирования (src.logs.services).
+
+    Должна стоять внутри MetricsMiddleware: время в базе и результат кэша
+    берутся из ее RequestStats.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float, redirect_sample_rate: float):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.redirect_sample_rate = redirect_sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIPPED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = route_template(scope)
+            # Тот же шаблон у PUT и DELETE - выборка редиректов касается только GET
+            is_redirect = route == REDIRECT_ROUTE and scope["method"] == "GET"
+            sample_rate = self.redirect_sample_rate if is_redirect else self.sample_rate
+            if status_code >= 500 or random.random() < sample_rate:
+                self.log(scope, route, status_code, time.perf_counter() - started)
+
+    @staticmethod
+    def log(scope: Scope, route: str, status_code: int, elapsed: float):
+        stats = request_stats.get()
+        client = scope.get("client")
+        access_logger.info(
+            "%s %s %s", scope["method"], scope["path"], status_code,
+            extra={
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "status": status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_ms": round(stats.db_time * 1000, 2) if stats else None,
+                "queries": stats.queries if stats else None,
+                "cache": stats.cache if stats else None,
+                "client": client[0] if client else None,
+            },
+        )
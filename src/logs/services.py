@@ -0,0 +1,110 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from src.config import LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE
+from src.metrics.metrics import LOG_RECORDS_DROPPED
+
+ACCESS_LOGGER = "access"
+AUDIT_LOGGER = "audit"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Стандартные атрибуты LogRecord; все остальные пришли через extra и пишутся полями JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; поля из extra попадают в нее как есть."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладет запись в ограниченную очередь и сразу возвращает управление.
+    При переполнении запись отбрасывается и учитывается в log_records_dropped_total,
+    чтобы медленный stdout не тормозил обработку запросов.
+    """
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В потоке запроса только подставляем аргументы и сохраняем стек
+        # исключения; форматирование выполняет поток вывода
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def _start_listener():
+    global _listener
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    _handler.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, output)
+    _listener.start()
+
+
+def setup_logging():
+    """
+    Направляет логи приложения через очередь в фоновый поток вывода.
+    После fork (воркеры gunicorn) поток и очередь создаются заново.
+    """
+    global _handler
+    if _handler is not None:
+        return
+    _handler = DroppingQueueHandler(queue.Queue())
+    _start_listener()
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    # Журнал доступа пишет AccessLogMiddleware с выборкой, собственный журнал uvicorn не нужен
+    logging.getLogger("uvicorn.access").disabled = True
+
+    os.register_at_fork(after_in_child=_start_listener)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def audit(event: str, **fields):
+    """Запись журнала аудита: действия пользователей, которые меняют данные. Не выбирается."""
+    logging.getLogger(AUDIT_LOGGER).info(event, extra={"event": event, **fields})
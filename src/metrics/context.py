@@ -0,0 +1,38 @@
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_template(scope: dict) -> str:
+    """Шаблон маршрута (например, /links/{short_code}) вместо сырого пути."""
+    route = scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+@dataclass
+class RequestStats:
+    """Счетчики текущего запроса, которые заполняют хуки базы и кэша."""
+    scope: dict = field(default_factory=dict)
+    queries: int = 0
+    db_time: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    # Результат обращения к кэшу ответов: hit/miss, local_hit/local_miss при недоступном Redis
+    cache: Optional[str] = None
+
+    @property
+    def route(self) -> str:
+        # FastAPI дописывает маршрут в scope при роутинге, поэтому к моменту
+        # выполнения SQL-запросов из обработчика шаблон уже известен.
+        return route_template(self.scope)
+
+    @property
+    def method(self) -> str:
+        return self.scope.get("method", "")
+
+
+# Объект изменяемый: хуки SQLAlchemy выполняются в гринлетах, и так
+# изменения гарантированно видны middleware независимо от копий контекста.
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
@@ -0,0 +1,81 @@
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.config import SLOW_QUERY_MS
+from src.metrics.context import request_stats
+from src.metrics.metrics import DB_POOL_CHECKOUT_WAIT, DB_QUERY_LATENCY, DB_SLOW_QUERIES
+
+logger = logging.getLogger(__name__)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, измеряющий время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def engine_options(url: str) -> dict:
+    """Параметры create_async_engine для инструментированного пула."""
+    if make_url(url).get_backend_name() == "sqlite":
+        # Для SQLite SQLAlchemy сам выбирает подходящий пул (StaticPool для :memory:)
+        return {}
+    return {"poolclass": TimedQueuePool}
+
+
+def redact_parameters(parameters) -> str:
+    """Описание параметров запроса без значений: только их количество и типы."""
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"[{len(parameters)} x {redact_parameters(parameters[0])}]"
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(" ", 1)[0].upper()
+    DB_QUERY_LATENCY.labels(operation).observe(elapsed)
+
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] += 1
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = f"{stats.method} {stats.route}" if stats is not None else "<вне запроса>"
+        DB_SLOW_QUERIES.labels(stats.route if stats is not None else "").inc()
+        logger.warning(
+            "Медленный SQL-запрос %.1f мс [%s]: %s; параметры: %s",
+            elapsed * 1000, route, " ".join(statement.split()), redact_parameters(parameters)
+        )
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> AsyncEngine:
+    """Подключает хуки учета SQL-запросов к движку."""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine.sync_engine, "handle_error", _handle_error)
+    return engine
@@ -0,0 +1,100 @@
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from typing import Optional
+
+from src.metrics.metrics import LOOP_BLOCKED, LOOP_LAG, LOOP_LAG_LAST
+
+logger = logging.getLogger(__name__)
+
+
+def task_coroutine(frame) -> Optional[str]:
+    """
+    Имя корутины верхнего уровня в стеке, то есть задачи, которая выполняется.
+    :param frame: Текущий кадр потока event loop
+    """
+    name = None
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            name = frame.f_code.co_qualname
+        frame = frame.f_back
+    return name
+
+
+class LoopLagMonitor:
+    """
+    Измеряет задержку event loop: корутина засыпает на interval секунд и
+    смотрит, насколько позже она проснулась. Все, что сверх interval, -
+    время, когда loop был занят синхронным кодом.
+
+    При capture_stacks отдельный поток следит за пульсом корутины и, если
+    loop не отвечает дольше block_threshold, пишет в лог стек потока loop -
+    то есть именно тот код, который его блокирует.
+    """
+
+    def __init__(self, interval: float = 0.25, block_threshold: float = 0.1, capture_stacks: bool = False):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.capture_stacks = capture_stacks
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self._heartbeat = time.monotonic()
+            LOOP_LAG.observe(lag)
+            LOOP_LAG_LAST.set(lag)
+
+    def _watch(self):
+        reported_heartbeat = None
+        while not self._stopped.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            LOOP_BLOCKED.inc()
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            # Текущую задачу loop из другого потока не узнать без внутренностей
+            # asyncio, поэтому она определяется по стеку самого потока loop
+            logger.warning(
+                "Event loop заблокирован больше %.0f мс (задача %s):\n%s",
+                stalled * 1000,
+                task_coroutine(frame) or "<нет>",
+                "".join(traceback.format_stack(frame)),
+            )
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure(), name="loop-lag-monitor")
+        if self.capture_stacks:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
@@ -0,0 +1,151 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Границы подобраны под редиректы: основная масса запросов укладывается в миллисекунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_TOTAL = Counter(
+    "http_requests_total",
+    "Количество HTTP-запросов по статусам",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Количество запросов в обработке",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Длительность SQL-запроса",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request",
+    "Количество SQL-запросов на один HTTP-запрос",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds",
+    "Суммарное время SQL-запросов на один HTTP-запрос",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Количество SQL-запросов дольше SLOW_QUERY_MS",
+    ["route"],
+)
+DB_QUERY_BUDGET_EXCEEDED = Counter(
+    "db_query_budget_exceeded_total",
+    "HTTP-запросы, превысившие бюджет SQL-запросов или с признаками N+1",
+    ["route", "reason"],
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Время ожидания соединения из пула",
+    buckets=LATENCY_BUCKETS,
+)
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Задержка event loop относительно запланированного пробуждения",
+    buckets=LATENCY_BUCKETS,
+)
+LOOP_LAG_LAST = Gauge(
+    "event_loop_lag_last_seconds",
+    "Последнее измерение задержки event loop",
+    # Среди воркеров берется наибольшее последнее измерение; максимум за период дает гистограмма
+    multiprocess_mode="max",
+)
+LOOP_BLOCKED = Counter(
+    "event_loop_blocked_total",
+    "Сколько раз event loop был заблокирован дольше порога",
+)
+
+APP_STARTUP_SECONDS = Gauge(
+    "app_startup_seconds",
+    "Длительность импорта приложения и запуска lifespan воркера",
+    ["phase"],
+    multiprocess_mode="max",
+)
+
+WORKER_STARTED = Gauge(
+    "app_worker_start_time_seconds",
+    "Время запуска воркера; при нескольких воркерах - отдельный ряд на каждый живой процесс (pid)",
+    multiprocess_mode="liveall",
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Обращения к кэшу по результату (hit/miss)",
+    ["cache", "result"],
+)
+REDIS_BREAKER_STATE = Gauge(
+    "redis_breaker_state",
+    "Состояние предохранителя Redis: 0 - замкнут, 1 - пробный запрос, 2 - разомкнут",
+    multiprocess_mode="max",
+)
+REDIS_BREAKER_TRANSITIONS = Counter(
+    "redis_breaker_transitions_total",
+    "Переходы предохранителя Redis по новому состоянию",
+    ["state"],
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Записи лога, отброшенные из-за переполнения очереди вывода",
+)
+
+TRAFFIC_RECORDS_DROPPED = Counter(
+    "traffic_records_dropped_total",
+    "Записи трафика, отброшенные из-за переполнения очереди записи",
+)
+
+ADMISSION_SHED = Counter(
+    "admission_shed_total",
+    "Запросы, отклоненные контролем нагрузки с 503",
+    ["route_class", "reason"],
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Время ожидания слота в очереди контроля нагрузки",
+    ["route_class"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Запросы, выполняющиеся под контролем нагрузки",
+    ["route_class"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Запросы, ожидающие слота",
+    ["route_class"],
+    multiprocess_mode="livesum",
+)
+
+RATE_LIMITED = Counter(
+    "rate_limited_total",
+    "Запросы, отклоненные ограничением частоты с 429",
+    ["rule", "role"],
+)
+RATE_LIMIT_BACKEND_ERRORS = Counter(
+    "rate_limit_backend_errors_total",
+    "Ошибки Redis при проверке лимита (проверка выполнена локально)",
+)
+
+IDEMPOTENCY_REQUESTS = Counter(
+    "idempotency_requests_total",
+    "Запросы с Idempotency-Key по исходу (new, replayed, joined, conflict, mismatch)",
+    ["result"],
+)
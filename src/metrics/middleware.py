@@ -0,0 +1,84 @@
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.config import DEBUG, N_PLUS_ONE_THRESHOLD, QUERY_BUDGET
+from src.metrics.context import RequestStats, request_stats
+from src.metrics.metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_QUERY_BUDGET_EXCEEDED,
+    DB_TIME_PER_REQUEST,
+    REQUEST_LATENCY,
+    REQUESTS_IN_PROGRESS,
+    REQUESTS_TOTAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def check_query_budget(stats: RequestStats):
+    """Предупреждает о запросах сверх бюджета и о повторах одного SQL (N+1)."""
+    if stats.queries > QUERY_BUDGET:
+        DB_QUERY_BUDGET_EXCEEDED.labels(stats.route, "budget").inc()
+        logger.warning(
+            "%s %s выполнил %s SQL-запросов (бюджет %s)",
+            stats.method, stats.route, stats.queries, QUERY_BUDGET
+        )
+
+    if not stats.statements:
+        return
+    statement, repeats = stats.statements.most_common(1)[0]
+    if repeats >= N_PLUS_ONE_THRESHOLD:
+        DB_QUERY_BUDGET_EXCEEDED.labels(stats.route, "n_plus_one").inc()
+        logger.warning(
+            "%s %s: возможный N+1, запрос выполнен %s раз: %s",
+            stats.method, stats.route, repeats, " ".join(statement.split())
+        )
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware, записывающая длительность, статус и число SQL-запросов
+    для каждого HTTP-запроса. Метки строятся по шаблону маршрута, чтобы
+    короткие коды не раздували количество временных рядов.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(scope=scope)
+        token = request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if DEBUG:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Query-Count"] = str(stats.queries)
+                    headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.1f}"
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            route = stats.route
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            REQUESTS_TOTAL.labels(method, route, str(status_code)).inc()
+            DB_QUERIES_PER_REQUEST.labels(route).observe(stats.queries)
+            DB_TIME_PER_REQUEST.labels(route).observe(stats.db_time)
+            check_query_budget(stats)
+            request_stats.reset(token)
@@ -0,0 +1,51 @@
+import os
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+from src.cache import redis_breaker
+
+router = APIRouter()
+
+STARTED_AT = time.monotonic()
+
+
+def _reset_started_at():
+    # При preload_app модуль импортируется в мастере gunicorn, а время работы считаем от fork воркера
+    global STARTED_AT
+    STARTED_AT = time.monotonic()
+
+
+os.register_at_fork(after_in_child=_reset_started_at)
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Метрики в формате Prometheus.
+    При запуске нескольких воркеров (PROMETHEUS_MULTIPROC_DIR) значения
+    агрегируются по всем процессам.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/health", include_in_schema=False)
+async def health():
+    """
+    Состояние воркера, ответившего на запрос: pid, время работы и состояние
+    предохранителя Redis. При открытом предохранителе воркер работает в
+    деградированном режиме, но продолжает обслуживать запросы.
+    """
+    return {
+        "status": "ok" if redis_breaker.state == "closed" else "degraded",
+        "pid": os.getpid(),
+        "uptime_s": round(time.monotonic() - STARTED_AT, 1),
+        "redis": redis_breaker.state,
+    }
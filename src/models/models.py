@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, TIMESTAMP, Text, func
-from sqlalchemy.orm import declarative_base
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, TIMESTAMP, Text, LargeBinary, Index, func
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.orm import declarative_base, relationship, synonym
 
 Base = declarative_base()
 
@@ -14,18 +15,46 @@ class User(Base):
     role = Column(String, nullable=False,default='user')
 
 
+class Url(Base):
+    """Уникальный оригинальный URL. Ссылки на один и тот же URL хранят только его id."""
+    __tablename__ = 'url'
+
+    id = Column(Integer, primary_key=True)
+    url = Column(Text, nullable=False)
+    url_hash = Column(LargeBinary(32), unique=True, nullable=False)
+
+
 class Link(Base):
     __tablename__ = 'link'
 
     id = Column(Integer, primary_key=True, index=True)
-    original_url = Column(String, nullable=False)
+    url_id = Column(Integer, ForeignKey("url.id"), nullable=False, index=True)
     short_code = Column(String, unique=True, nullable=False, index=True)
-    custom_alias = Column(String, unique=True, nullable=True, index=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     expires_at = Column(DateTime, nullable=True)
     clicks = Column(Integer, default=0, nullable=False)
     last_used_at = Column(DateTime, nullable=True)
-    user_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    # Пользователи хранятся только в основной базе, а ссылка - в своем шарде,
+    # поэтому внешнего ключа на user нет
+    user_id = Column(Integer, nullable=True)
+    # Отметка об удалении: строка уже не обслуживается, а в архив и из таблицы
+    # ее пачками переносит фоновая задача purge_deleted_links
+    deleted_at = Column(DateTime, nullable=True)
+    deleted_reason = Column(String(50), nullable=True)
+    # Время последнего изменения, которое видит редирект (создание, удаление,
+    # смена URL или срока); по нему снапшот обновляется инкрементально.
+    # Счетчики переходов его не меняют
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+    url = relationship(Url, lazy="joined", innerjoin=True)
+    original_url = association_proxy("url", "url")
+    # Алиас всегда совпадает с коротким кодом, отдельная колонка не нужна
+    custom_alias = synonym("short_code")
+
+    __table_args__ = (
+        Index("ix_link_deleted_at", "deleted_at", postgresql_where=deleted_at.isnot(None)),
+    )
+
 
 class LinkArchive(Base):
     __tablename__ = "link_archive"
@@ -33,4 +62,17 @@ class LinkArchive(Base):
     short_code = Column(String(50))
     original_url = Column(Text)
     deleted_at = Column(DateTime(timezone=True), server_default=func.now())
-    reason = Column(String(50), nullable=False)
\ No newline at end of file
+    reason = Column(String(50), nullable=False)
+
+
+class LinkRedirect(Base):
+    """Старый код переименованной ссылки, который до expires_at ведет на новый. Хранится в шарде старого кода."""
+    __tablename__ = "link_redirect"
+
+    old_code = Column(String, primary_key=True)
+    new_code = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+# Таблицы, которые есть в каждом шарде; user - только в основной базе (шард 0)
+SHARD_TABLES = [Url.__table__, Link.__table__, LinkArchive.__table__, LinkRedirect.__table__]
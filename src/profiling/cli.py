@@ -0,0 +1,44 @@
+"""
+Запуск профилирования работающего воркера через API.
+
+Пример:
+    python -m src.profiling.cli http://localhost:8000 --token <access_token> --seconds 10 -o profile.collapsed
+
+Запрос попадает в один из воркеров, профилируется именно он. Файл collapsed
+открывается в speedscope или преобразуется в SVG через flamegraph.pl.
+"""
+import argparse
+
+import httpx
+
+from src.profiling.services import MAX_PROFILE_SECONDS, PROFILE_MODES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профилирование работающего воркера")
+    parser.add_argument("url", help="Адрес сервиса")
+    parser.add_argument("--token", required=True, help="access_token администратора")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--requests", type=int, default=0, help="Остановиться после N запросов")
+    parser.add_argument("--mode", choices=PROFILE_MODES, default="sampling")
+    parser.add_argument("--format", help="collapsed, pstats или text")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    params = {"seconds": args.seconds, "requests": args.requests, "mode": args.mode}
+    if args.format:
+        params["format"] = args.format
+    response = httpx.post(
+        args.url.rstrip("/") + "/admin/profile",
+        params=params,
+        cookies={"access_token": args.token},
+        timeout=MAX_PROFILE_SECONDS + 30,
+    )
+    response.raise_for_status()
+    with open(args.output, "wb") as file:
+        file.write(response.content)
+    print(f"Профиль сохранен в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
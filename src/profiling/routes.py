@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import get_db
+from src.auth.services import get_current_admin
+from src.profiling.services import (
+    MAX_PROFILE_SECONDS,
+    PROFILE_FORMATS,
+    profile_cprofile,
+    profile_lock,
+    profile_sampling,
+)
+
+router = APIRouter()
+
+MEDIA_TYPES = {
+    "pstats": "application/octet-stream",
+    "text": "text/plain",
+    "collapsed": "text/plain",
+}
+
+
+@router.post("/profile")
+async def profile_worker(
+        seconds: float = 10,
+        requests: int = 0,
+        mode: str = "sampling",
+        format: str = None,
+        request: Request = Request,
+        db: AsyncSession = Depends(get_db),
+):
+    """
+    Профилирование работающего воркера. Доступно только администраторам.
+    :param seconds: Длительность окна профилирования (не больше 60 секунд)
+    :param requests: Завершить окно после стольких обработанных запросов
+    :param mode: sampling (низкие накладные расходы) или cprofile
+    :param format: collapsed для sampling; pstats или text для cprofile
+    :return: Файл профиля
+    """
+    token = request.cookies.get("access_token")
+    if not token:
+        raise HTTPException(
+            status_code=401,
+            detail="Пользователь не авторизован"
+        )
+    await get_current_admin(db, token)
+    # Сессия больше не нужна, не держим соединение все окно профилирования
+    await db.close()
+
+    if mode not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail="Неизвестный режим профилирования")
+    format = format or PROFILE_FORMATS[mode][0]
+    if format not in PROFILE_FORMATS[mode]:
+        raise HTTPException(status_code=400, detail="Формат не поддерживается этим режимом")
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail="Некорректная длительность профилирования")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Профилирование уже запущено")
+
+    async with profile_lock:
+        if mode == "cprofile":
+            content = await profile_cprofile(seconds, requests, format)
+        else:
+            content = await profile_sampling(seconds, requests)
+
+    return Response(
+        content=content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="profile.{format}"'},
+    )
@@ -0,0 +1,116 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+
+from collections import Counter
+from typing import Optional
+
+from src.metrics.metrics import REQUESTS_TOTAL
+
+PROFILE_MODES = ("cprofile", "sampling")
+PROFILE_FORMATS = {
+    "cprofile": ("pstats", "text"),
+    "sampling": ("collapsed",),
+}
+MAX_PROFILE_SECONDS = 60
+
+profile_lock = asyncio.Lock()
+
+
+def completed_requests() -> int:
+    """Количество обработанных этим процессом HTTP-запросов."""
+    return int(sum(
+        sample.value
+        for metric in REQUESTS_TOTAL.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    ))
+
+
+async def wait_window(seconds: float, requests: int = 0):
+    """
+    Ждет окончания окна профилирования: seconds секунд или, если задано
+    requests, пока процесс не обработает столько запросов (но не дольше seconds).
+    """
+    deadline = time.monotonic() + seconds
+    if not requests:
+        await asyncio.sleep(seconds)
+        return
+    target = completed_requests() + requests
+    while completed_requests() < target and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+
+class StackSampler:
+    """
+    Сэмплирующий профилировщик: фоновый поток с заданным интервалом снимает
+    стек потока event loop и считает одинаковые стеки. Накладные расходы не
+    зависят от количества вызовов функций, в отличие от cProfile.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def collapsed(self) -> bytes:
+        """Стеки в формате collapsed (flamegraph.pl, speedscope)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+
+async def profile_cprofile(seconds: float, requests: int, output_format: str) -> bytes:
+    """
+    Профилирует поток event loop через cProfile. Все обработчики запросов
+    выполняются в этом потоке, поэтому в профиль попадает весь трафик окна.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await wait_window(seconds, requests)
+    finally:
+        profiler.disable()
+
+    if output_format == "text":
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(100)
+        return buffer.getvalue().encode()
+    # Тот же формат, что пишет Profile.dump_stats: открывается pstats, snakeviz, gprof2dot
+    profiler.create_stats()
+    return marshal.dumps(profiler.stats)
+
+
+async def profile_sampling(seconds: float, requests: int) -> bytes:
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        await wait_window(seconds, requests)
+    finally:
+        sampler.stop()
+    return sampler.collapsed()
@@ -0,0 +1,78 @@
+import json
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.auth.services import decode_access_claims
+from src.ratelimit.services import ANONYMOUS, get_rate_limiter
+
+# Маршруты с ограничением частоты: (метод, путь) -> правило
+RATE_LIMITED_ROUTES = {
+    ("POST", "/links/shorten"): "shorten",
+    ("POST", "/auth/login"): "login",
+    ("POST", "/auth/register"): "register",
+}
+
+
+def client_identity(scope: Scope) -> tuple[str, str]:
+    """
+    Владелец корзины: пользователь из JWT в куке или IP клиента.
+    Токен только проверяется подписью, без запроса к базе; роль берется из него же.
+    """
+    cookie = Headers(scope=scope).get("cookie", "")
+    for part in cookie.split(";"):
+        name, _, value = part.strip().partition("=")
+        if name == "access_token" and value:
+            claims = decode_access_claims(value)
+            if claims and claims.get("sub"):
+                return f"user:{claims['sub']}", claims.get("role", "user")
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}", ANONYMOUS
+
+
+class RateLimitMiddleware:
+    """
+    ASGI-middleware ограничения частоты для маршрутов из RATE_LIMITED_ROUTES.
+    Добавляет заголовки RateLimit-* к ответу, при превышении отвечает 429.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        rule = RATE_LIMITED_ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        identity, role = client_identity(scope)
+        decision = await get_rate_limiter().hit(rule, identity, role)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+        if not decision.allowed:
+            await self.reject(send, decision.headers())
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                # Заголовки более строгого лимита, выставленные обработчиком, не перезаписываем
+                for name, value in decision.headers().items():
+                    headers.setdefault(name, value)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def reject(send: Send, headers: dict[str, str]):
+        body = json.dumps({"detail": "Слишком много запросов"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ] + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,239 @@
+import logging
+import math
+import time
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.cache import get_redis, redis_breaker
+from src.config import CACHE_BACKEND, RATE_LIMITS as RATE_LIMITS_OVERRIDE
+from src.metrics.metrics import RATE_LIMIT_BACKEND_ERRORS, RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+ANONYMOUS = "anonymous"
+KEY_PREFIX = "ratelimit"
+# Сколько токенов воркер забирает из Redis за один раз, но не больше
+# LEASE_MAX_SHARE емкости корзины, чтобы один воркер не опустошал ее
+LEASE_TOKENS = 5
+LEASE_MAX_SHARE = 0.25
+LEASE_MAX_TTL = 60.0
+MAX_LOCAL_KEYS = 10_000
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Корзина токенов: count запросов за period секунд, всплеск до count."""
+    count: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.count / self.period
+
+    @property
+    def lease_size(self) -> int:
+        return max(1, min(LEASE_TOKENS, int(self.count * LEASE_MAX_SHARE)))
+
+    @property
+    def lease_ttl(self) -> float:
+        # Забранные токены действуют столько, сколько корзина наполнялась бы ими
+        # заново: даже если они пропадут, воркер тратит не больше rate токенов
+        return min(LEASE_MAX_TTL, self.lease_size / self.rate)
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+# Лимиты по правилу и роли пользователя. None - без ограничений; роль,
+# которой нет в правиле, получает лимит роли user.
+RATE_LIMITS: dict[str, dict[str, Optional[Limit]]] = {
+    "shorten": {ANONYMOUS: Limit(10, 60), "user": Limit(60, 60), "admin": None},
+    "register": {ANONYMOUS: Limit(5, 3600)},
+    # login - по IP клиента, login_user - по имени пользователя, под которым входят
+    "login": {ANONYMOUS: Limit(20, 60)},
+    "login_user": {ANONYMOUS: Limit(5, 60)},
+}
+
+# Атомарное списание из корзины токенов. Время берется из Redis, чтобы
+# воркеры с разными часами видели одну корзину одинаково.
+# Возвращает: сколько токенов выдано, сколько осталось, через сколько мс
+# корзина наполнится и через сколько мс появится следующий токен.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+local reset = math.ceil((capacity - tokens) / rate)
+redis.call('PEXPIRE', KEYS[1], reset + 1000)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((1 - tokens) / rate)
+end
+return {granted, math.floor(tokens), reset, wait}
+"""
+
+
+def parse_limits(value: str) -> dict[str, dict[str, Limit]]:
+    """Разбирает переопределение лимитов вида "shorten:user=120/60,login:anonymous=20/60"."""
+    limits = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        key, _, spec = part.partition("=")
+        rule, _, role = key.strip().partition(":")
+        count, _, period = spec.partition("/")
+        limits.setdefault(rule, {})[role or ANONYMOUS] = Limit(int(count), float(period or 60))
+    return limits
+
+
+class LocalBuckets:
+    """Корзины токенов в памяти процесса: без Redis и при его недоступности."""
+
+    def __init__(self, max_keys: int = MAX_LOCAL_KEYS):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, limit: Limit, requested: int) -> tuple[int, int, int, int]:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (limit.count, now))
+        tokens = min(limit.count, tokens + (now - updated) * limit.rate)
+        granted = min(requested, math.floor(tokens))
+        tokens -= granted
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        reset = math.ceil((limit.count - tokens) / limit.rate * 1000)
+        wait = math.ceil((1 - tokens) / limit.rate * 1000) if not granted else 0
+        return granted, math.floor(tokens), reset, wait
+
+
+@dataclass
+class Lease:
+    """Токены, заранее забранные воркером из корзины, или отметка о пустой корзине."""
+    tokens: int
+    remaining: int
+    reset_at: float
+    expires_at: float
+    blocked: bool = False
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов корзинами токенов в Redis.
+
+    Чтобы большинство разрешенных запросов не обращались к Redis, воркер
+    забирает из корзины сразу lease_size токенов и расходует их локально в
+    течение lease_ttl. Неизрасходованные токены пропадают, поэтому лимит
+    может сработать немного раньше, но не позже. Если Redis недоступен,
+    проверка выполняется по локальной корзине воркера.
+    """
+
+    def __init__(self, redis: Optional[aioredis.Redis],
+                 limits: dict[str, dict[str, Optional[Limit]]] = RATE_LIMITS):
+        self.redis = redis
+        self.limits = limits
+        self.local = LocalBuckets()
+        self._leases: OrderedDict[str, Lease] = OrderedDict()
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT) if redis is not None else None
+
+    def limit_for(self, rule: str, role: str) -> Optional[Limit]:
+        limits = self.limits.get(rule, {})
+        if role in limits:
+            return limits[role]
+        return limits.get("user", limits.get(ANONYMOUS))
+
+    async def _take(self, key: str, limit: Limit, requested: int) -> tuple[int, int, int, int]:
+        if self._script is None:
+            return self.local.take(key, limit, requested)
+        try:
+            granted, remaining, reset, wait = await redis_breaker.call(self._script(
+                keys=[key], args=[limit.count, limit.rate / 1000, requested]
+            ))
+            return int(granted), int(remaining), int(reset), int(wait)
+        except RedisError:
+            RATE_LIMIT_BACKEND_ERRORS.inc()
+            logger.warning("Redis недоступен, лимит %s проверяется локально", key)
+            return self.local.take(key, limit, requested)
+
+    async def hit(self, rule: str, identity: str, role: str = ANONYMOUS) -> Optional[Decision]:
+        """
+        Списывает один запрос из корзины правила для identity.
+        :param rule: Правило (shorten, login, ...)
+        :param identity: Кому принадлежит корзина: user:<имя> или ip:<адрес>
+        :param role: Роль пользователя (anonymous для неавторизованных)
+        :return: Решение или None, если для роли нет ограничений
+        """
+        limit = self.limit_for(rule, role)
+        if limit is None:
+            return None
+        key = f"{KEY_PREFIX}:{rule}:{identity}"
+        now = time.monotonic()
+
+        lease = self._leases.get(key)
+        if lease and lease.expires_at > now:
+            reset = max(0, math.ceil(lease.reset_at - now))
+            if lease.blocked:
+                # Пока корзина пуста, повторные попытки отклоняются без обращения к Redis
+                RATE_LIMITED.labels(rule, role).inc()
+                return Decision(False, limit.count, 0, reset, max(1, math.ceil(lease.expires_at - now)))
+            if lease.tokens > 0:
+                lease.tokens -= 1
+                return Decision(True, limit.count, lease.remaining + lease.tokens, reset)
+
+        granted, remaining, reset, wait = await self._take(key, limit, limit.lease_size)
+        if granted:
+            lease = Lease(granted - 1, remaining, now + reset / 1000, now + limit.lease_ttl)
+        else:
+            lease = Lease(0, 0, now + reset / 1000, now + wait / 1000, blocked=True)
+        self._leases[key] = lease
+        self._leases.move_to_end(key)
+        if len(self._leases) > MAX_LOCAL_KEYS:
+            self._leases.popitem(last=False)
+
+        if not granted:
+            RATE_LIMITED.labels(rule, role).inc()
+            return Decision(False, limit.count, 0, math.ceil(reset / 1000), max(1, math.ceil(wait / 1000)))
+        return Decision(True, limit.count, remaining + lease.tokens, math.ceil(reset / 1000))
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Ограничитель процесса; без Redis (CACHE_BACKEND=memory) работает на локальных корзинах."""
+    global _limiter
+    if _limiter is None:
+        limits = {rule: dict(role_limits) for rule, role_limits in RATE_LIMITS.items()}
+        for rule, role_limits in parse_limits(RATE_LIMITS_OVERRIDE).items():
+            limits.setdefault(rule, {}).update(role_limits)
+        _limiter = RateLimiter(None if CACHE_BACKEND == "memory" else get_redis(), limits)
+    return _limiter
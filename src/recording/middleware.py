@@ -0,0 +1,82 @@
+import random
+import time
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.metrics.context import route_template
+from src.recording.services import MAX_BODY_SIZE, get_recorder, is_sensitive, strip_query
+
+SKIPPED_PATHS = ("/metrics", "/health", "/admin/")
+
+
+class RecordingMiddleware:
+    """
+    ASGI-middleware, записывающая долю запросов для последующего воспроизведения.
+
+    Заголовки не сохраняются вовсе: вместо куки и Authorization пишется только
+    признак авторизованного запроса, реплеер подставляет свой токен.
+    """
+
+    def __init__(self, app: ASGIApp, path: str, sample_rate: float):
+        self.app = app
+        self.path = path
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(SKIPPED_PATHS)
+            or random.random() >= self.sample_rate
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        sensitive = is_sensitive(path)
+        body = bytearray()
+        body_complete = True
+        status_code = 500
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_complete
+            message = await receive()
+            if message["type"] == "http.request" and not sensitive and body_complete:
+                body.extend(message.get("body", b""))
+                if len(body) > MAX_BODY_SIZE:
+                    body_complete = False
+                    body.clear()
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            headers = Headers(scope=scope)
+            entry = {
+                "t": round(timestamp, 3),
+                "m": scope["method"],
+                "p": path,
+                "r": route_template(scope),
+                "s": status_code,
+                "d": round((time.perf_counter() - started) * 1000, 2),
+            }
+            query = "" if sensitive else strip_query(scope.get("query_string", b"").decode("latin-1"))
+            if query:
+                entry["q"] = query
+            if "access_token" in headers.get("cookie", "") or "authorization" in headers:
+                entry["a"] = 1
+            if body and body_complete:
+                try:
+                    entry["b"] = body.decode()
+                    entry["ct"] = headers.get("content-type", "")
+                except UnicodeDecodeError:
+                    pass
+            get_recorder(self.path).record(entry)
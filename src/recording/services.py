@@ -0,0 +1,117 @@
+import json
+import logging
+import os
+import queue
+import threading
+
+from typing import Iterable, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode
+
+from src.metrics.metrics import TRAFFIC_RECORDS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Запросы к /auth/ несут пароли в теле и параметрах: пишем только путь
+SENSITIVE_PREFIXES = ("/auth/",)
+SENSITIVE_PARAMS = {"password", "token", "access_token"}
+MAX_BODY_SIZE = 4096
+QUEUE_SIZE = 10_000
+WRITE_BATCH_SIZE = 500
+
+
+def is_sensitive(path: str) -> bool:
+    return path.startswith(SENSITIVE_PREFIXES)
+
+
+def strip_query(query_string: str) -> str:
+    """Убирает из строки запроса параметры с паролями и токенами."""
+    params = parse_qsl(query_string, keep_blank_values=True)
+    return urlencode([(key, value) for key, value in params if key.lower() not in SENSITIVE_PARAMS])
+
+
+class TrafficRecorder:
+    """
+    Пишет записи о запросах в файл JSON Lines из фонового потока.
+
+    Запросы только кладут запись в ограниченную очередь; при ее переполнении
+    запись отбрасывается, а не тормозит обработку. Каждая пачка пишется одним
+    вызовом write в режиме дозаписи, поэтому несколько воркеров могут писать
+    в один файл.
+    """
+
+    def __init__(self, path: str, queue_size: int = QUEUE_SIZE):
+        self.path = path
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="traffic-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, entry: dict):
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            TRAFFIC_RECORDS_DROPPED.inc()
+
+    def _run(self):
+        with open(self.path, "a") as file:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    return
+                lines = [entry]
+                while len(lines) < WRITE_BATCH_SIZE:
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if entry is None:
+                        self._write(file, lines)
+                        return
+                    lines.append(entry)
+                self._write(file, lines)
+
+    @staticmethod
+    def _write(file, entries: list[dict]):
+        try:
+            file.write("".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries))
+            file.flush()
+        except OSError:
+            logger.exception("Не удалось записать трафик")
+
+    def close(self, timeout: float = 5.0):
+        """Дописывает очередь и останавливает поток."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+_recorder: Optional[TrafficRecorder] = None
+_recorder_pid: Optional[int] = None
+
+
+def get_recorder(path: str) -> TrafficRecorder:
+    """
+    Рекордер текущего процесса. Поток записи создается после fork,
+    поэтому у каждого воркера он свой.
+    """
+    global _recorder, _recorder_pid
+    if _recorder is None or _recorder_pid != os.getpid():
+        _recorder = TrafficRecorder(path)
+        _recorder_pid = os.getpid()
+    return _recorder
+
+
+def close_recorder():
+    global _recorder
+    if _recorder is not None and _recorder_pid == os.getpid():
+        _recorder.close()
+    _recorder = None
+
+
+def read_records(paths: Iterable[str]) -> Iterator[dict]:
+    """Читает записи из одного или нескольких файлов, пропуская оборванные строки."""
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
@@ -0,0 +1,236 @@
+"""
+Перераспределение ссылок после изменения списка шардов.
+
+Пример (добавили третий шард в конец SHARD_DATABASE_URLS):
+    python -m src.sharding.rebalance --shard-urls postgresql+asyncpg://.../shard1,postgresql+asyncpg://.../shard2
+
+Скрипт проходит по всем шардам нового списка и переносит ссылки, которые по
+новому кольцу принадлежат другому шарду: копирует их в целевой шард и удаляет
+из исходного. Также переносятся помеченные удаленными ссылки, переадресации со
+старых кодов и архив. Повторный запуск безопасен и догоняет ссылки, созданные
+во время переноса. Если код в целевом шарде уже занят другой ссылкой, обе остаются на
+месте, а код попадает в отчет о коллизиях.
+После переноса приложение перезапускается с новым SHARD_DATABASE_URLS.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from sqlalchemy import delete, insert, select
+
+from src.links.services import copy_link_in_db
+from src.models.models import Link, LinkArchive, LinkRedirect, Url
+from src.sharding.router import ShardRouter, build_router
+
+logger = logging.getLogger(__name__)
+
+REBALANCE_BATCH_SIZE = 1_000
+
+
+async def move_batch(router: ShardRouter, source: int, links: list[Link]) -> tuple[int, list[str]]:
+    """
+    Переносит пачку ссылок шарда source в шарды, которым они принадлежат по
+    новому кольцу. Из исходного шарда удаляются только ссылки, копия которых
+    в целевом шарде проверена (тот же URL и created_at).
+    :return: Сколько ссылок перенесено и коды, занятые в целевом шарде другой ссылкой
+    """
+    by_target = {}
+    for link in links:
+        # Помеченные удаленными ссылки тоже переносим: по ним get_rename_target
+        # отличает удаленный код от несуществующего
+        target = router.shard_for(link.short_code)
+        if target != source:
+            by_target.setdefault(target, []).append(link)
+
+    moved_ids = []
+    collisions = []
+    for target, target_links in by_target.items():
+        async with router.sessionmakers[target]() as session:
+            codes = [link.short_code for link in target_links]
+            result = await session.execute(
+                select(Link.short_code, Url.url, Link.created_at)
+                .join(Url, Link.url_id == Url.id)
+                .where(Link.short_code.in_(codes))
+            )
+            existing = {short_code: (url, created_at) for short_code, url, created_at in result}
+            for link in target_links:
+                if link.short_code not in existing:
+                    await copy_link_in_db(session, link)
+                elif existing[link.short_code] != (link.original_url, link.created_at):
+                    if link.deleted_at is not None:
+                        # Код удаленной ссылки уже занят заново: она остается в исходном
+                        # шарде до purge_deleted_links, архив перенесет следующий запуск
+                        continue
+                    # Ссылку с тем же кодом независимо создали в целевом шарде:
+                    # удалять исходную нельзя, оставляем обе для ручного разбора
+                    collisions.append(link.short_code)
+                    continue
+                # Иначе копия осталась от прерванного запуска и уже проверена
+                moved_ids.append(link.id)
+            await session.commit()
+
+    if moved_ids:
+        async with router.sessionmakers[source]() as session:
+            await session.execute(delete(Link).where(Link.id.in_(moved_ids)))
+            await session.commit()
+    return len(moved_ids), collisions
+
+
+async def move_redirects(router: ShardRouter, source: int) -> int:
+    """
+    Переносит переадресации со старых кодов в шард старого кода по новому кольцу.
+    Переадресации живут недолго, поэтому читаются из шарда целиком.
+    :return: Сколько переадресаций перенесено
+    """
+    async with router.sessionmakers[source]() as session:
+        redirects = (await session.execute(select(LinkRedirect))).scalars().all()
+
+    by_target = {}
+    for redirect in redirects:
+        target = router.shard_for(redirect.old_code)
+        if target != source:
+            by_target.setdefault(target, []).append(redirect)
+
+    moved_codes = []
+    for target, target_redirects in by_target.items():
+        async with router.sessionmakers[target]() as session:
+            codes = [redirect.old_code for redirect in target_redirects]
+            existing = set((await session.execute(
+                select(LinkRedirect.old_code).where(LinkRedirect.old_code.in_(codes))
+            )).scalars())
+            for redirect in target_redirects:
+                # Переадресация с тем же кодом в целевом шарде новее: исходная устарела
+                if redirect.old_code not in existing:
+                    await session.execute(insert(LinkRedirect).values(
+                        old_code=redirect.old_code,
+                        new_code=redirect.new_code,
+                        expires_at=redirect.expires_at
+                    ))
+            await session.commit()
+        moved_codes.extend(codes)
+
+    if moved_codes:
+        async with router.sessionmakers[source]() as session:
+            await session.execute(delete(LinkRedirect).where(LinkRedirect.old_code.in_(moved_codes)))
+            await session.commit()
+    return len(moved_codes)
+
+
+async def move_archive(router: ShardRouter, source: int, batch_size: int = REBALANCE_BATCH_SIZE) -> int:
+    """
+    Переносит архивные строки в шард их кода по новому кольцу. Строка, уже
+    скопированная прерванным запуском, повторно не вставляется.
+    :return: Сколько архивных строк перенесено
+    """
+    moved = 0
+    last_id = 0
+    while True:
+        async with router.sessionmakers[source]() as session:
+            rows = (await session.execute(
+                select(LinkArchive).where(LinkArchive.id > last_id).order_by(LinkArchive.id).limit(batch_size)
+            )).scalars().all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        by_target = {}
+        for row in rows:
+            target = router.shard_for(row.short_code)
+            if target != source:
+                by_target.setdefault(target, []).append(row)
+
+        moved_ids = []
+        for target, target_rows in by_target.items():
+            async with router.sessionmakers[target]() as session:
+                codes = [row.short_code for row in target_rows]
+                existing = set((await session.execute(
+                    select(LinkArchive.short_code, LinkArchive.deleted_at, LinkArchive.reason)
+                    .where(LinkArchive.short_code.in_(codes))
+                )).all())
+                for row in target_rows:
+                    if (row.short_code, row.deleted_at, row.reason) not in existing:
+                        await session.execute(insert(LinkArchive).values(
+                            short_code=row.short_code,
+                            original_url=row.original_url,
+                            deleted_at=row.deleted_at,
+                            reason=row.reason
+                        ))
+                await session.commit()
+            moved_ids.extend(row.id for row in target_rows)
+
+        if moved_ids:
+            async with router.sessionmakers[source]() as session:
+                await session.execute(delete(LinkArchive).where(LinkArchive.id.in_(moved_ids)))
+                await session.commit()
+        moved += len(moved_ids)
+    return moved
+
+
+async def rebalance(router: ShardRouter, batch_size: int = REBALANCE_BATCH_SIZE) -> dict:
+    """
+    Переносит ссылки всех шардов по новому кольцу вместе с переадресациями
+    и архивом.
+    :return: Статистика: перенесено ссылок, переадресаций, архивных строк и коды с коллизиями
+    """
+    stats = {"links": 0, "redirects": 0, "archived": 0, "collisions": []}
+    for source in range(len(router)):
+        started = time.monotonic()
+        moved = 0
+        last_id = 0
+        while True:
+            async with router.sessionmakers[source]() as session:
+                result = await session.execute(
+                    select(Link).where(Link.id > last_id).order_by(Link.id).limit(batch_size)
+                )
+                links = result.scalars().all()
+            if not links:
+                break
+            last_id = links[-1].id
+            batch_moved, collisions = await move_batch(router, source, links)
+            moved += batch_moved
+            stats["collisions"].extend(collisions)
+        redirects = await move_redirects(router, source)
+        archived = await move_archive(router, source, batch_size)
+        logger.info(
+            "Шард %s: перенесено %s ссылок, %s переадресаций и %s архивных строк за %.1f с",
+            source, moved, redirects, archived, time.monotonic() - started
+        )
+        stats["links"] += moved
+        stats["redirects"] += redirects
+        stats["archived"] += archived
+
+    if stats["collisions"]:
+        logger.warning(
+            "Коды заняты в целевом шарде другой ссылкой, исходные ссылки оставлены на месте: %s",
+            ", ".join(stats["collisions"])
+        )
+    return stats
+
+
+async def run_rebalance(shard_urls: list[str], batch_size: int):
+    router = build_router(shard_urls)
+    try:
+        stats = await rebalance(router, batch_size)
+        logger.info(
+            "Перераспределение завершено, всего перенесено %s ссылок, коллизий %s",
+            stats["links"], len(stats["collisions"])
+        )
+    finally:
+        await router.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перераспределение ссылок по шардам")
+    parser.add_argument("--shard-urls", required=True,
+                        help="Новый список дополнительных шардов через запятую (шард 0 - основная база)")
+    parser.add_argument("--batch-size", type=int, default=REBALANCE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    urls = [url.strip() for url in args.shard_urls.split(",") if url.strip()]
+    asyncio.run(run_rebalance(urls, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import bisect
+import hashlib
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.config import SHARD_DATABASE_URLS
+from src.database import engine, get_db
+from src.metrics.db import engine_options, instrument_engine
+
+T = TypeVar("T")
+
+VIRTUAL_NODES = 128
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования.
+
+    Каждый шард представлен VIRTUAL_NODES точками на кольце, поэтому при
+    добавлении шарда на него переезжает примерно 1/N ключей, а остальные
+    остаются на месте.
+    """
+
+    def __init__(self, shard_count: int, virtual_nodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"shard-{shard}#{replica}"), shard)
+            for shard in range(shard_count)
+            for replica in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+class ShardRouter:
+    """
+    Маршрутизирует работу с таблицей link по шардам на основе short_code.
+
+    Шард 0 - основная база приложения (src.database), в ней же живут
+    пользователи. id ссылок уникальны только в пределах шарда.
+    """
+
+    def __init__(self, engines: list[AsyncEngine]):
+        self.engines = engines
+        self.sessionmakers = [
+            sessionmaker(shard_engine, class_=AsyncSession, expire_on_commit=False)
+            for shard_engine in engines
+        ]
+        self.ring = HashRing(len(engines))
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, short_code: str) -> int:
+        if len(self.engines) == 1:
+            return 0
+        return self.ring.shard_for(short_code)
+
+    @asynccontextmanager
+    async def session_for(self, short_code: str, primary: AsyncSession) -> AsyncIterator[AsyncSession]:
+        """
+        Сессия шарда, которому принадлежит short_code.
+        Для шарда 0 используется уже открытая сессия основной базы.
+        """
+        shard = self.shard_for(short_code)
+        if shard == 0:
+            yield primary
+            return
+        async with self.sessionmakers[shard]() as session:
+            yield session
+
+    async def fan_out(self, primary: AsyncSession,
+                      query: Callable[[AsyncSession], Awaitable[T]]) -> list[T]:
+        """
+        Выполняет запрос на всех шардах параллельно.
+        :param primary: Сессия основной базы (шард 0)
+        :param query: Корутина, принимающая сессию шарда
+        :return: Результаты в порядке номеров шардов
+        """
+        async def run(shard: int) -> T:
+            if shard == 0:
+                return await query(primary)
+            async with self.sessionmakers[shard]() as session:
+                return await query(session)
+
+        return await asyncio.gather(*(run(shard) for shard in range(len(self.engines))))
+
+    def reset_after_fork(self):
+        """
+        Забывает соединения, унаследованные от родительского процесса, не
+        закрывая их: ими продолжает пользоваться родитель.
+        """
+        for shard_engine in self.engines:
+            shard_engine.sync_engine.dispose(close=False)
+
+    async def dispose(self):
+        # Движок шарда 0 принадлежит src.database и закрывается вместе с приложением
+        for shard_engine in self.engines[1:]:
+            await shard_engine.dispose()
+
+
+def build_router(shard_urls: Optional[list[str]] = None) -> ShardRouter:
+    urls = SHARD_DATABASE_URLS if shard_urls is None else shard_urls
+    return ShardRouter([engine] + [
+        instrument_engine(create_async_engine(url, echo=False, **engine_options(url)))
+        for url in urls
+    ])
+
+
+shard_router = build_router()
+
+
+async def get_shard_db(short_code: str, db: AsyncSession = Depends(get_db)):
+    """Сессия шарда для short_code из пути запроса."""
+    async with shard_router.session_for(short_code, db) as session:
+        yield session
@@ -0,0 +1,44 @@
+"""
+Сборка снапшота редиректов для edge-режима.
+
+Пример:
+    python -m src.snapshot.cli links.snap            # полная пересборка
+    python -m src.snapshot.cli links.snap --incremental
+
+Файл заменяется атомарно, работающие воркеры подхватывают новый снапшот
+при следующей проверке.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from contextlib import AsyncExitStack
+
+from src.sharding.router import shard_router
+from src.snapshot.services import build_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+async def run_build(path: str, incremental: bool):
+    started = time.monotonic()
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(maker()) for maker in shard_router.sessionmakers]
+        count = await build_snapshot(sessions, path, incremental=incremental)
+    logger.info("Снапшот %s собран: %s ссылок за %.1f с", path, count, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка снапшота редиректов")
+    parser.add_argument("path", help="Файл снапшота")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Применить к существующему снапшоту изменения с прошлой сборки")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_build(args.path, args.incremental))
+
+
+if __name__ == "__main__":
+    main()
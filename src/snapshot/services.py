@@ -0,0 +1,301 @@
+import mmap
+import os
+import struct
+import time
+
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.models import Link, LinkArchive, Url
+
+# Формат снапшота (все числа little-endian):
+#   заголовок | отметки шардов | индекс (записи фиксированной длины, отсортированы по коду) | коды | URL
+# Отметка шарда - наибольшее link.updated_at (в микросекундах unix time) и
+# наибольший id link_archive, учтенные снапшотом.
+# Запись индекса: смещение и длина кода, смещение и длина URL, срок действия
+# (unix time, 0 - бессрочно). Поиск - бинарный по отсортированному индексу
+# прямо в отображенной памяти, без загрузки данных в процесс.
+MAGIC = b"SURLSNP1"
+VERSION = 3
+HEADER = struct.Struct("<8sIIIQQQQ")
+WATERMARK = struct.Struct("<qq")
+ENTRY = struct.Struct("<QHQIq")
+SNAPSHOT_BATCH_SIZE = 10_000
+# Изменения перечитываются с запасом: транзакция может зафиксироваться позже,
+# чем ссылка получила отметку updated_at
+SNAPSHOT_OVERLAP = timedelta(minutes=1)
+
+
+def write_snapshot(path: str, entries: Iterable[tuple[str, str, int]], watermarks: list[tuple[int, int]]):
+    """
+    Записывает снапшот атомарно: сначала во временный файл, затем os.replace.
+    Читатели продолжают работать со старым файлом, пока не переоткроют его.
+    :param path: Путь к файлу снапшота
+    :param entries: Тройки (короткий код, URL, срок действия в unix time или 0)
+    :param watermarks: Отметки шардов: (updated_at в микросекундах, id архива)
+    """
+    encoded = sorted((code.encode(), url.encode(), expires) for code, url, expires in entries)
+
+    index = bytearray(ENTRY.size * len(encoded))
+    codes = bytearray()
+    urls = bytearray()
+    for number, (code, url, expires) in enumerate(encoded):
+        ENTRY.pack_into(index, number * ENTRY.size, len(codes), len(code), len(urls), len(url), expires)
+        codes += code
+        urls += url
+
+    watermarks_offset = HEADER.size
+    index_offset = watermarks_offset + WATERMARK.size * len(watermarks)
+    codes_offset = index_offset + len(index)
+    urls_offset = codes_offset + len(codes)
+    header = HEADER.pack(
+        MAGIC, VERSION, len(encoded), len(watermarks),
+        watermarks_offset, index_offset, codes_offset, urls_offset
+    )
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(header)
+        for watermark in watermarks:
+            file.write(WATERMARK.pack(*watermark))
+        file.write(index)
+        file.write(codes)
+        file.write(urls)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class RedirectSnapshot:
+    """
+    Снапшот коротких ссылок, отображенный в память только для чтения.
+
+    Страницы файла разделяются всеми процессами через page cache, поэтому
+    каждый воркер не держит своей копии данных.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._stat = os.fstat(file.fileno())
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, shard_count, watermarks_offset, self._index, self._codes, self._urls = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError(f"Неподдерживаемый формат снапшота: {path}")
+        self.watermarks = [
+            WATERMARK.unpack_from(self._mm, watermarks_offset + shard * WATERMARK.size)
+            for shard in range(shard_count)
+        ]
+
+    def _entry(self, number: int) -> tuple[int, int, int, int, int]:
+        return ENTRY.unpack_from(self._mm, self._index + number * ENTRY.size)
+
+    def _code(self, code_offset: int, code_length: int) -> bytes:
+        start = self._codes + code_offset
+        return self._mm[start:start + code_length]
+
+    def lookup(self, short_code: str) -> Optional[tuple[str, int]]:
+        """
+        Ищет короткий код в снапшоте.
+        :param short_code: Короткий код
+        :return: (URL, срок действия в unix time или 0) или None
+        """
+        key = short_code.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            code_offset, code_length, url_offset, url_length, expires = self._entry(middle)
+            code = self._code(code_offset, code_length)
+            if code < key:
+                low = middle + 1
+            elif code > key:
+                high = middle
+            else:
+                start = self._urls + url_offset
+                return self._mm[start:start + url_length].decode(), expires
+        return None
+
+    def resolve(self, short_code: str, now: Optional[float] = None) -> Optional[str]:
+        """
+        Возвращает URL для редиректа, если код есть в снапшоте и не истек.
+        """
+        found = self.lookup(short_code)
+        if not found:
+            return None
+        url, expires = found
+        if expires and expires <= (now or time.time()):
+            return None
+        return url
+
+    def entries(self) -> Iterator[tuple[str, str, int]]:
+        for number in range(self.count):
+            code_offset, code_length, url_offset, url_length, expires = self._entry(number)
+            start = self._urls + url_offset
+            yield (
+                self._code(code_offset, code_length).decode(),
+                self._mm[start:start + url_length].decode(),
+                expires,
+            )
+
+    def is_stale(self) -> bool:
+        """Файл снапшота заменен новым (os.replace меняет inode)."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def close(self):
+        self._mm.close()
+
+
+_snapshot: Optional[RedirectSnapshot] = None
+_checked_at: Optional[float] = None
+
+
+def get_snapshot(path: Optional[str], check_interval: float = 5.0) -> Optional[RedirectSnapshot]:
+    """
+    Возвращает снапшот процесса, переоткрывая его после пересборки файла.
+    :param path: Путь к снапшоту (None - снапшот не используется)
+    :param check_interval: Как часто проверять, не заменен ли файл, секунды
+    """
+    global _snapshot, _checked_at
+    if not path:
+        return None
+
+    now = time.monotonic()
+    if _checked_at is not None and now - _checked_at < check_interval:
+        return _snapshot
+    _checked_at = now
+
+    if _snapshot is None or _snapshot.is_stale():
+        try:
+            _snapshot = RedirectSnapshot(path)
+        except (FileNotFoundError, ValueError):
+            # Старое отображение остается рабочим, пока не появится корректный файл
+            pass
+    return _snapshot
+
+
+def _expires_ts(expires_at: Optional[datetime]) -> int:
+    return int(expires_at.timestamp()) if expires_at else 0
+
+
+def _to_micros(moment: Optional[datetime]) -> int:
+    return int(moment.timestamp() * 1_000_000) if moment else 0
+
+
+def _from_micros(micros: int) -> Optional[datetime]:
+    return datetime.fromtimestamp(micros / 1_000_000) if micros else None
+
+
+async def fetch_links(session: AsyncSession, changed_since: Optional[datetime] = None) \
+        -> AsyncIterator[tuple[datetime, str, str, int, bool]]:
+    """
+    Потоково читает ссылки через серверный курсор. Без changed_since - все
+    действующие ссылки, иначе - все измененные после этого момента, включая удаленные.
+    :return: Пятерки (updated_at, короткий код, URL, срок действия в unix time, удалена ли)
+    """
+    query = (
+        select(Link.updated_at, Link.short_code, Url.url, Link.expires_at, Link.deleted_at)
+        .join(Url, Link.url_id == Url.id)
+        .execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+    )
+    if changed_since is None:
+        query = query.where(Link.deleted_at.is_(None))
+    else:
+        query = query.where(Link.updated_at > changed_since)
+    result = await session.stream(query)
+    async for updated_at, short_code, url, expires_at, deleted_at in result:
+        yield updated_at, short_code, url, _expires_ts(expires_at), deleted_at is not None
+
+
+async def fetch_archived_codes(session: AsyncSession, after_id: int) -> list[tuple[int, str]]:
+    """
+    Коды, перенесенные в архив после отметки: удаленные, переименованные,
+    истекшие и неиспользуемые ссылки.
+    :return: Пары (id записи архива, короткий код)
+    """
+    result = await session.execute(
+        select(LinkArchive.id, LinkArchive.short_code).where(LinkArchive.id > after_id).order_by(LinkArchive.id)
+    )
+    return result.all()
+
+
+async def fetch_live_codes(sessions: list[AsyncSession], codes: list[str]) -> set[str]:
+    """Коды из списка, под которыми сейчас есть действующая ссылка в каком-либо шарде."""
+    live = set()
+    for start in range(0, len(codes), SNAPSHOT_BATCH_SIZE):
+        chunk = codes[start:start + SNAPSHOT_BATCH_SIZE]
+        for session in sessions:
+            result = await session.execute(
+                select(Link.short_code).where(Link.short_code.in_(chunk), Link.deleted_at.is_(None))
+            )
+            live.update(result.scalars())
+    return live
+
+
+def _load_previous(path: str, shard_count: int) -> Optional[tuple[dict, list[list[int]]]]:
+    try:
+        previous = RedirectSnapshot(path)
+    except (FileNotFoundError, ValueError):
+        # Снапшот старого формата пересобирается полностью
+        return None
+    watermarks = [[0, 0] for _ in range(shard_count)]
+    for shard, watermark in enumerate(previous.watermarks[:shard_count]):
+        watermarks[shard] = list(watermark)
+    entries = {code: (url, expires) for code, url, expires in previous.entries()}
+    previous.close()
+    return entries, watermarks
+
+
+async def build_snapshot(sessions: list[AsyncSession], path: str, incremental: bool = False) -> int:
+    """
+    Собирает снапшот из таблицы link всех шардов.
+
+    В инкрементальном режиме существующий снапшот дополняется изменениями
+    после отметок своих шардов: новые и измененные ссылки добавляются,
+    помеченные удаленными и перенесенные в архив - убираются.
+    :param sessions: Сессии шардов в порядке их номеров
+    :return: Количество ссылок в снапшоте
+    """
+    previous = _load_previous(path, len(sessions)) if incremental else None
+    if previous is None:
+        entries, watermarks = {}, [[0, 0] for _ in sessions]
+        for shard, session in enumerate(sessions):
+            watermarks[shard][1] = (await session.execute(select(func.max(LinkArchive.id)))).scalar() or 0
+    else:
+        entries, watermarks = previous
+        archived = []
+        for shard, session in enumerate(sessions):
+            for archive_id, short_code in await fetch_archived_codes(session, watermarks[shard][1]):
+                archived.append(short_code)
+                watermarks[shard][1] = archive_id
+        # Код мог снова занять новая ссылка, в том числе давно созданная в другом шарде
+        live = await fetch_live_codes(sessions, archived)
+        for short_code in archived:
+            if short_code not in live:
+                entries.pop(short_code, None)
+
+    for shard, session in enumerate(sessions):
+        changed_since = None
+        if previous is not None and watermarks[shard][0]:
+            changed_since = _from_micros(watermarks[shard][0]) - SNAPSHOT_OVERLAP
+        async for updated_at, short_code, url, expires, deleted in fetch_links(session, changed_since):
+            if deleted:
+                entries.pop(short_code, None)
+            else:
+                entries[short_code] = (url, expires)
+            watermarks[shard][0] = max(watermarks[shard][0], _to_micros(updated_at))
+
+    write_snapshot(
+        path, ((code, url, expires) for code, (url, expires) in entries.items()),
+        [tuple(watermark) for watermark in watermarks]
+    )
+    return len(entries)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import os
+import threading
+
+from typing import Awaitable, Optional, TypeVar
+
+from src.cache import close_redis
+from src.sharding.router import shard_router
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncRuntime:
+    """
+    Долгоживущий event loop процесса воркера Celery.
+
+    Loop работает в отдельном потоке и создается один раз на процесс (после
+    fork - заново), поэтому пулы соединений с базой и клиент Redis живут между
+    задачами и всегда привязаны к своему loop. Задачи из нескольких потоков
+    Celery (--pool=threads) выполняются в нем конкурентно.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="async-runtime", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self._loop
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        """Выполняет корутину в loop процесса и ждет результат в текущем потоке."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop()).result()
+
+    def stop(self):
+        """Закрывает соединения и останавливает loop при завершении процесса."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            if loop is None or self._pid != os.getpid():
+                return
+            self._loop = self._thread = None
+
+        async def close():
+            await close_redis()
+            for shard_engine in shard_router.engines:
+                await shard_engine.dispose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(close(), loop).result(timeout=10)
+        except Exception:
+            logger.exception("Не удалось закрыть соединения воркера")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+
+runtime = AsyncRuntime()
@@ -0,0 +1,93 @@
+import asyncio
+
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, select
+
+from src.config import ARCHIVE_BATCH_SIZE, PURGE_BATCH_SIZE
+from src.models.models import Link, LinkArchive, LinkRedirect, Url
+from src.sharding.router import ShardRouter, shard_router
+
+
+async def archive_links_in_shard(shard_session, condition, reason: Optional[str] = None,
+                                 batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Переносит в архив ссылки шарда, подходящие под условие, пачками по
+    batch_size в отдельных транзакциях. Строки пачки блокируются с SKIP LOCKED,
+    поэтому несколько задач могут обрабатывать один шард одновременно.
+    :param shard_session: Фабрика сессий шарда
+    :param condition: Условие отбора ссылок
+    :param reason: Причина архивации; по умолчанию - причина из отметки об удалении
+    :return: Сколько ссылок перенесено
+    """
+    archived = 0
+    while True:
+        async with shard_session() as session:
+            rows = (await session.execute(
+                select(Link.id, Link.short_code, Url.url, Link.deleted_at, Link.deleted_reason)
+                .join(Url, Link.url_id == Url.id)
+                .where(condition)
+                .order_by(Link.id)
+                .limit(batch_size)
+                .with_for_update(of=Link, skip_locked=True)
+            )).all()
+            if not rows:
+                return archived
+
+            # В архив попадают только действительно удаленные строки: без
+            # блокировок строк (SQLite) их могла забрать параллельная задача
+            deleted = set((await session.execute(
+                delete(Link).where(Link.id.in_([row.id for row in rows])).returning(Link.id)
+            )).scalars())
+            now = datetime.now()
+            if deleted:
+                await session.execute(insert(LinkArchive), [
+                    {
+                        "short_code": row.short_code,
+                        "original_url": row.url,
+                        "deleted_at": row.deleted_at or now,
+                        "reason": reason or row.deleted_reason,
+                    }
+                    for row in rows if row.id in deleted
+                ])
+            await session.commit()
+
+        archived += len(deleted)
+        if len(rows) < batch_size:
+            return archived
+
+
+async def archive_links(condition, reason: Optional[str] = None, router: ShardRouter = shard_router,
+                        batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Архивирует ссылки на всех шардах параллельно."""
+    archived = await asyncio.gather(*(
+        archive_links_in_shard(shard_session, condition, reason, batch_size)
+        for shard_session in router.sessionmakers
+    ))
+    return sum(archived)
+
+
+async def archive_unused_links(days: int) -> int:
+    cutoff_date = datetime.now() - timedelta(days=days)
+    return await archive_links(
+        (Link.last_used_at < cutoff_date) & Link.deleted_at.is_(None), "Неиспользуемая ссылка"
+    )
+
+
+async def archive_expired_links() -> int:
+    return await archive_links((Link.expires_at < datetime.now()) & Link.deleted_at.is_(None), "Истек срок действия")
+
+
+async def purge_deleted_links(router: ShardRouter = shard_router) -> int:
+    """
+    Переносит в архив ссылки, помеченные удаленными (mark_link_deleted,
+    rename_link_in_db), и удаляет устаревшие переадресации переименованных ссылок.
+    :return: Сколько ссылок перенесено
+    """
+    purged = await archive_links(Link.deleted_at.isnot(None), router=router, batch_size=PURGE_BATCH_SIZE)
+    for shard_session in router.sessionmakers:
+        async with shard_session() as session:
+            await session.execute(delete(LinkRedirect).where(LinkRedirect.expires_at <= datetime.now()))
+            await session.commit()
+    return purged
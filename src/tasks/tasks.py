@@ -1,39 +1,77 @@
-from datetime import datetime, timedelta
-import asyncio
 from celery import Celery
-from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker
-from src.models.models import Link, LinkArchive
-from src.database import async_session
+from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 
+from src.clicks.services import flush_clicks, get_click_buffer
+from src.config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND, CLICK_FLUSH_INTERVAL, EXPIRED_LINKS_INTERVAL, \
+    PURGE_INTERVAL, UNUSED_LINK_DAYS
+from src.sharding.router import shard_router
+from src.tasks.runtime import runtime
+from src.tasks.services import archive_expired_links, archive_unused_links, purge_deleted_links
+
+
+celery = Celery('tasks', broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+celery.conf.beat_schedule = {
+    "archive-unused-links": {
+        "task": "src.tasks.tasks.delete_unused_links",
+        "schedule": crontab(hour=3, minute=0),
+        "args": (UNUSED_LINK_DAYS,),
+    },
+    "archive-expired-links": {
+        "task": "src.tasks.tasks.archive_expired",
+        "schedule": EXPIRED_LINKS_INTERVAL,
+        "options": {"expires": EXPIRED_LINKS_INTERVAL},
+    },
+    "purge-deleted-links": {
+        "task": "src.tasks.tasks.purge_deleted",
+        "schedule": PURGE_INTERVAL,
+        "options": {"expires": PURGE_INTERVAL},
+    },
+    "flush-link-clicks": {
+        "task": "src.tasks.tasks.flush_link_clicks",
+        # Пропущенную выгрузку не догоняем: следующая заберет все накопленное
+        "schedule": CLICK_FLUSH_INTERVAL,
+        "options": {"expires": CLICK_FLUSH_INTERVAL},
+    },
+}
+
+
+@worker_process_init.connect
+def on_worker_process_init(**_):
+    shard_router.reset_after_fork()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def on_worker_shutdown(**_):
+    runtime.stop()
 
-celery = Celery('tasks', broker='redis://redis:6379/0', backend='redis://redis:6379/0')
-# celery = Celery('tasks', broker='redis://localhost:6379', backend='redis://localhost:6379/0')
 
 @celery.task
-def delete_unused_links(days: int):
+def delete_unused_links(days: int) -> int:
     """
     Celery-таска для удаления неиспользуемых ссылок.
+    :return: Сколько ссылок перенесено в архив
     """
-    print(f"Запущена таска: delete_unused_links({days})")
-    asyncio.run(delete_old_links(days))
-
-async def delete_old_links(days: int):
-    async with async_session() as session:
-        cutoff_date = datetime.now() - timedelta(days=days)
-        result = await session.execute(select(Link).filter(Link.last_used_at < cutoff_date))
-        links_to_delete = result.scalars().all()
-        if links_to_delete:
-            for link in links_to_delete:
-                link_archive = LinkArchive(
-                    short_code=link.short_code,
-                    original_url=link.original_url,
-                    deleted_at=datetime.now(),
-                    reason="Неиспользуемая ссылка"
-                )
-                session.add(link_archive)
-
-            for link in links_to_delete:
-                await session.delete(link)
-
-            await session.commit()
+    return runtime.run(archive_unused_links(days))
+
+
+# Задачи ниже запускает только beat, их результаты никто не читает:
+# не храним их в Redis
+@celery.task(ignore_result=True)
+def archive_expired() -> int:
+    """Переносит в архив ссылки с истекшим сроком действия."""
+    return runtime.run(archive_expired_links())
+
+
+@celery.task(ignore_result=True)
+def purge_deleted() -> int:
+    """Переносит в архив ссылки, помеченные удаленными."""
+    return runtime.run(purge_deleted_links())
+
+
+@celery.task(ignore_result=True)
+def flush_link_clicks() -> int:
+    """Записывает в базу переходы, накопленные в Redis."""
+    return runtime.run(flush_clicks(get_click_buffer()))
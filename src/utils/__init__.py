@@ -1 +1 @@
-from .utils import generate_short_code
\ No newline at end of file
+from .utils import generate_short_code, url_hash
\ No newline at end of file
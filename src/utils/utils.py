@@ -1,3 +1,4 @@
+import hashlib
 import random
 import string
 
@@ -7,4 +8,12 @@ def generate_short_code(length=6):
 
     """
     characters = string.ascii_letters + string.digits
-    return ''.join(random.choices(characters, k=length))
\ No newline at end of file
+    return ''.join(random.choices(characters, k=length))
+
+
+def url_hash(url: str) -> bytes:
+    """
+        Хеш URL для поиска в таблице url (совпадает с sha256() в PostgreSQL)
+
+    """
+    return hashlib.sha256(url.encode("utf-8")).digest()
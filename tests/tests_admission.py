@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from src.admission.middleware import AdmissionMiddleware
+from src.admission.services import AdmissionController, AdmissionRejected, RouteClass, classify
+
+CLASSES = (
+    RouteClass("redirect", priority=0, limit=2, queue_size=4, timeout=0.5),
+    RouteClass("write", priority=2, limit=2, queue_size=1, timeout=0.1),
+)
+
+
+def test_classify():
+    assert classify("GET", "/links/abc") == "redirect"
+    assert classify("GET", "/links/stats/abc") == "default"
+    assert classify("POST", "/links/shorten") == "write"
+    assert classify("GET", "/links/history/") == "heavy"
+    assert classify("POST", "/auth/login") == "auth"
+    assert classify("GET", "/metrics") is None
+
+
+async def test_released_slot_goes_to_redirect_first():
+    controller = AdmissionController(2, CLASSES)
+    first = await controller.acquire("write")
+    second = await controller.acquire("write")
+
+    admitted = []
+
+    async def take(name):
+        await controller.acquire(name)
+        admitted.append(name)
+
+    waiting_write = asyncio.create_task(take("write"))
+    await asyncio.sleep(0)
+    waiting_redirect = asyncio.create_task(take("redirect"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("write")
+    assert rejected.value.reason == "queue_full"
+
+    controller.release(first)
+    await waiting_redirect
+    assert admitted == ["redirect"]
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await waiting_write
+    assert rejected.value.reason == "timeout"
+
+    # Отклоненный по таймауту запрос освободил место в очереди и не занял слот
+    controller.release(second)
+    await controller.acquire("write")
+    assert controller.in_flight == 2
+
+
+async def test_middleware_rejects_with_retry_after():
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.post("/links/shorten")
+    async def shorten():
+        await release.wait()
+        return {}
+
+    controller = AdmissionController(1, (RouteClass("write", priority=0, limit=1, queue_size=0, timeout=2),))
+    transport = httpx.ASGITransport(app=AdmissionMiddleware(app, controller))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        busy = asyncio.create_task(client.post("/links/shorten"))
+        await asyncio.sleep(0.05)
+
+        rejected = await client.post("/links/shorten")
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "2"
+
+        release.set()
+        assert (await busy).status_code == 200
+        assert (await client.post("/links/shorten")).status_code == 200
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from src.cache import CLOSED, OPEN, CircuitBreaker, LocalCache, RedisUnavailable
+
+
+async def failing():
+    raise ConnectionError("down")
+
+
+async def ok():
+    return "pong"
+
+
+async def test_circuit_breaker_opens_and_recovers():
+    recovered = []
+
+    async def on_recover():
+        recovered.append(True)
+
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05, timeout=0.1)
+    breaker.on_recover(on_recover)
+    for _ in range(2):
+        with pytest.raises(RedisUnavailable):
+            await breaker.call(failing())
+    assert breaker.state == OPEN and not breaker.available
+
+    # Пока предохранитель разомкнут, Redis не вызывается
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(ok())
+
+    await asyncio.sleep(0.06)
+    assert await breaker.call(ok()) == "pong"
+    assert breaker.state == CLOSED and recovered == [True]
+
+
+async def test_circuit_breaker_timeout():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=1, timeout=0.01)
+    with pytest.raises(RedisUnavailable):
+        await breaker.call(asyncio.sleep(1))
+    assert breaker.state == OPEN
+
+
+def test_local_cache_lru_and_ttl(monkeypatch):
+    cache = LocalCache(max_size=2)
+    cache.set("a", "1", expire=60)
+    cache.set("b", "2")
+    cache.get_with_ttl("a")
+    cache.set("c", "3")
+    assert cache.get_with_ttl("b") == (0, None)
+    assert cache.get_with_ttl("a")[1] == "1"
+    assert cache.get_with_ttl("c") == (-1, "3")
+
+    cache.set("d", "4", expire=1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 2)
+    assert cache.get_with_ttl("d") == (0, None)
@@ -0,0 +1,123 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.export.cli as export_cli
+import src.export.routes as export_routes
+from src.auth.routes import router as auth_router
+from src.database import get_db
+from src.export.cli import load_checkpoint, run_export
+from src.export.routes import router as export_router
+from src.export.services import export_chunks
+from src.links.services import create_link_in_db, mark_link_deleted
+from src.models.models import Base, User
+from src.sharding.router import ShardRouter
+
+
+@pytest.fixture
+async def router(tmp_path, monkeypatch):
+    """Один шард SQLite с четырьмя ссылками, одна из которых удалена."""
+    router = ShardRouter([create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/links.db")])
+    async with router.engines[0].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with router.sessionmakers[0]() as session:
+        await add_links(session, "a", "b", "deleted", "c")
+        await mark_link_deleted(session, "deleted")
+    monkeypatch.setattr(export_cli, "shard_router", router)
+    monkeypatch.setattr(export_routes, "shard_router", router)
+    yield router
+    await router.engines[0].dispose()
+
+
+async def add_links(session, *codes: str):
+    for code in codes:
+        await create_link_in_db(session, f"https://{code}.example", code, datetime.now(), None)
+
+
+async def export(router, export_format: str, **options) -> list[tuple[bytes, int]]:
+    async with router.sessionmakers[0]() as session:
+        return [chunk async for chunk in export_chunks(session, "link", export_format, batch_size=2, **options)]
+
+
+def codes(ndjson: bytes) -> list[str]:
+    return [json.loads(line)["short_code"] for line in ndjson.decode().splitlines()]
+
+
+async def test_export_resumes_after_last_id(router):
+    chunks = await export(router, "ndjson")
+    assert [codes(chunk) for chunk, _ in chunks] == [["a", "b"], ["c"]]
+
+    first_chunk, last_id = chunks[0]
+    resumed = await export(router, "ndjson", after_id=last_id)
+    assert first_chunk + b"".join(chunk for chunk, _ in resumed) == b"".join(chunk for chunk, _ in chunks)
+
+
+async def test_csv_header_only_at_start(router):
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunk for chunk, _ in await export(router, "csv")).decode())))
+    assert [row["short_code"] for row in rows] == ["a", "b", "c"]
+    assert rows[0]["original_url"] == "https://a.example"
+    assert rows[0]["expires_at"] == ""
+
+    _, last_id = (await export(router, "csv"))[0]
+    resumed = b"".join(chunk for chunk, _ in await export(router, "csv", after_id=last_id)).decode()
+    assert resumed.splitlines()[0].split(",")[2] == "c"
+
+
+async def test_gzip_stream_is_one_member(router):
+    compressed = b"".join(chunk for chunk, _ in await export(router, "ndjson", compress=True))
+    assert codes(gzip.decompress(compressed)) == ["a", "b", "c"]
+    assert compressed.count(b"\x1f\x8b\x08") == 1
+
+
+async def test_cli_resume_appends_gzip_members(router, tmp_path):
+    output = str(tmp_path / "link.csv.gz")
+    checkpoint = output + ".checkpoint"
+    await run_export("link", "csv", output, True, checkpoint, 2)
+    state = load_checkpoint(checkpoint)
+
+    # Обрыв после контрольной точки оставил недописанный хвост
+    with open(output, "ab") as file:
+        file.write(b"\x1f\x8b\x08 partial")
+    async with router.sessionmakers[0]() as session:
+        await add_links(session, "d", "e")
+    await run_export("link", "csv", output, True, checkpoint, 2)
+
+    with gzip.open(output, "rt") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["short_code"] for row in rows] == ["a", "b", "c", "d", "e"]
+    assert load_checkpoint(checkpoint)["last_id"] > state["last_id"]
+
+
+async def test_route_is_admin_only(router):
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    app.include_router(export_router, prefix="/export")
+
+    async def db():
+        async with router.sessionmakers[0]() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/auth/register", params={
+            "username": "user", "email": "user@example.com", "password": "password"
+        })
+        # max_age задан timedelta, поэтому httpx не разбирает cookie - берем токен из заголовка
+        client.cookies.set("access_token", response.headers["set-cookie"].split(";")[0].split("=", 1)[1])
+        assert (await client.get("/export/link")).status_code == 403
+
+        async with router.sessionmakers[0]() as session:
+            await session.execute(update(User).values(role="admin"))
+            await session.commit()
+        response = await client.get("/export/link", params={"compress": True})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/gzip"
+        assert codes(gzip.decompress(response.content)) == ["a", "b", "c"]
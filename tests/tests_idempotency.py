@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from src.idempotency.services import IdempotencyStore, LocalRecords
+
+
+async def test_duplicates_run_handler_once():
+    store = IdempotencyStore(LocalRecords())
+    calls = 0
+
+    async def handler():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return JSONResponse({"short_code": "abc"})
+
+    responses = await asyncio.gather(*(store.run("key", "body", handler) for _ in range(3)))
+    replay = await store.run("key", "body", handler)
+    assert calls == 1
+    assert {response.body for response in responses + [replay]} == {b'{"short_code":"abc"}'}
+    assert replay.headers["Idempotent-Replayed"] == "true"
+
+    with pytest.raises(HTTPException) as error:
+        await store.run("key", "other body", handler)
+    assert error.value.status_code == 422
+
+
+async def test_failed_request_is_not_stored():
+    store = IdempotencyStore(LocalRecords())
+
+    async def failing():
+        raise HTTPException(status_code=400, detail="Такой алиас уже занят")
+
+    with pytest.raises(HTTPException):
+        await store.run("key", "body", failing)
+
+    async def handler():
+        return JSONResponse({"short_code": "abc"})
+
+    assert (await store.run("key", "body", handler)).status_code == 200
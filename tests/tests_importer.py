@@ -0,0 +1,119 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.importer.cli as importer_cli
+from src.importer.cli import ON_CONFLICT, load_checkpoint, run_import
+from src.importer.services import IMPORT_COLUMNS, validate_chunk
+from src.models.models import Base, Link, SHARD_TABLES, Url
+from src.utils import url_hash
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    shard_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/shard.db")
+    async with shard_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=SHARD_TABLES)
+    yield shard_engine
+    await shard_engine.dispose()
+
+
+async def merge(conn, on_conflict: str, url_id: int, clicks: int):
+    """Вставка одной ссылки с тем же ON CONFLICT, что и MERGE_LINKS."""
+    await conn.execute(text(
+        "INSERT INTO link (url_id, short_code, created_at, clicks) VALUES (:url_id, 'code', :created_at, :clicks) "
+        f"ON CONFLICT {ON_CONFLICT[on_conflict]}"
+    ), {"url_id": url_id, "created_at": datetime.now(), "clicks": clicks})
+
+
+async def test_overwrite_revives_deleted_link(engine):
+    async with engine.begin() as conn:
+        for url_id, url in enumerate(("https://old.example", "https://new.example"), start=1):
+            await conn.execute(insert(Url).values(id=url_id, url=url, url_hash=url_hash(url)))
+        await conn.execute(insert(Link).values(
+            url_id=1, short_code="code", clicks=3, deleted_at=datetime.now(), deleted_reason="Удалена пользователем"
+        ))
+
+        await merge(conn, "skip", 2, 5)
+        row = (await conn.execute(select(Link.url_id, Link.deleted_at))).one()
+        assert row.url_id == 1 and row.deleted_at is not None
+
+        await merge(conn, "overwrite", 2, 5)
+        row = (await conn.execute(select(Link.url_id, Link.clicks, Link.deleted_at, Link.deleted_reason))).one()
+        assert tuple(row) == (2, 5, None, None)
+
+
+async def test_overwrite_replaces_live_link(engine):
+    async with engine.begin() as conn:
+        for url_id, url in enumerate(("https://old.example", "https://new.example"), start=1):
+            await conn.execute(insert(Url).values(id=url_id, url=url, url_hash=url_hash(url)))
+        await conn.execute(insert(Link).values(url_id=1, short_code="code", clicks=3))
+
+        await merge(conn, "skip", 2, 5)
+        assert tuple((await conn.execute(select(Link.url_id, Link.clicks))).one()) == (1, 3)
+
+        await merge(conn, "overwrite", 2, 5)
+        assert tuple((await conn.execute(select(Link.url_id, Link.clicks))).one()) == (2, 5)
+
+
+def test_validate_chunk_rejects_bad_rows():
+    records, errors = validate_chunk([
+        json.dumps({"original_url": "https://a.example", "short_code": "a", "clicks": 2}),
+        {"original_url": "https://b.example", "short_code": "b", "created_at": "2025-01-02T03:04:05"},
+        json.dumps({"original_url": " ", "short_code": "empty"}),
+        json.dumps({"original_url": "https://c.example", "short_code": "bad code"}),
+        json.dumps({"original_url": "https://d.example", "short_code": "d", "clicks": -1}),
+        json.dumps({"original_url": "https://e.example", "short_code": "e", "expires_at": "tomorrow"}),
+        "{not json",
+    ])
+
+    code = IMPORT_COLUMNS.index("short_code")
+    assert [record[code] for record in records] == ["a", "b"]
+    assert records[1][IMPORT_COLUMNS.index("created_at")] == datetime(2025, 1, 2, 3, 4, 5)
+    assert len(errors) == 5
+    assert "некорректный short_code" in errors[1]
+
+
+class FakeConnection:
+    async def execute(self, query):
+        return "OK"
+
+    async def close(self):
+        pass
+
+
+async def test_interrupted_import_resumes_from_checkpoint(tmp_path, monkeypatch):
+    path = tmp_path / "links.ndjson"
+    rows = [{"original_url": f"https://{number}.example", "short_code": f"code{number}"} for number in range(5)]
+    rows[1]["short_code"] = "bad code"
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+    checkpoint = str(tmp_path / "links.checkpoint")
+
+    loaded = []
+    failing = True
+
+    async def load_batch(connection, records, on_conflict):
+        # Третья пачка падает, как если бы импорт прервали
+        if len(loaded) == 2 and failing:
+            raise ConnectionError("connection lost")
+        loaded.append([record[IMPORT_COLUMNS.index("short_code")] for record in records])
+        return len(records)
+
+    async def connect(dsn):
+        return FakeConnection()
+
+    monkeypatch.setattr(importer_cli.asyncpg, "connect", connect)
+    monkeypatch.setattr(importer_cli, "load_batch", load_batch)
+
+    with pytest.raises(ConnectionError):
+        await run_import(str(path), "ndjson", checkpoint, 2, 1, "skip", False)
+    assert load_checkpoint(checkpoint) == 4
+
+    failing = False
+    stats = await run_import(str(path), "ndjson", checkpoint, 2, 1, "skip", False)
+    assert stats == {"read": 1, "loaded": 1, "invalid": 0, "unknown_users": 0}
+    assert loaded == [["code0"], ["code2", "code3"], ["code4"]]
+    assert load_checkpoint(checkpoint) == 5
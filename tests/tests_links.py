@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.links.routes as links_routes
+import src.sharding.router as sharding_router
+from src.auth.routes import router as auth_router
+from src.clicks.services import ClickBuffer
+from src.database import get_db
+from src.links.routes import router as links_router
+from src.models.models import Base, Link, LinkArchive, LinkRedirect, SHARD_TABLES
+from src.sharding.router import ShardRouter
+from src.tasks.services import purge_deleted_links
+
+
+@pytest.fixture
+async def shards(tmp_path, monkeypatch):
+    """Два шарда SQLite вместо основной базы."""
+    router = ShardRouter([
+        create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/shard{shard}.db") for shard in range(2)
+    ])
+    for shard, shard_engine in enumerate(router.engines):
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=None if shard == 0 else SHARD_TABLES)
+    buffer = ClickBuffer(None)
+    monkeypatch.setattr(links_routes, "shard_router", router)
+    monkeypatch.setattr(sharding_router, "shard_router", router)
+    monkeypatch.setattr(links_routes, "get_click_buffer", lambda: buffer)
+    yield router
+    for shard_engine in router.engines:
+        await shard_engine.dispose()
+
+
+@pytest.fixture
+async def client(shards):
+    """Клиент приложения с маршрутами auth и links от имени зарегистрированного пользователя."""
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    app.include_router(links_router, prefix="/links")
+
+    async def primary_db():
+        async with shards.sessionmakers[0]() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = primary_db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/auth/register", params={
+            "username": "user", "email": "user@example.com", "password": "password"
+        })
+        # max_age задан timedelta, поэтому httpx не разбирает cookie - берем токен из заголовка
+        token = response.headers["set-cookie"].split(";")[0].split("=", 1)[1]
+        client.cookies.set("access_token", token)
+        yield client
+
+
+async def shorten(client: httpx.AsyncClient, alias: str, url: str = "https://example.com"):
+    return await client.post("/links/shorten", json={"original_url": url, "custom_alias": alias})
+
+
+async def test_deleted_link_is_gone_and_alias_reusable(client):
+    assert (await shorten(client, "gone")).status_code == 200
+    assert (await client.delete("/links/gone")).status_code == 204
+
+    assert (await client.get("/links/gone")).status_code == 404
+    assert (await client.get("/links/stats/gone")).status_code == 404
+    assert (await client.get("/links/search/https://example.com")).status_code == 404
+    assert (await client.delete("/links/gone")).status_code == 404
+
+    # Код удаленной ссылки свободен сразу, до purge_deleted_links
+    assert (await shorten(client, "gone", "https://other.example")).status_code == 200
+    response = await client.get("/links/gone")
+    assert response.status_code == 307
+    assert response.headers["location"] == "https://other.example"
+
+
+async def test_rename_redirects_old_code_and_can_be_reverted(client):
+    assert (await shorten(client, "aaa")).status_code == 200
+    assert (await client.put("/links/aaa", params={"new_code": "bbb"})).status_code == 200
+
+    response = await client.get("/links/aaa")
+    assert response.status_code == 307
+    assert response.headers["location"].endswith("/links/bbb")
+    assert (await client.get("/links/bbb")).headers["location"] == "https://example.com"
+
+    # Обратное переименование занимает код, который еще помечен удаленным
+    assert (await client.put("/links/bbb", params={"new_code": "aaa"})).status_code == 200
+    assert (await client.get("/links/aaa")).headers["location"] == "https://example.com"
+    assert (await client.get("/links/bbb")).headers["location"].endswith("/links/aaa")
+
+    assert (await shorten(client, "ccc")).status_code == 200
+    response = await client.put("/links/ccc", params={"new_code": "aaa"})
+    assert response.status_code == 400
+    assert "UNIQUE" not in response.text
+
+
+async def test_purge_archives_with_reason_and_drops_expired_redirects(client, shards):
+    for alias in ("one", "two", "kept"):
+        assert (await shorten(client, alias)).status_code == 200
+    await client.delete("/links/one")
+    await client.put("/links/two", params={"new_code": "three"})
+
+    shard = shards.shard_for("two")
+    async with shards.sessionmakers[shard]() as session:
+        await session.execute(update(LinkRedirect).values(expires_at=datetime.now() - timedelta(seconds=1)))
+        await session.commit()
+
+    assert await purge_deleted_links(shards) == 2
+
+    archived = {}
+    codes = set()
+    for session_maker in shards.sessionmakers:
+        async with session_maker() as session:
+            archived.update((await session.execute(select(LinkArchive.short_code, LinkArchive.reason))).all())
+            codes.update((await session.execute(select(Link.short_code))).scalars())
+            assert not (await session.execute(select(LinkRedirect))).all()
+    assert archived == {"one": "Удалена пользователем", "two": "Переименована"}
+    assert codes == {"kept", "three"}
+    assert (await client.get("/links/two")).status_code == 404
+
+
+async def test_stats_include_clicks_not_yet_flushed(client):
+    assert (await shorten(client, "busy")).status_code == 200
+    for _ in range(2):
+        assert (await client.get("/links/busy")).status_code == 307
+
+    stats, = (await client.get("/links/stats/busy")).json()
+    assert stats["clicks"] == 2
+    assert stats["last_used_at"] != "None"
@@ -0,0 +1,40 @@
+import json
+import logging
+import queue
+
+from prometheus_client import REGISTRY
+
+from src.logs.services import DroppingQueueHandler, JsonFormatter
+
+
+def make_record(msg: str, *args, **extra) -> logging.LogRecord:
+    record = logging.LogRecord("access", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def dropped_records() -> float:
+    return REGISTRY.get_sample_value("log_records_dropped_total") or 0
+
+
+def test_queue_handler_drops_when_full():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    dropped = dropped_records()
+
+    for i in range(5):
+        handler.handle(make_record("request %s", i))
+
+    assert handler.queue.qsize() == 2
+    assert dropped_records() - dropped == 3
+    # Аргументы подставлены до постановки в очередь
+    assert handler.queue.get_nowait().msg == "request 0"
+
+
+def test_json_formatter_includes_extra_fields():
+    line = JsonFormatter().format(make_record("GET /links/abc 307", status=307, cache="hit"))
+    entry = json.loads(line)
+
+    assert entry["logger"] == "access"
+    assert entry["msg"] == "GET /links/abc 307"
+    assert entry["status"] == 307 and entry["cache"] == "hit"
+    assert "args" not in entry
@@ -0,0 +1,90 @@
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import src.metrics.db as metrics_db
+from src.metrics.db import instrument_engine, redact_parameters
+from src.metrics.middleware import MetricsMiddleware
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = instrument_engine(create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/metrics.db"))
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(engine):
+    """Приложение, обработчики которого выполняют заданное число SQL-запросов."""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str, queries: int = 1):
+        async with engine.connect() as conn:
+            for number in range(queries):
+                await conn.execute(text("SELECT :number"), {"number": number})
+        return {}
+
+    transport = httpx.ASGITransport(app=MetricsMiddleware(app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def test_requests_and_queries_counted_by_route_template(client):
+    route = "/items/{item_id}"
+    requests = sample("http_requests_total", method="GET", route=route, status="200")
+    queries = sample("db_queries_per_request_sum", route=route)
+
+    for item_id in ("abc", "xyz"):
+        assert (await client.get(f"/items/{item_id}", params={"queries": 2})).status_code == 200
+
+    assert sample("http_requests_total", method="GET", route=route, status="200") - requests == 2
+    assert sample("db_queries_per_request_sum", route=route) - queries == 4
+    # Сырые пути в метки не попадают
+    assert sample("http_requests_total", method="GET", route="/items/abc", status="200") == 0
+
+
+async def test_query_budget_and_n_plus_one_are_reported(client, caplog):
+    route = "/items/{item_id}"
+    budget = sample("db_query_budget_exceeded_total", route=route, reason="budget")
+    n_plus_one = sample("db_query_budget_exceeded_total", route=route, reason="n_plus_one")
+
+    with caplog.at_level(logging.WARNING, logger="src.metrics.middleware"):
+        await client.get("/items/few", params={"queries": 2})
+        assert not caplog.records
+
+        await client.get("/items/many", params={"queries": 11})
+
+    assert sample("db_query_budget_exceeded_total", route=route, reason="budget") - budget == 1
+    assert sample("db_query_budget_exceeded_total", route=route, reason="n_plus_one") - n_plus_one == 1
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("11 SQL-запросов (бюджет 10)" in message for message in messages)
+    assert any("возможный N+1, запрос выполнен 11 раз: SELECT ?" in message for message in messages)
+
+
+async def test_slow_query_log_hides_parameter_values(engine, caplog, monkeypatch):
+    monkeypatch.setattr(metrics_db, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="src.metrics.db"):
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT :password, :attempts"), {"password": "hunter2", "attempts": 3})
+
+    message, = [record.getMessage() for record in caplog.records if "SELECT" in record.getMessage()]
+    assert "hunter2" not in message
+    assert message.endswith("параметры: (str, int)")
+
+
+def test_redact_parameters():
+    assert redact_parameters({"code": "abc", "id": 1}) == "{code: str, id: int}"
+    assert redact_parameters([("a", 1), ("b", 2)]) == "[2 x (str, int)]"
+    assert redact_parameters(None) == "NoneType"
@@ -0,0 +1,103 @@
+import marshal
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.auth.routes import router as auth_router
+from src.database import get_db
+from src.models.models import Base, User
+from src.profiling.routes import router as profiling_router
+from src.profiling.services import StackSampler, profile_lock
+
+
+@pytest.fixture
+async def session_maker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/users.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def client(session_maker):
+    """Клиент приложения с маршрутами auth и /admin от имени обычного пользователя."""
+    app = FastAPI()
+    app.include_router(auth_router, prefix="/auth")
+    app.include_router(profiling_router, prefix="/admin")
+
+    async def db():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = db
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post("/auth/register", params={
+            "username": "user", "email": "user@example.com", "password": "password"
+        })
+        # max_age задан timedelta, поэтому httpx не разбирает cookie - берем токен из заголовка
+        token = response.headers["set-cookie"].split(";")[0].split("=", 1)[1]
+        client.cookies.set("access_token", token)
+        yield client
+
+
+@pytest.fixture
+async def admin(client, session_maker):
+    async with session_maker() as session:
+        await session.execute(update(User).where(User.username == "user").values(role="admin"))
+        await session.commit()
+    return client
+
+
+async def test_profile_requires_admin(client):
+    response = await client.post("/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 403
+
+    client.cookies.clear()
+    assert (await client.post("/admin/profile", params={"seconds": 0.1})).status_code == 401
+
+
+async def test_profile_formats(admin):
+    response = await admin.post("/admin/profile", params={"seconds": 0.1, "mode": "cprofile", "format": "text"})
+    assert response.status_code == 200
+    assert "function calls" in response.text
+
+    response = await admin.post("/admin/profile", params={"seconds": 0.1, "mode": "cprofile"})
+    assert response.headers["content-disposition"] == 'attachment; filename="profile.pstats"'
+    assert isinstance(marshal.loads(response.content), dict)
+
+    response = await admin.post("/admin/profile", params={"seconds": 0.1})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="profile.collapsed"'
+
+
+async def test_profile_rejects_bad_parameters_and_concurrent_runs(admin):
+    assert (await admin.post("/admin/profile", params={"mode": "perf"})).status_code == 400
+    assert (await admin.post("/admin/profile", params={"mode": "sampling", "format": "text"})).status_code == 400
+    assert (await admin.post("/admin/profile", params={"seconds": 61})).status_code == 400
+
+    async with profile_lock:
+        assert (await admin.post("/admin/profile", params={"seconds": 0.1})).status_code == 409
+
+
+def busy(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_stack_sampler_collapses_stacks():
+    sampler = StackSampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    busy(0.1)
+    sampler.stop()
+
+    lines = sampler.collapsed().decode().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert stack.endswith(":busy") and int(count) > 0
@@ -0,0 +1,75 @@
+import httpx
+from fastapi import FastAPI
+
+import src.ratelimit.middleware as ratelimit_middleware
+from src.ratelimit.middleware import RateLimitMiddleware
+from src.ratelimit.services import ANONYMOUS, Limit, LocalBuckets, RateLimiter, parse_limits
+
+LIMITS = {
+    "shorten": {ANONYMOUS: Limit(3, 60), "user": Limit(100, 60), "admin": None},
+}
+
+
+class ScriptRedis:
+    """Redis, в котором скрипт корзины выполняется локальной корзиной; считает вызовы скрипта."""
+
+    def __init__(self):
+        self.calls = 0
+        self.buckets = LocalBuckets()
+
+    def register_script(self, script):
+        async def run(keys, args):
+            self.calls += 1
+            count, rate, requested = args
+            return self.buckets.take(keys[0], Limit(count, count / (rate * 1000)), requested)
+        return run
+
+
+def test_parse_limits():
+    assert parse_limits("shorten:user=120/60, login=20/30") == {
+        "shorten": {"user": Limit(120, 60)},
+        "login": {ANONYMOUS: Limit(20, 30)},
+    }
+
+
+async def test_local_limiter():
+    limiter = RateLimiter(None, LIMITS)
+    decisions = [await limiter.hit("shorten", "ip:127.0.0.1") for _ in range(4)]
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert decisions[0].headers()["RateLimit-Remaining"] == "2"
+    assert int(decisions[-1].headers()["Retry-After"]) >= 1
+
+    assert (await limiter.hit("shorten", "user:bob", "user")).allowed
+    assert await limiter.hit("shorten", "user:root", "admin") is None
+    # Неизвестная роль получает лимит роли user
+    assert (await limiter.hit("shorten", "user:eve", "moderator")).limit == 100
+
+
+async def test_middleware_sets_headers_and_rejects(monkeypatch):
+    limiter = RateLimiter(None, LIMITS)
+    monkeypatch.setattr(ratelimit_middleware, "get_rate_limiter", lambda: limiter)
+    app = FastAPI()
+
+    @app.post("/links/shorten")
+    async def shorten():
+        return {}
+
+    transport = httpx.ASGITransport(app=RateLimitMiddleware(app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = [await client.post("/links/shorten") for _ in range(4)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 429]
+    assert [response.headers["ratelimit-remaining"] for response in responses] == ["2", "1", "0", "0"]
+    assert int(responses[-1].headers["retry-after"]) >= 1
+    assert "retry-after" not in responses[0].headers
+
+
+async def test_leased_tokens_save_redis_calls():
+    redis = ScriptRedis()
+    # Лимиты по умолчанию: анонимное сокращение - 10 запросов в минуту
+    limiter = RateLimiter(redis)
+    decisions = [await limiter.hit("shorten", "ip:127.0.0.1") for _ in range(10)]
+
+    assert all(decision.allowed for decision in decisions)
+    assert [decision.headers()["RateLimit-Remaining"] for decision in decisions[:3]] == ["9", "8", "7"]
+    assert redis.calls < len(decisions)
@@ -0,0 +1,20 @@
+from src.recording.services import TrafficRecorder, read_records, strip_query
+
+
+def test_strip_query():
+    assert strip_query("days=5&token=abc&Password=x") == "days=5"
+    assert strip_query("") == ""
+
+
+def test_recorder_writes_records(tmp_path):
+    path = str(tmp_path / "traffic.jsonl")
+    recorder = TrafficRecorder(path)
+    for number in range(3):
+        recorder.record({"t": number, "m": "GET", "p": f"/links/code{number}", "s": 307, "d": 1.5})
+    recorder.close()
+
+    with open(path, "a") as file:
+        file.write('{"t": 3, "m": "GET"')
+
+    records = list(read_records([path]))
+    assert [record["p"] for record in records] == ["/links/code0", "/links/code1", "/links/code2"]
@@ -0,0 +1,155 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.links.services import copy_link_in_db, create_link_in_db, get_rename_target, rename_link_in_db
+from src.models.models import Base, Link, LinkArchive, SHARD_TABLES
+from src.sharding.rebalance import rebalance
+from src.sharding.router import HashRing, ShardRouter
+
+
+def test_hash_ring_is_stable():
+    ring = HashRing(3)
+    codes = [f"code{number}" for number in range(1000)]
+    assert [ring.shard_for(code) for code in codes] == [HashRing(3).shard_for(code) for code in codes]
+    assert {ring.shard_for(code) for code in codes} == {0, 1, 2}
+
+
+def test_hash_ring_moves_keys_only_to_new_shard():
+    old_ring = HashRing(3)
+    new_ring = HashRing(4)
+    codes = [f"code{number}" for number in range(10000)]
+
+    moved = [code for code in codes if old_ring.shard_for(code) != new_ring.shard_for(code)]
+    assert all(new_ring.shard_for(code) == 3 for code in moved)
+    assert 0.15 < len(moved) / len(codes) < 0.35
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    """Три базы SQLite: первые две - старый список шардов, третья добавляется."""
+    shard_engines = [create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/shard{shard}.db") for shard in range(3)]
+    for shard, shard_engine in enumerate(shard_engines):
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=None if shard == 0 else SHARD_TABLES)
+    yield shard_engines
+    for shard_engine in shard_engines:
+        await shard_engine.dispose()
+
+
+def codes_for(predicate, count: int) -> list[str]:
+    codes = (f"code{number}" for number in range(10000))
+    return [code for code in codes if predicate(code)][:count]
+
+
+async def create(router: ShardRouter, code: str, url: str = "https://example.com") -> Link:
+    async with router.sessionmakers[router.shard_for(code)]() as session:
+        return await create_link_in_db(session, url, code, datetime.now(), None)
+
+
+async def rename(router: ShardRouter, old_code: str, new_code: str):
+    source_shard, target_shard = router.shard_for(old_code), router.shard_for(new_code)
+    async with router.sessionmakers[source_shard]() as source, router.sessionmakers[target_shard]() as target:
+        link = (await source.execute(select(Link).where(Link.short_code == old_code))).scalar_one()
+        await rename_link_in_db(source, source if source_shard == target_shard else target, link, new_code)
+
+
+async def shards_of(router: ShardRouter, code: str) -> list[int]:
+    found = []
+    for shard, session_maker in enumerate(router.sessionmakers):
+        async with session_maker() as session:
+            if (await session.execute(select(Link.id).where(Link.short_code == code))).first():
+                found.append(shard)
+    return found
+
+
+async def test_session_for_and_fan_out(engines):
+    router = ShardRouter(engines)
+    primary_code, = codes_for(lambda code: router.shard_for(code) == 0, 1)
+    other_code, = codes_for(lambda code: router.shard_for(code) == 2, 1)
+
+    async with router.sessionmakers[0]() as primary:
+        async with router.session_for(primary_code, primary) as session:
+            assert session is primary
+        async with router.session_for(other_code, primary) as session:
+            assert session is not primary
+            await create_link_in_db(session, "https://example.com", other_code, datetime.now(), None)
+
+        async def count_links(session):
+            return (await session.execute(select(func.count(Link.id)))).scalar()
+
+        assert await router.fan_out(primary, count_links) == [0, 0, 1]
+
+
+async def test_rename_across_shards(engines):
+    router = ShardRouter(engines)
+    old_code, = codes_for(lambda code: router.shard_for(code) == 1, 1)
+    new_code, = codes_for(lambda code: router.shard_for(code) == 2, 1)
+    await create(router, old_code)
+
+    await rename(router, old_code, new_code)
+
+    assert await shards_of(router, new_code) == [2]
+    async with router.sessionmakers[1]() as session:
+        assert await get_rename_target(session, old_code) == new_code
+        old = (await session.execute(select(Link).where(Link.short_code == old_code))).scalar_one()
+        assert old.deleted_at is not None
+
+
+async def test_rebalance_moves_links_redirects_and_archive(engines):
+    old_router = ShardRouter(engines[:2])
+    new_router = ShardRouter(engines)
+    moving = codes_for(lambda code: new_router.shard_for(code) == 2, 5)
+    staying = codes_for(lambda code: new_router.shard_for(code) != 2, 5)
+    for code in moving + staying:
+        await create(old_router, code)
+
+    # Переименованная ссылка: старый код и его переадресация должны переехать вместе
+    renamed, new_code = moving[0], staying[0] + "-renamed"
+    await rename(old_router, renamed, new_code)
+    async with old_router.sessionmakers[old_router.shard_for(moving[1])]() as session:
+        session.add(LinkArchive(short_code=moving[1], original_url="https://old.example", reason="Истекла"))
+        await session.commit()
+
+    stats = await rebalance(new_router, batch_size=3)
+
+    assert stats["collisions"] == []
+    assert stats["redirects"] == 1
+    assert stats["archived"] == 1
+    for code in moving + staying + [new_code]:
+        assert await shards_of(new_router, code) == [new_router.shard_for(code)]
+    async with new_router.sessionmakers[2]() as session:
+        assert await get_rename_target(session, renamed) == new_code
+        archived = (await session.execute(select(LinkArchive.short_code))).scalars().all()
+        assert archived == [moving[1]]
+
+    # Повторный запуск ничего не переносит
+    assert (await rebalance(new_router))["links"] == 0
+
+
+async def test_rebalance_resumes_interrupted_run_and_reports_collisions(engines):
+    old_router = ShardRouter(engines[:2])
+    new_router = ShardRouter(engines)
+    copied, colliding = codes_for(lambda code: new_router.shard_for(code) == 2, 2)
+    links = {code: await create(old_router, code) for code in (copied, colliding)}
+
+    async with new_router.sessionmakers[2]() as session:
+        # Прерванный запуск успел скопировать ссылку, но не удалил исходную
+        async with old_router.sessionmakers[old_router.shard_for(copied)]() as source:
+            link = (await source.execute(select(Link).where(Link.short_code == copied))).scalar_one()
+        await copy_link_in_db(session, link)
+        await session.commit()
+        # Другую ссылку с тем же кодом независимо создали в новом шарде
+        await create_link_in_db(session, "https://other.example", colliding, datetime.now(), None)
+
+    stats = await rebalance(new_router)
+
+    assert stats["links"] == 1
+    assert stats["collisions"] == [colliding]
+    assert await shards_of(new_router, copied) == [2]
+    assert sorted(await shards_of(new_router, colliding)) == sorted([old_router.shard_for(colliding), 2])
+    async with new_router.sessionmakers[old_router.shard_for(colliding)]() as session:
+        kept = (await session.execute(select(Link).where(Link.short_code == colliding))).scalar_one()
+        assert kept.original_url == links[colliding].original_url
@@ -0,0 +1,67 @@
+import time
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.links.services import create_link_in_db, mark_link_deleted
+from src.models.models import Base, Link
+from src.snapshot.services import RedirectSnapshot, build_snapshot, write_snapshot
+from src.tasks.services import archive_links_in_shard
+
+
+def test_snapshot_lookup(tmp_path):
+    path = str(tmp_path / "links.snap")
+    write_snapshot(path, [
+        ("b", "https://b.example", 0),
+        ("a", "https://a.example", 0),
+        ("c", "https://c.example", int(time.time()) - 10),
+    ], watermarks=[(3, 1), (7, 0)])
+
+    snapshot = RedirectSnapshot(path)
+    assert snapshot.count == 3
+    assert snapshot.watermarks == [(3, 1), (7, 0)]
+    assert snapshot.resolve("a") == "https://a.example"
+    assert snapshot.resolve("b") == "https://b.example"
+    assert snapshot.lookup("c")[0] == "https://c.example"
+    assert snapshot.resolve("c") is None
+    assert snapshot.resolve("missing") is None
+    assert [code for code, _, _ in snapshot.entries()] == ["a", "b", "c"]
+
+
+def test_snapshot_replaced(tmp_path):
+    path = str(tmp_path / "links.snap")
+    write_snapshot(path, [("a", "https://a.example", 0)], watermarks=[(1, 0)])
+    snapshot = RedirectSnapshot(path)
+    assert not snapshot.is_stale()
+
+    write_snapshot(path, [("a", "https://new.example", 0)], watermarks=[(2, 0)])
+    assert snapshot.is_stale()
+    assert snapshot.resolve("a") == "https://a.example"
+    assert RedirectSnapshot(path).resolve("a") == "https://new.example"
+
+
+async def test_incremental_build_applies_deletes_and_archival(tmp_path):
+    path = str(tmp_path / "links.snap")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/links.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        for code in ("keep", "deleted", "purged", "reused"):
+            await create_link_in_db(session, f"https://{code}.example", code, datetime.now(), None)
+        assert await build_snapshot([session], path) == 4
+
+        await mark_link_deleted(session, "deleted")
+        await archive_links_in_shard(
+            async_sessionmaker(engine), Link.short_code.in_(["purged", "reused"]), "test"
+        )
+        await create_link_in_db(session, "https://new.example", "reused", datetime.now(), None)
+        await create_link_in_db(session, "https://added.example", "added", datetime.now(), None)
+        assert await build_snapshot([session], path, incremental=True) == 3
+    await engine.dispose()
+
+    snapshot = RedirectSnapshot(path)
+    assert snapshot.resolve("keep") == "https://keep.example"
+    assert snapshot.resolve("added") == "https://added.example"
+    assert snapshot.resolve("reused") == "https://new.example"
+    assert snapshot.resolve("deleted") is None
+    assert snapshot.resolve("purged") is None
@@ -0,0 +1,31 @@
+import asyncio
+
+from src.tasks.runtime import AsyncRuntime
+
+
+async def test_runtime_reuses_loop_and_runs_tasks_concurrently():
+    runtime = AsyncRuntime()
+
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    # Задачи Celery вызывают runtime.run из своих потоков - здесь это потоки to_thread
+    loop = await asyncio.to_thread(runtime.run, current_loop())
+    assert loop is not asyncio.get_running_loop()
+    assert await asyncio.to_thread(runtime.run, current_loop()) is loop
+
+    # Две задачи из разных потоков ждут друг друга: это возможно, только если
+    # они выполняются в общем loop одновременно
+    barrier = asyncio.Event()
+    arrived = []
+
+    async def meet():
+        arrived.append(True)
+        if len(arrived) == 2:
+            barrier.set()
+        await asyncio.wait_for(barrier.wait(), 1)
+        return len(arrived)
+
+    results = await asyncio.gather(*(asyncio.to_thread(runtime.run, meet()) for _ in range(2)))
+    assert results == [2, 2]
+    runtime.stop()
@@ -0,0 +1,94 @@
+import hashlib
+import os
+from datetime import datetime
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, func, inspect, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.links.services import create_link_in_db, get_or_create_url_id
+from src.models.models import Base, Link, Url
+from src.utils import url_hash
+
+# Миграции используют plpgsql и CONCURRENTLY, поэтому проверяются только на
+# отдельной пустой базе PostgreSQL: TEST_DATABASE_URL=postgresql://...
+POSTGRES_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+async def session(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/links.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def test_url_hash_matches_postgres_sha256():
+    url = "https://пример.рф/путь?q=1"
+    assert url_hash(url) == hashlib.sha256(url.encode("utf-8")).digest()
+
+
+async def test_same_url_is_stored_once(session):
+    url_id = await get_or_create_url_id(session, "https://example.com")
+    assert await get_or_create_url_id(session, "https://example.com") == url_id
+    assert await get_or_create_url_id(session, "https://other.example") != url_id
+
+    for code in ("one", "two"):
+        await create_link_in_db(session, "https://example.com", code, datetime.now(), None)
+
+    assert (await session.execute(select(func.count(Url.id)))).scalar() == 2
+    links = (await session.execute(select(Link).order_by(Link.short_code))).scalars().all()
+    assert {link.url_id for link in links} == {url_id}
+    assert [link.original_url for link in links] == ["https://example.com"] * 2
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="нужна база PostgreSQL в TEST_DATABASE_URL")
+def test_expand_and_contract_migrations():
+    config = Config("alembic.ini")
+    config.set_main_option("sqlalchemy.url", POSTGRES_URL.replace("%", "%%"))
+    engine = create_engine(POSTGRES_URL)
+
+    command.upgrade(config, "3f1c0a2b9e7d")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO link (original_url, short_code, created_at, clicks) VALUES "
+            "('https://a.example', 'a1', now(), 0), ('https://a.example', 'a2', now(), 0), "
+            "('https://b.example', 'b1', now(), 0)"
+        ))
+
+    try:
+        # Расширение: старые колонки на месте, url_id заполнен для старых строк
+        command.upgrade(config, "e4b9c3d07a15")
+        with engine.begin() as conn:
+            # Старый релиз пишет только original_url, новый - только url_id
+            conn.execute(text(
+                "INSERT INTO link (original_url, short_code, created_at, clicks) "
+                "VALUES ('https://b.example', 'old', now(), 0)"
+            ))
+            conn.execute(text(
+                "INSERT INTO link (url_id, short_code, created_at, clicks) "
+                "SELECT id, 'new', now(), 0 FROM url WHERE url = 'https://a.example'"
+            ))
+            rows = dict(conn.execute(text(
+                "SELECT link.short_code, url.url FROM link JOIN url ON url.id = link.url_id"
+            )).all())
+            assert rows == {
+                "a1": "https://a.example", "a2": "https://a.example", "b1": "https://b.example",
+                "old": "https://b.example", "new": "https://a.example",
+            }
+            assert conn.execute(text("SELECT original_url FROM link WHERE short_code = 'new'")).scalar() \
+                == "https://a.example"
+            assert conn.execute(text("SELECT count(*) FROM url")).scalar() == 2
+
+        # Сужение: старые колонки удалены, url_id обязателен
+        command.upgrade(config, "head")
+        columns = {column["name"]: column for column in inspect(engine).get_columns("link")}
+        assert "original_url" not in columns and "custom_alias" not in columns
+        assert not columns["url_id"]["nullable"]
+    finally:
+        command.downgrade(config, "base")
+        engine.dispose()